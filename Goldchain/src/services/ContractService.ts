@@ -258,6 +258,7 @@ export class ContractService {
         onComplete: algosdk.OnApplicationComplete.NoOpOC,
         appArgs: [new TextEncoder().encode('buy')],
         foreignAssets: [this.config.vgoldAppId],
+        foreignApps: [this.config.oracleAppId], // Trades price off the oracle
         suggestedParams: params,
       });
 
@@ -333,6 +334,7 @@ export class ContractService {
           algosdk.encodeUint64(Math.round(vgoldAmount * 1e6)) // Convert to micro units
         ],
         foreignAssets: [this.config.vgoldAppId],
+        foreignApps: [this.config.oracleAppId], // Trades price off the oracle
         suggestedParams: params,
       });
 
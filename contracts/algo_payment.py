@@ -0,0 +1,28 @@
+"""
+ALGO Payment Helpers - Algorand Smart Contract Helpers
+Takes ALGO into the trading and lending contracts from a grouped payment.
+"""
+
+from pyteal import *
+
+
+def algo_payment() -> TxnObject:
+    """The group transaction immediately before the app call"""
+    return Gtxn[Txn.group_index() - Int(1)]
+
+
+def receive_algo() -> Expr:
+    """Check the preceding group transaction pays ALGO from the caller to the app"""
+    payment = algo_payment()
+    return Seq([
+        Assert(Txn.group_index() > Int(0)),
+        Assert(payment.type_enum() == TxnType.Payment),
+        Assert(payment.sender() == Txn.sender()),
+        Assert(payment.receiver() == Global.current_application_address()),
+        Assert(payment.close_remainder_to() == Global.zero_address()),
+    ])
+
+
+def received_algo() -> Expr:
+    """microALGO paid by the payment receive_algo checks"""
+    return algo_payment().amount()
@@ -0,0 +1,263 @@
+"""
+Block Follower - GoldChain
+Streams blocks from algod in round order and turns every call to the four GoldChain
+apps (inner calls included) into an AppCallEvent: method name, arguments, global and
+local state deltas by field name, and logs. Events go to registered async handlers,
+each through its own bounded queue, so a slow handler holds the follower back instead
+of losing events. The last round every handler has finished is checkpointed, and a
+restarted follower resumes after it (events are delivered at least once).
+
+Usage:
+    python block_follower.py [--config deployed/contracts.json] [--checkpoint follower.json] [--from-round N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import msgpack
+from algosdk.encoding import encode_address
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from contract_service import ContractConfig, load_deployed_config
+from router import CONTRACT_METHODS, method_name
+from state_keys import GLOBAL_NAMES, LOCAL_NAMES, decode_delta
+
+# Events queued per handler before the follower waits for it
+HANDLER_QUEUE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class AppCallEvent:
+    """One call to a GoldChain app as it landed in a block"""
+    round: int
+    txn_id: str  # of the top-level transaction, shared by its inner calls
+    contract: str  # "vgold", "trading", "lending" or "oracle"
+    app_id: int
+    sender: str
+    on_complete: int
+    method: Optional[str]  # None for creation, opt-in and other bare calls
+    args: Tuple[bytes, ...]  # application args after the method
+    accounts: Tuple[str, ...]  # foreign accounts, Txn.accounts[1..]
+    global_delta: Dict[str, object]  # field -> new value, None once deleted
+    local_delta: Dict[str, Dict[str, object]]  # account -> field -> new value
+    logs: Tuple[bytes, ...]
+    inner: bool = False
+
+
+Handler = Callable[[AppCallEvent], Awaitable[None]]
+
+
+class FileCheckpoint:
+    """The last fully handled round, kept in a JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[int]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)["round"]
+        except FileNotFoundError:
+            return None
+
+    def save(self, round_number: int) -> None:
+        # Written aside and renamed, so a crash never leaves a torn checkpoint
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as f:
+            json.dump({"round": round_number}, f)
+        os.replace(temp, self.path)
+
+
+class _Subscription:
+    """A handler, the events it wants and its queue"""
+
+    def __init__(self, handler: Handler, contracts: Optional[Set[str]], methods: Optional[Set[str]], queue_size: int):
+        self.handler = handler
+        self.contracts = contracts
+        self.methods = methods
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.done_round = 0
+        self.errors = 0
+
+    def wants(self, event: AppCallEvent) -> bool:
+        return ((self.contracts is None or event.contract in self.contracts)
+                and (self.methods is None or event.method in self.methods))
+
+
+class BlockFollower:
+    """Follows GoldChain app calls round by round and dispatches them to handlers"""
+
+    def __init__(self, algod_client: algod.AlgodClient, config: ContractConfig,
+                 checkpoint: Optional[FileCheckpoint] = None):
+        self.algod_client = algod_client
+        self.config = config
+        self.checkpoint = checkpoint
+        self.contracts = {
+            config.vgold_app_id: "vgold",
+            config.trading_app_id: "trading",
+            config.lending_app_id: "lending",
+            config.oracle_app_id: "oracle",
+        }
+        self._subscriptions: List[_Subscription] = []
+        self._saved_round: Optional[int] = None
+
+    def on(self, handler: Handler, contracts: Optional[Iterable[str]] = None,
+           methods: Optional[Iterable[str]] = None, queue_size: int = HANDLER_QUEUE_SIZE) -> None:
+        """Register a handler for calls to some contracts and methods, all of them by default"""
+        self._subscriptions.append(_Subscription(
+            handler, set(contracts) if contracts else None, set(methods) if methods else None, queue_size
+        ))
+
+    def decode_block(self, block: Dict) -> List[AppCallEvent]:
+        """GoldChain app call events of a msgpack-decoded block, in transaction order"""
+        events = []
+        for stxn in block.get("txns", []):
+            txn = stxn["txn"]
+            if txn.get("type") != "appl":
+                continue
+            txn_id = self._txn_id(block, stxn)
+            self._decode_call(block["rnd"], txn_id, stxn, False, events)
+        return events
+
+    def _decode_call(self, round_number: int, txn_id: str, stxn: Dict, inner: bool, events: List[AppCallEvent]) -> None:
+        """Event for one app call if it touches a GoldChain app, then for its inner calls"""
+        txn = stxn["txn"]
+        delta = stxn.get("dt", {})
+        app_id = txn.get("apid") or stxn.get("apid", 0)
+        contract = self.contracts.get(app_id)
+        if txn.get("type") == "appl" and contract:
+            args = txn.get("apaa", [])
+            method = method_name(CONTRACT_METHODS[contract], args[0], self.config.dispatch) if args else None
+
+            # Local deltas index the sender, then the foreign accounts, then any shared ones
+            foreign = txn.get("apat", [])
+            accounts = [txn["snd"]] + foreign + delta.get("sa", [])
+            local_delta = {
+                encode_address(accounts[index]): decode_delta(changes, LOCAL_NAMES[contract])
+                for index, changes in delta.get("ld", {}).items()
+            }
+            events.append(AppCallEvent(
+                round=round_number,
+                txn_id=txn_id,
+                contract=contract,
+                app_id=app_id,
+                sender=encode_address(txn["snd"]),
+                on_complete=txn.get("apan", 0),
+                method=method,
+                args=tuple(args[1:]),
+                accounts=tuple(encode_address(address) for address in foreign),
+                global_delta=decode_delta(delta.get("gd", {}), GLOBAL_NAMES[contract]),
+                local_delta=local_delta,
+                logs=tuple(delta.get("lg", [])),
+                inner=inner,
+            ))
+
+        for inner_stxn in delta.get("itx", []):
+            self._decode_call(round_number, txn_id, inner_stxn, True, events)
+
+    @staticmethod
+    def _txn_id(block: Dict, stxn: Dict) -> str:
+        """Transaction id, restoring the genesis fields the block leaves out"""
+        fields = dict(stxn["txn"])
+        fields.setdefault("gh", block.get("gh"))
+        if stxn.get("hgi"):
+            fields["gen"] = block.get("gen")
+        try:
+            return transaction.Transaction.undictify(fields).get_txid()
+        except Exception:
+            return ""
+
+    async def fetch_block(self, round_number: int) -> Dict:
+        """A block, waiting for it if it is not committed yet"""
+        status = await asyncio.to_thread(self.algod_client.status)
+        while status["last-round"] < round_number:
+            status = await asyncio.to_thread(self.algod_client.status_after_block, status["last-round"])
+        raw = await asyncio.to_thread(self.algod_client.block_info, round_num=round_number, response_format="msgpack")
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)["block"]
+
+    async def run(self, start_round: Optional[int] = None, end_round: Optional[int] = None) -> None:
+        """Follow from the round after the checkpoint (else start_round, else the current one)
+        to end_round, or forever"""
+        saved = self.checkpoint.load() if self.checkpoint else None
+        if saved is not None:
+            round_number = saved + 1
+        elif start_round is not None:
+            round_number = start_round
+        else:
+            round_number = (await asyncio.to_thread(self.algod_client.status))["last-round"]
+        self._saved_round = saved
+        for subscription in self._subscriptions:
+            subscription.done_round = round_number - 1
+
+        workers = [asyncio.create_task(self._work(subscription)) for subscription in self._subscriptions]
+        try:
+            while end_round is None or round_number <= end_round:
+                await self.dispatch(round_number, self.decode_block(await self.fetch_block(round_number)))
+                round_number += 1
+
+            # Let every handler drain its queue
+            for subscription in self._subscriptions:
+                await subscription.queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def dispatch(self, round_number: int, events: List[AppCallEvent]) -> None:
+        """Queue a round's events for the handlers that want them, then its end marker"""
+        for subscription in self._subscriptions:
+            for event in events:
+                if subscription.wants(event):
+                    await subscription.queue.put(event)  # Waits while this handler's queue is full
+            await subscription.queue.put(round_number)
+
+    async def _work(self, subscription: _Subscription) -> None:
+        """Run one handler over its queue; round markers advance the checkpoint"""
+        while True:
+            item = await subscription.queue.get()
+            if item is None:
+                return
+            if isinstance(item, int):
+                subscription.done_round = item
+                self._advance_checkpoint()
+                continue
+            try:
+                await subscription.handler(item)
+            except Exception as e:
+                subscription.errors += 1
+                print(f"Handler {getattr(subscription.handler, '__name__', subscription.handler)} failed on "
+                      f"{item.contract}.{item.method} in round {item.round}: {e}")
+
+    def _advance_checkpoint(self) -> None:
+        """Save the last round every handler has finished, once it moves"""
+        if not self.checkpoint or not self._subscriptions:
+            return
+        done = min(subscription.done_round for subscription in self._subscriptions)
+        if self._saved_round is None or done > self._saved_round:
+            self.checkpoint.save(done)
+            self._saved_round = done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print GoldChain app calls as they land")
+    parser.add_argument("--config", default="deployed/contracts.json", help="deploy_contracts.py output")
+    parser.add_argument("--algod-url", default=os.getenv("ALGOD_URL", "http://localhost:4001"))
+    parser.add_argument("--algod-token", default=os.getenv("ALGOD_TOKEN", "a" * 64))
+    parser.add_argument("--checkpoint", help="Resume file, written as rounds are handled")
+    parser.add_argument("--from-round", type=int, help="First round when there is no checkpoint yet")
+    args = parser.parse_args()
+
+    async def print_event(event: AppCallEvent) -> None:
+        print(f"{event.round} {event.contract}.{event.method or '<bare>'} from {event.sender}"
+              f"{' (inner)' if event.inner else ''}: global {event.global_delta}, local {event.local_delta}")
+
+    follower = BlockFollower(algod.AlgodClient(args.algod_token, args.algod_url),
+                             ContractConfig(**load_deployed_config(args.config)),
+                             FileCheckpoint(args.checkpoint) if args.checkpoint else None)
+    follower.on(print_event)
+    asyncio.run(follower.run(args.from_round))
@@ -4,14 +4,65 @@ Handles all smart contract interactions and provides a unified interface.
 """
 
 import json
-from typing import Dict, List, Optional, Tuple
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from algosdk import account, mnemonic
+from algosdk.error import AlgodHTTPError
 from algosdk.v2client import algod
 from algosdk.future import transaction
 from algosdk.encoding import encode_address, decode_address
+from algosdk.logic import get_application_address
 import base64
 
+from lending_contract import (
+    BORROW_BOX_PREFIX, BORROW_COUNT_PREFIX, BORROW_FIELDS, INDEX_SCALE, LEND_BOX_PREFIX, LEND_COUNT_PREFIX,
+    LEND_FIELDS, LIQUIDATION_ITEM_BUDGET, POSITIONS_BOX, POSITIONS_LOCAL, SECONDS_PER_YEAR,
+)
+from price_oracle import (
+    ASSET_FIELDS, ASSET_SLOT_BYTES, ASSETS_BOX, ASSETS_MULTI, ASSETS_SINGLE, CHECKPOINT_BOX, HISTORY_CAPACITY,
+    HISTORY_PAGE_SIZE, MAX_ASSETS, MAX_PRICE, MAX_REPORTS, MIN_PRICE, PRICE_ITEM_BUDGET, REPORTER_BYTES, REPORTERS_BOX,
+    REPORTERS_MEDIAN, REPORTERS_SINGLE, VGOLD_ASSET_SLOT, VGOLD_PRICE_BUDGET, history_box_name,
+)
+from router import CONTRACT_METHODS, DISPATCH_NAMES, method_arg
+from state_keys import GLOBAL_NAMES, LOCAL_NAMES, decode_state
+from trading_contract import MAX_TRADING_FEE
+from vgold_token import BALANCE_BOX_MBR, BALANCES_ASA, BALANCES_BOX, BALANCES_LOCAL
+
+# AVM limits: foreign accounts, total references and transactions per atomic group
+MAX_APP_ACCOUNTS = 4
+MAX_APP_REFERENCES = 8
+MAX_GROUP_SIZE = 16
+
+# Box mode references each recipient's account and box plus the sender's box
+MAX_BOX_BATCH = (MAX_APP_REFERENCES - 1) // 2
+
+# Opcode budget of one app call, pooled across a group and topped up by inner calls
+APP_CALL_BUDGET = 700
+
+# liquidate_batch references the oracle app plus each borrower's account or position box
+MAX_LIQUIDATION_BATCH = {
+    POSITIONS_LOCAL: MAX_APP_ACCOUNTS,
+    POSITIONS_BOX: MAX_APP_REFERENCES - 1,
+}
+
+# Contract state cached for pre-trade validation, about one round
+STATE_CACHE_SECONDS = 4.0
+
+# Concurrent algod requests for bulk box reads
+BOX_READ_WORKERS = 16
+
+# Box-mode lending positions per page of get_positions
+POSITION_PAGE_SIZE = 50
+
+# Box name prefixes and packed record fields per position type
+POSITION_BOXES = {
+    "lend": (LEND_BOX_PREFIX, LEND_COUNT_PREFIX, LEND_FIELDS),
+    "borrow": (BORROW_BOX_PREFIX, BORROW_COUNT_PREFIX, BORROW_FIELDS),
+}
+
 @dataclass
 class ContractConfig:
     """Configuration for smart contracts"""
@@ -21,6 +72,27 @@ class ContractConfig:
     oracle_app_id: int
     manager_address: str
     treasury_address: str
+    dispatch: str = DISPATCH_NAMES  # Router mode the contracts were compiled with
+    vgold_balances: str = BALANCES_LOCAL  # vGold balance storage: local state, boxes or a native ASA
+    vgold_asset_id: int = 0  # vGold ASA id in ASA mode, separate from the token app id
+    lending_positions: str = POSITIONS_LOCAL  # Lending positions: one per account in local state, or boxes
+    oracle_assets: str = ASSETS_SINGLE  # Oracle prices: vGold only, or vGold plus per-asset slots
+    oracle_reporters: str = REPORTERS_SINGLE  # vGold price set by the oracle address, or a median of reporters
+
+def median_quote(prices: List[int]) -> int:
+    """Median of reporter quotes as the oracle computes it: the middle one, or the mean of the middle two"""
+    ordered = sorted(prices)
+    return (ordered[(len(ordered) - 1) // 2] + ordered[len(ordered) // 2]) // 2
+
+def is_inlier(price: int, median: int, max_deviation: int) -> bool:
+    """Whether a quote is within max_deviation basis points of the median, as the oracle checks it"""
+    return abs(price - median) * 10000 <= median * max_deviation
+
+@dataclass
+class Rejection:
+    """A precondition the contract would reject a transaction on, caught before signing"""
+    method: str
+    reason: str
 
 @dataclass
 class TransactionResult:
@@ -29,6 +101,7 @@ class TransactionResult:
     tx_id: str
     error: Optional[str] = None
     app_id: Optional[int] = None
+    rejection: Optional[Rejection] = None  # Set when pre-trade validation stopped the submission
 
 class ContractService:
     """Main service for interacting with GoldChain smart contracts"""
@@ -37,6 +110,15 @@ class ContractService:
         self.algod_client = algod_client
         self.config = config
         
+        # Pre-trade validation: cached state and the submissions it prevented, per method
+        self._state_cache: Dict[Tuple, Tuple[float, object]] = {}
+        self.prevented_submissions = 0
+        self.rejections: Dict[str, int] = {}
+        
+    def _method(self, contract: str, name: str) -> bytes:
+        """Encode the method argument for the configured dispatch mode"""
+        return method_arg(CONTRACT_METHODS[contract], name, self.config.dispatch)
+    
     def get_account_info(self, address: str) -> Dict:
         """Get account information"""
         try:
@@ -44,39 +126,270 @@ class ContractService:
         except Exception as e:
             raise Exception(f"Failed to get account info: {str(e)}")
     
+    def _vgold_boxes(self, addresses: List[str]) -> List[Tuple[int, bytes]]:
+        """Box references for holders' balances, empty unless balances live in boxes"""
+        if self.config.vgold_balances != BALANCES_BOX:
+            return []
+        return [(0, decode_address(address)) for address in dict.fromkeys(addresses)]
+    
+    def _new_vgold_boxes(self, addresses: List[str]) -> List[str]:
+        """Addresses without a vGold balance box yet, empty unless balances live in boxes"""
+        if self.config.vgold_balances != BALANCES_BOX:
+            return []
+        addresses = list(dict.fromkeys(addresses))
+        with ThreadPoolExecutor(max_workers=BOX_READ_WORKERS) as pool:
+            boxes = pool.map(lambda address: self._read_box(self.config.vgold_app_id, decode_address(address)), addresses)
+            return [address for address, box in zip(addresses, boxes) if box is None]
+    
+    def _box_payment(self, sender_address: str, params, new_boxes: int) -> transaction.PaymentTxn:
+        """Payment grouped before a vGold call for the minimum balance of the boxes it creates"""
+        return transaction.PaymentTxn(
+            sender=sender_address,
+            sp=params,
+            receiver=get_application_address(self.config.vgold_app_id),
+            amt=new_boxes * BALANCE_BOX_MBR
+        )
+    
+    def _submit_vgold_calls(self, calls: List[Tuple[int, transaction.Transaction]], sender_address: str, params,
+                            private_key: str) -> List[TransactionResult]:
+        """Submit (new boxes, vGold call) pairs, each call preceded by its box payment when it creates
+        boxes, packed into atomic groups of up to MAX_GROUP_SIZE; one result per submitted group"""
+        groups: List[List[transaction.Transaction]] = [[]]
+        for new_boxes, txn in calls:
+            txns = [self._box_payment(sender_address, params, new_boxes), txn] if new_boxes else [txn]
+            if len(groups[-1]) + len(txns) > MAX_GROUP_SIZE:
+                groups.append([])
+            groups[-1].extend(txns)
+        
+        results = []
+        for txns in groups:
+            if not txns:
+                continue
+            try:
+                # Group transactions
+                if len(txns) > 1:
+                    gid = transaction.calculate_group_id(txns)
+                    for txn in txns:
+                        txn.group = gid
+                
+                # Sign and submit
+                tx_id = self.algod_client.send_transactions([txn.sign(private_key) for txn in txns])
+                results.append(TransactionResult(success=True, tx_id=tx_id, app_id=self.config.vgold_app_id))
+                
+            except Exception as e:
+                results.append(TransactionResult(success=False, tx_id="", error=str(e)))
+        return results
+    
+    def _vgold_refs(self) -> Dict:
+        """Foreign references an app call needs to move vGold"""
+        if self.config.vgold_balances == BALANCES_ASA:
+            return {"foreign_assets": [self.config.vgold_asset_id]}
+        return {"foreign_apps": [self.config.vgold_app_id]}
+    
+    def _trading_refs(self) -> Dict:
+        """Foreign references of a buy or sell, the oracle app that prices it first"""
+        refs = self._vgold_refs()
+        refs["foreign_apps"] = [self.config.oracle_app_id] + refs.get("foreign_apps", [])
+        return refs
+    
+    def _submit_with_deposit(self, txn, sender_address: str, amount: int, params, private_key: str) -> str:
+        """Submit an app call, preceded by a vGold deposit to the called app in ASA mode"""
+        if self.config.vgold_balances != BALANCES_ASA:
+            return self.algod_client.send_transaction(txn.sign(private_key))
+        
+        # The contract checks the asset transfer right before the call
+        deposit = transaction.AssetTransferTxn(
+            sender=sender_address,
+            sp=params,
+            receiver=get_application_address(txn.index),
+            amt=amount,
+            index=self.config.vgold_asset_id
+        )
+        
+        # Group transactions
+        gid = transaction.calculate_group_id([deposit, txn])
+        deposit.group = gid
+        txn.group = gid
+        
+        # Sign and submit
+        return self.algod_client.send_transactions([deposit.sign(private_key), txn.sign(private_key)])
+    
     def get_vgold_balance(self, address: str) -> int:
         """Get vGold token balance for an address"""
+        if self.config.vgold_balances == BALANCES_BOX:
+            return self.get_box_balance(address)
+        
         try:
             account_info = self.get_account_info(address)
             
+            # Local mode keeps the balance in the token app's local state
+            if self.config.vgold_balances == BALANCES_LOCAL:
+                return self._local_state(account_info, "vgold").get("balance", 0)
+            
             # Look for vGold token in the account's assets
             for asset in account_info.get('assets', []):
-                if asset['asset-id'] == self.config.vgold_app_id:
+                if asset['asset-id'] == self.config.vgold_asset_id:
                     return asset['amount']
             
             return 0
         except Exception as e:
             raise Exception(f"Failed to get vGold balance: {str(e)}")
     
-    def get_current_price(self) -> int:
-        """Get current vGold price from oracle"""
+    def _app_id(self, contract: str) -> int:
+        """App id of a contract by name"""
+        return getattr(self.config, f"{contract}_app_id")
+    
+    def _local_state(self, account_info: Dict, contract: str) -> Dict[str, object]:
+        """An account's local state in a contract keyed by field name, uints as int and byte slices as bytes"""
+        for app in account_info.get('apps-local-state', []):
+            if app['id'] == self._app_id(contract):
+                return decode_state(app.get('key-value', []), LOCAL_NAMES[contract])
+        return {}
+    
+    def _cached(self, key: Tuple, load):
+        """Result of load(), reused for STATE_CACHE_SECONDS"""
+        now = time.monotonic()
+        hit = self._state_cache.get(key)
+        if hit and now - hit[0] < STATE_CACHE_SECONDS:
+            return hit[1]
+        value = load()
+        self._state_cache[key] = (now, value)
+        return value
+    
+    def invalidate_cache(self, *addresses: str) -> None:
+        """Drop cached balances of addresses, or all cached state if none are given"""
+        if not addresses:
+            self._state_cache.clear()
+        for address in addresses:
+            self._state_cache.pop(("balance", address), None)
+    
+    def _cached_balance(self, address: str) -> int:
+        return self._cached(("balance", address), lambda: self.get_vgold_balance(address))
+    
+    def _cached_state(self, contract: str) -> Dict:
+        return self._cached(("state", contract), lambda: self._global_state(contract))
+    
+    def _reject(self, method: str, reason: str) -> TransactionResult:
+        """Count and return a submission stopped by pre-trade validation"""
+        self.prevented_submissions += 1
+        self.rejections[method] = self.rejections.get(method, 0) + 1
+        return TransactionResult(success=False, tx_id="", error=reason, rejection=Rejection(method, reason))
+    
+    def check_balance(self, address: str, amount: int) -> Optional[str]:
+        """Why debiting amount vGold from address would be rejected, None if it would not"""
+        balance = self._cached_balance(address)
+        if amount > balance:
+            return f"Insufficient vGold balance: {balance} < {amount}"
+        return None
+    
+    def check_borrow(self, amount: int, collateral_algo: int) -> Optional[str]:
+        """Why the lending contract would reject a borrow, None if it would not"""
+        required = amount * self._cached_state("lending")["min_collateral_ratio"] // 100
+        if collateral_algo < required:
+            return f"Insufficient collateral: {collateral_algo} < {required}"
+        return None
+    
+    def check_trading_fee(self, sender_address: str, new_fee: int) -> Optional[str]:
+        """Why the trading contract would reject a fee update, None if it would not"""
+        if sender_address != self.config.manager_address:
+            return "Only the manager can set the trading fee"
+        if new_fee > MAX_TRADING_FEE:
+            return f"Fee too high: {new_fee} > {MAX_TRADING_FEE}"
+        return None
+    
+    def check_price_update(self, sender_address: str, new_price: int) -> Optional[str]:
+        """Why the oracle would reject a price update, None if it would not"""
+        oracle_address = self._cached_state("oracle")["oracle_address"]
+        if decode_address(sender_address) != oracle_address:
+            return "Only the oracle address can update the price"
+        if self.config.oracle_reporters == REPORTERS_MEDIAN:
+            return "The vGold price is set by the reporters' median"
+        if not MIN_PRICE <= new_price <= MAX_PRICE:
+            return f"Price {new_price} outside [{MIN_PRICE}, {MAX_PRICE}]"
+        return None
+    
+    def check_asset_prices(self, sender_address: str, prices: Dict[int, int]) -> Optional[str]:
+        """Why the oracle would reject an update_prices call, None if it would not"""
+        if self.config.oracle_assets != ASSETS_MULTI:
+            return "Oracle is not in multi-asset mode"
+        oracle_address = self._cached_state("oracle")["oracle_address"]
+        if decode_address(sender_address) != oracle_address:
+            return "Only the oracle address can update the price"
+        assets = self._cached(("assets",), self.get_asset_prices)
+        for slot, price in prices.items():
+            if not 0 <= slot < MAX_ASSETS:
+                return f"Asset slot {slot} outside [0, {MAX_ASSETS})"
+            if slot == VGOLD_ASSET_SLOT and self.config.oracle_reporters == REPORTERS_MEDIAN:
+                return "The vGold price is set by the reporters' median"
+            bounds = (MIN_PRICE, MAX_PRICE) if slot == VGOLD_ASSET_SLOT else (
+                assets[slot]["min_price"], assets[slot]["max_price"]) if slot in assets else None
+            if bounds is None:
+                return f"Asset slot {slot} is not registered"
+            if not bounds[0] <= price <= bounds[1]:
+                return f"Asset {slot} price {price} outside [{bounds[0]}, {bounds[1]}]"
+        return None
+    
+    def check_reports(self, quotes: Dict[str, int]) -> Optional[str]:
+        """Why the oracle would reject an aggregate of reporter quotes, None if it would not"""
+        if self.config.oracle_reporters != REPORTERS_MEDIAN:
+            return "Oracle is not in median reporter mode"
+        quorum, max_deviation = self.get_reporter_settings()
+        if not quorum:
+            return "No reporters registered"
+        if not quorum <= len(quotes) <= MAX_REPORTS:
+            return f"{len(quotes)} quotes outside [{quorum}, {MAX_REPORTS}]"
+        reporters = self._cached(("reporters",), self.get_reporters)
+        for reporter in quotes:
+            if reporter not in reporters:
+                return f"{reporter} is not a registered reporter"
+        median = median_quote(list(quotes.values()))
+        inliers = sum(is_inlier(price, median, max_deviation) for price in quotes.values())
+        if inliers < quorum:
+            return f"Only {inliers} quotes within {max_deviation} basis points of the median {median}, quorum {quorum}"
+        if not MIN_PRICE <= median <= MAX_PRICE:
+            return f"Median {median} outside [{MIN_PRICE}, {MAX_PRICE}]"
+        return None
+    
+    def validation_stats(self) -> Dict:
+        """Submissions pre-trade validation prevented, in total and per method"""
+        return {"prevented": self.prevented_submissions, "by_method": dict(self.rejections)}
+    
+    def _read_box(self, app_id: int, name: bytes) -> Optional[bytes]:
+        """Read an application box, None if it doesn't exist"""
         try:
-            # Call the price oracle contract
-            app_args = [b"get_price"]
-            
-            txn = transaction.ApplicationCallTxn(
-                sender=self.config.manager_address,
-                sp=self.algod_client.suggested_params(),
-                index=self.config.oracle_app_id,
-                on_complete=transaction.OnComplete.NoOpOC,
-                app_args=app_args
-            )
-            
-            # This would need to be properly signed and submitted
-            # For now, return a default price
-            return 50000  # 0.05 ALGO in microALGO
+            box = self.algod_client.application_box_by_name(app_id, name)
+            return base64.b64decode(box['value'])
+        except AlgodHTTPError as e:
+            if e.code == 404:
+                return None
+            raise Exception(f"Failed to read box: {str(e)}")
+    
+    def get_box_balance(self, address: str) -> int:
+        """Read one holder's balance box, zero if the holder has none"""
+        value = self._read_box(self.config.vgold_app_id, decode_address(address))
+        return int.from_bytes(value, 'big') if value else 0
+    
+    def get_box_balances(self, addresses: List[str], max_workers: int = BOX_READ_WORKERS) -> Dict[str, int]:
+        """Read many holders' balance boxes concurrently"""
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(addresses, pool.map(self.get_box_balance, addresses)))
+    
+    def list_vgold_holders(self) -> List[str]:
+        """Every address with a vGold balance box"""
+        try:
+            boxes = self.algod_client.application_boxes(self.config.vgold_app_id)
+            return [encode_address(base64.b64decode(box['name'])) for box in boxes['boxes']]
         except Exception as e:
-            raise Exception(f"Failed to get current price: {str(e)}")
+            raise Exception(f"Failed to list vGold holders: {str(e)}")
+    
+    def snapshot_vgold_holders(self, max_workers: int = BOX_READ_WORKERS) -> Dict[str, int]:
+        """Balance of every vGold holder, read from their boxes"""
+        return self.get_box_balances(self.list_vgold_holders(), max_workers)
+    
+    def get_current_price(self) -> int:
+        """Get current vGold price from oracle, the price the trading contract trades at"""
+        price, _ = self.get_oracle_price()
+        return price
     
     def buy_vgold(self, buyer_address: str, algo_amount: int, private_key: str) -> TransactionResult:
         """Buy vGold tokens with ALGO"""
@@ -90,15 +403,15 @@ class ContractService:
                 sp=params,
                 index=self.config.trading_app_id,
                 on_complete=transaction.OnComplete.NoOpOC,
-                app_args=[b"buy"],
-                foreign_assets=[self.config.vgold_app_id]
+                app_args=[self._method("trading", "buy")],
+                **self._trading_refs()
             )
             
-            # Add payment transaction
+            # Add payment transaction, the contract checks it pays the trading app
             payment_txn = transaction.PaymentTxn(
                 sender=buyer_address,
                 sp=params,
-                receiver=self.config.treasury_address,
+                receiver=get_application_address(self.config.trading_app_id),
                 amt=algo_amount
             )
             
@@ -122,6 +435,10 @@ class ContractService:
     def sell_vgold(self, seller_address: str, vgold_amount: int, private_key: str) -> TransactionResult:
         """Sell vGold tokens for ALGO"""
         try:
+            reason = self.check_balance(seller_address, vgold_amount)
+            if reason:
+                return self._reject("sell", reason)
+            
             # Get suggested parameters
             params = self.algod_client.suggested_params()
             
@@ -131,39 +448,183 @@ class ContractService:
                 sp=params,
                 index=self.config.trading_app_id,
                 on_complete=transaction.OnComplete.NoOpOC,
-                app_args=[b"sell", vgold_amount.to_bytes(8, 'big')],
-                foreign_assets=[self.config.vgold_app_id]
+                app_args=[self._method("trading", "sell"), vgold_amount.to_bytes(8, 'big')],
+                **self._trading_refs()
             )
             
-            # Group with asset transfer
-            asset_transfer = transaction.AssetTransferTxn(
-                sender=seller_address,
-                sp=params,
-                receiver=self.config.treasury_address,
-                amt=vgold_amount,
-                index=self.config.vgold_app_id
-            )
+            # Submit, with the vGold deposit in ASA mode
+            tx_id = self._submit_with_deposit(txn, seller_address, vgold_amount, params, private_key)
+            self.invalidate_cache(seller_address)
             
-            # Group transactions
-            gid = transaction.calculate_group_id([asset_transfer, txn])
-            asset_transfer.group = gid
-            txn.group = gid
+            return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.trading_app_id)
             
-            # Sign transactions
-            signed_transfer = asset_transfer.sign(private_key)
-            signed_app = txn.sign(private_key)
+        except Exception as e:
+            return TransactionResult(success=False, tx_id="", error=str(e))
+    
+    def opt_in_vgold(self, address: str, private_key: str) -> TransactionResult:
+        """Opt an account in to hold vGold, box mode needs no opt-in"""
+        try:
+            params = self.algod_client.suggested_params()
             
-            # Submit transactions
-            tx_id = self.algod_client.send_transactions([signed_transfer, signed_app])
+            if self.config.vgold_balances == BALANCES_BOX:
+                return TransactionResult(success=True, tx_id="", app_id=self.config.vgold_app_id)
             
-            return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.trading_app_id)
+            if self.config.vgold_balances == BALANCES_ASA:
+                # Zero-amount asset transfer to self
+                txn = transaction.AssetTransferTxn(
+                    sender=address,
+                    sp=params,
+                    receiver=address,
+                    amt=0,
+                    index=self.config.vgold_asset_id
+                )
+            else:
+                txn = transaction.ApplicationOptInTxn(
+                    sender=address,
+                    sp=params,
+                    index=self.config.vgold_app_id
+                )
+            
+            tx_id = self.algod_client.send_transaction(txn.sign(private_key))
+            return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.vgold_app_id)
             
         except Exception as e:
             return TransactionResult(success=False, tx_id="", error=str(e))
     
+    def transfer_vgold(self, sender_address: str, receiver_address: str, amount: int, private_key: str) -> TransactionResult:
+        """Transfer vGold, a plain asset transfer in ASA mode"""
+        try:
+            reason = self.check_balance(sender_address, amount)
+            if reason:
+                return self._reject("transfer", reason)
+            if self.config.vgold_balances == BALANCES_BOX and amount == 0:
+                return self._reject("transfer", "Zero-amount transfers are rejected in box mode")
+            
+            params = self.algod_client.suggested_params()
+            
+            if self.config.vgold_balances == BALANCES_ASA:
+                txn = transaction.AssetTransferTxn(
+                    sender=sender_address,
+                    sp=params,
+                    receiver=receiver_address,
+                    amt=amount,
+                    index=self.config.vgold_asset_id
+                )
+            else:
+                txn = transaction.ApplicationCallTxn(
+                    sender=sender_address,
+                    sp=params,
+                    index=self.config.vgold_app_id,
+                    on_complete=transaction.OnComplete.NoOpOC,
+                    app_args=[self._method("vgold", "transfer"), amount.to_bytes(8, 'big')],
+                    accounts=[receiver_address],
+                    boxes=self._vgold_boxes([sender_address, receiver_address])
+                )
+            
+            # A new holder's box is paid for in a grouped payment
+            result, = self._submit_vgold_calls([(len(self._new_vgold_boxes([receiver_address])), txn)],
+                                               sender_address, params, private_key)
+            self.invalidate_cache(sender_address, receiver_address)
+            return result
+            
+        except Exception as e:
+            return TransactionResult(success=False, tx_id="", error=str(e))
+    
+    @staticmethod
+    def chunk_transfers(transfers: List[Tuple[str, int]], batch_size: int = MAX_APP_ACCOUNTS) -> List[List[Tuple[str, int]]]:
+        """Split (recipient, amount) pairs into full batch_transfer calls"""
+        return [transfers[i:i + batch_size] for i in range(0, len(transfers), batch_size)]
+    
+    def batch_transfer_vgold(self, sender_address: str, transfers: List[Tuple[str, int]], private_key: str) -> List[TransactionResult]:
+        """Transfer vGold to many recipients, one result per submitted group"""
+        try:
+            reason = self.check_balance(sender_address, sum(amount for _, amount in transfers))
+            new_holders = set(self._new_vgold_boxes([recipient for recipient, _ in transfers]))
+        except Exception as e:
+            return [TransactionResult(success=False, tx_id="", error=str(e))]
+        if reason:
+            return [self._reject("batch_transfer", reason)]
+        if self.config.vgold_balances == BALANCES_BOX and any(amount == 0 for _, amount in transfers):
+            return [self._reject("batch_transfer", "Zero-amount transfers are rejected in box mode")]
+        
+        params = self.algod_client.suggested_params()
+        if self.config.vgold_balances == BALANCES_ASA:
+            batch_size = 1  # One asset transfer per recipient
+        elif self.config.vgold_balances == BALANCES_BOX:
+            batch_size = MAX_BOX_BATCH
+        else:
+            batch_size = MAX_APP_ACCOUNTS
+        
+        # Each new holder's box is paid for by the first batch that credits them
+        calls = []
+        for i, batch in enumerate(self.chunk_transfers(transfers, batch_size)):
+            created = new_holders.intersection(recipient for recipient, _ in batch)
+            new_holders -= created
+            calls.append((len(created), self._batch_transfer_txn(sender_address, params, batch, f"batch {i}".encode())))
+        
+        # Pack transfers or batch calls, with their box payments, into atomic groups
+        results = self._submit_vgold_calls(calls, sender_address, params, private_key)
+        self.invalidate_cache(sender_address, *[recipient for recipient, _ in transfers])
+        return results
+    
+    def _batch_transfer_txn(self, sender_address: str, params, batch: List[Tuple[str, int]], note: bytes) -> transaction.Transaction:
+        """An asset transfer for a one-recipient batch in ASA mode, else a batch_transfer call.
+        The note keeps identical batches in a group distinct."""
+        if self.config.vgold_balances == BALANCES_ASA:
+            (recipient, amount), = batch
+            return transaction.AssetTransferTxn(
+                sender=sender_address,
+                sp=params,
+                receiver=recipient,
+                amt=amount,
+                index=self.config.vgold_asset_id,
+                note=note
+            )
+        return transaction.ApplicationCallTxn(
+            sender=sender_address,
+            sp=params,
+            index=self.config.vgold_app_id,
+            on_complete=transaction.OnComplete.NoOpOC,
+            app_args=[self._method("vgold", "batch_transfer")] + [amount.to_bytes(8, 'big') for _, amount in batch],
+            accounts=[recipient for recipient, _ in batch],
+            boxes=self._vgold_boxes([sender_address] + [recipient for recipient, _ in batch]),
+            note=note
+        )
+    
+    def migrate_vgold_balances(self, sender_address: str, holders: List[str], private_key: str) -> List[TransactionResult]:
+        """Move holders' local state balances into boxes, one result per submitted group.
+        The contract rejects holders without a local balance, so leave them out."""
+        try:
+            new_holders = set(self._new_vgold_boxes(holders))
+        except Exception as e:
+            return [TransactionResult(success=False, tx_id="", error=str(e))]
+        
+        params = self.algod_client.suggested_params()
+        calls = []
+        for i in range(0, len(holders), MAX_BOX_BATCH):
+            batch = holders[i:i + MAX_BOX_BATCH]
+            created = new_holders.intersection(batch)
+            new_holders -= created
+            calls.append((len(created), transaction.ApplicationCallTxn(
+                sender=sender_address,
+                sp=params,
+                index=self.config.vgold_app_id,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=[self._method("vgold", "migrate")],
+                accounts=batch,
+                boxes=[(0, decode_address(holder)) for holder in batch]
+            )))
+        
+        # Pack migrate calls, with their box payments, into atomic groups
+        return self._submit_vgold_calls(calls, sender_address, params, private_key)
+    
     def lend_vgold(self, lender_address: str, amount: int, duration_days: int, private_key: str) -> TransactionResult:
         """Lend vGold tokens"""
         try:
+            reason = self.check_balance(lender_address, amount)
+            if reason:
+                return self._reject("lend", reason)
+            
             # Get suggested parameters
             params = self.algod_client.suggested_params()
             
@@ -173,30 +634,14 @@ class ContractService:
                 sp=params,
                 index=self.config.lending_app_id,
                 on_complete=transaction.OnComplete.NoOpOC,
-                app_args=[b"lend", amount.to_bytes(8, 'big'), duration_days.to_bytes(4, 'big')],
-                foreign_assets=[self.config.vgold_app_id]
-            )
-            
-            # Group with asset transfer
-            asset_transfer = transaction.AssetTransferTxn(
-                sender=lender_address,
-                sp=params,
-                receiver=self.config.treasury_address,
-                amt=amount,
-                index=self.config.vgold_app_id
+                app_args=[self._method("lending", "lend"), amount.to_bytes(8, 'big'), duration_days.to_bytes(4, 'big')],
+                boxes=self._new_position_boxes(lender_address, "lend"),
+                **self._vgold_refs()
             )
             
-            # Group transactions
-            gid = transaction.calculate_group_id([asset_transfer, txn])
-            asset_transfer.group = gid
-            txn.group = gid
-            
-            # Sign transactions
-            signed_transfer = asset_transfer.sign(private_key)
-            signed_app = txn.sign(private_key)
-            
-            # Submit transactions
-            tx_id = self.algod_client.send_transactions([signed_transfer, signed_app])
+            # Submit, with the vGold deposit in ASA mode
+            tx_id = self._submit_with_deposit(txn, lender_address, amount, params, private_key)
+            self.invalidate_cache(lender_address)
             
             return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.lending_app_id)
             
@@ -206,6 +651,10 @@ class ContractService:
     def borrow_vgold(self, borrower_address: str, amount: int, duration_days: int, collateral_algo: int, private_key: str) -> TransactionResult:
         """Borrow vGold with ALGO collateral"""
         try:
+            reason = self.check_borrow(amount, collateral_algo)
+            if reason:
+                return self._reject("borrow", reason)
+            
             # Get suggested parameters
             params = self.algod_client.suggested_params()
             
@@ -215,15 +664,16 @@ class ContractService:
                 sp=params,
                 index=self.config.lending_app_id,
                 on_complete=transaction.OnComplete.NoOpOC,
-                app_args=[b"borrow", amount.to_bytes(8, 'big'), duration_days.to_bytes(4, 'big')],
-                foreign_assets=[self.config.vgold_app_id]
+                app_args=[self._method("lending", "borrow"), amount.to_bytes(8, 'big'), duration_days.to_bytes(4, 'big')],
+                boxes=self._new_position_boxes(borrower_address, "borrow"),
+                **self._vgold_refs()
             )
             
-            # Add payment for collateral
+            # Add payment for collateral, the contract checks it pays the lending app
             payment_txn = transaction.PaymentTxn(
                 sender=borrower_address,
                 sp=params,
-                receiver=self.config.treasury_address,
+                receiver=get_application_address(self.config.lending_app_id),
                 amt=collateral_algo
             )
             
@@ -244,8 +694,9 @@ class ContractService:
         except Exception as e:
             return TransactionResult(success=False, tx_id="", error=str(e))
     
-    def repay_loan(self, borrower_address: str, private_key: str) -> TransactionResult:
-        """Repay a loan and get collateral back"""
+    def repay_loan(self, borrower_address: str, private_key: str, repay_amount: int = 0,
+                   position_id: int = 0) -> TransactionResult:
+        """Repay a loan and get collateral back, repay_amount is the vGold deposited in ASA mode"""
         try:
             # Get suggested parameters
             params = self.algod_client.suggested_params()
@@ -256,20 +707,20 @@ class ContractService:
                 sp=params,
                 index=self.config.lending_app_id,
                 on_complete=transaction.OnComplete.NoOpOC,
-                app_args=[b"repay"],
-                foreign_assets=[self.config.vgold_app_id]
+                app_args=[self._method("lending", "repay")] + self._position_args(position_id),
+                boxes=self._position_boxes(borrower_address, "borrow", position_id),
+                **self._vgold_refs()
             )
             
-            # Sign and submit
-            signed_txn = txn.sign(private_key)
-            tx_id = self.algod_client.send_transaction(signed_txn)
+            # Submit, with the vGold repayment in ASA mode
+            tx_id = self._submit_with_deposit(txn, borrower_address, repay_amount, params, private_key)
             
             return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.lending_app_id)
             
         except Exception as e:
             return TransactionResult(success=False, tx_id="", error=str(e))
     
-    def claim_lending_returns(self, lender_address: str, private_key: str) -> TransactionResult:
+    def claim_lending_returns(self, lender_address: str, private_key: str, position_id: int = 0) -> TransactionResult:
         """Claim returns from lending"""
         try:
             # Get suggested parameters
@@ -281,8 +732,9 @@ class ContractService:
                 sp=params,
                 index=self.config.lending_app_id,
                 on_complete=transaction.OnComplete.NoOpOC,
-                app_args=[b"claim"],
-                foreign_assets=[self.config.vgold_app_id]
+                app_args=[self._method("lending", "claim")] + self._position_args(position_id),
+                boxes=self._position_boxes(lender_address, "lend", position_id),
+                **self._vgold_refs()
             )
             
             # Sign and submit
@@ -294,47 +746,275 @@ class ContractService:
         except Exception as e:
             return TransactionResult(success=False, tx_id="", error=str(e))
     
-    def get_position(self, user_address: str, position_type: str) -> Dict:
-        """Get user's lending or borrowing position"""
+    def get_position(self, user_address: str, position_type: str, position_id: int = 0) -> Dict:
+        """Get user's lending or borrowing position, position_id selects one in box mode"""
+        if self.config.lending_positions == POSITIONS_BOX:
+            prefix, _, fields = POSITION_BOXES[position_type]
+            value = self._read_box(self.config.lending_app_id, prefix + decode_address(user_address) + position_id.to_bytes(8, 'big'))
+            if value is None:
+                raise Exception(f"No {position_type} position {position_id} for {user_address}")
+            return {"id": position_id, **self.decode_position(value, fields)}
+        
+        # Local mode: one packed record per kind, no position reads as all zero (status 0) like on chain
+        _, _, fields = POSITION_BOXES[position_type]
+        local_state = self._local_state(self.get_account_info(user_address), "lending")
+        return self.decode_position(local_state.get(position_type, bytes(len(fields) * 8)), fields)
+    
+    @staticmethod
+    def decode_position(value: bytes, fields: List[str]) -> Dict[str, int]:
+        """Decode a packed position record (box or local mode) in place, without slicing it"""
+        return dict(zip(fields, struct.unpack_from(f">{len(fields)}Q", value)))
+    
+    def get_position_value(self, position: Dict[str, int], position_type: str, now: int = None) -> int:
+        """Amount owed (borrow) or owed to the lender (lend) for a decoded position, as of now"""
+        pool = self.get_pool_totals(now)
+        return position["amount"] * pool[f"{position_type}_index"] // position["index"]
+    
+    def _global_state(self, contract: str) -> Dict:
+        """Global state of a contract keyed by field name, uints as int and byte slices as bytes"""
         try:
-            # Get suggested parameters
-            params = self.algod_client.suggested_params()
+            app_info = self.algod_client.application_info(self._app_id(contract))
+        except Exception as e:
+            raise Exception(f"Failed to read application state: {str(e)}")
+        
+        return decode_state(app_info['params'].get('global-state', []), GLOBAL_NAMES[contract])
+    
+    def get_pool_totals(self, now: int = None) -> Dict[str, int]:
+        """Lending pool totals with interest accrued to now, from global state in a single read"""
+        state = self._global_state("lending")
+        elapsed = max(0, (now or int(time.time())) - state["last_accrual"])
+        
+        # Mirrors the contract's accrual so totals are current between transactions
+        borrow_growth = state["borrow_index"] * state["borrow_rate"] * elapsed // (SECONDS_PER_YEAR * 10000)
+        lend_growth = state["lend_index"] * state["lend_rate"] * elapsed // (SECONDS_PER_YEAR * 10000)
+        reserves = state["reserves"] + state["total_scaled_borrowed"] * borrow_growth // INDEX_SCALE
+        reserves = max(0, reserves - state["total_scaled_lent"] * lend_growth // INDEX_SCALE)
+        borrow_index = state["borrow_index"] + borrow_growth
+        lend_index = state["lend_index"] + lend_growth
+        
+        return {
+            "borrow_index": borrow_index,
+            "lend_index": lend_index,
+            "total_borrowed": state["total_scaled_borrowed"] * borrow_index // INDEX_SCALE,
+            "total_lent": state["total_scaled_lent"] * lend_index // INDEX_SCALE,
+            "reserves": reserves,
+            "borrow_rate": state["borrow_rate"],
+            "lend_rate": state["lend_rate"],
+            "min_collateral_ratio": state["min_collateral_ratio"],
+            "liquidation_threshold": state["liquidation_threshold"],
+        }
+    
+    def get_trading_fee(self) -> int:
+        """Trading fee in basis points, from the trading contract's global state"""
+        return self._global_state("trading")["trading_fee"]
+    
+    def get_oracle_price(self) -> Tuple[int, int]:
+        """Oracle price in microALGO per vGold and the time it was last updated, from global state"""
+        state = self._global_state("oracle")
+        return state["current_price"], state["price_update_time"]
+
+    def get_cumulative_price(self, now: int = None) -> Tuple[int, int]:
+        """Oracle cumulative price in microALGO-seconds carried to now, and now, like the oracle's cumulative method"""
+        state = self._global_state("oracle")
+        now = now or int(time.time())
+        elapsed = max(0, now - state["price_update_time"])
+        return state.get("price_cumulative", 0) + state["current_price"] * elapsed, now
+
+    def get_twap(self, since: Tuple[int, int], now: int = None) -> int:
+        """Average oracle price from an earlier get_cumulative_price observation to now"""
+        start_cumulative, start_time = since
+        cumulative, now = self.get_cumulative_price(now)
+        if now <= start_time:
+            raise ValueError("TWAP window is empty")
+        return (cumulative - start_cumulative) // (now - start_time)
+
+    def get_price_history_count(self) -> int:
+        """Number of prices the oracle has recorded, including those overwritten in its history"""
+        return self._global_state("oracle").get("price_history", 0)
+    
+    def get_price_history_page(self, page: int) -> bytes:
+        """Raw (price, timestamp) uint64 pairs of one oracle history page, empty if it was never written"""
+        return self._read_box(self.config.oracle_app_id, history_box_name(page)) or b""
+    
+    def get_price_checkpoints(self) -> bytes:
+        """Raw hourly and daily price checkpoints of the oracle, empty before its first update"""
+        return self._read_box(self.config.oracle_app_id, CHECKPOINT_BOX) or b""
+    
+    def get_asset_prices(self) -> Dict[int, Dict[str, int]]:
+        """Registered multi-asset oracle slots by slot number, vGold's (slot 0) lives in global state"""
+        data = self._read_box(self.config.oracle_app_id, ASSETS_BOX) or b""
+        assets = {}
+        for slot in range(len(data) // ASSET_SLOT_BYTES):
+            record = data[slot * ASSET_SLOT_BYTES:(slot + 1) * ASSET_SLOT_BYTES]
+            values = dict(zip(ASSET_FIELDS, struct.unpack(f">{len(ASSET_FIELDS)}Q", record)))
+            if values["max_price"]:
+                assets[slot] = values
+        return assets
+    
+    def get_reporters(self) -> List[str]:
+        """Registered reporter addresses in registration (ascending) order"""
+        data = self._read_box(self.config.oracle_app_id, REPORTERS_BOX) or b""
+        keys = [data[i:i + REPORTER_BYTES] for i in range(0, len(data), REPORTER_BYTES)]
+        return [encode_address(key) for key in keys if any(key)]
+    
+    def get_reporter_settings(self) -> Tuple[int, int]:
+        """Reporter quorum and outlier bound in basis points, both 0 before reporters are registered"""
+        state = self._cached_state("oracle")
+        return state.get("reporter_quorum", 0), state.get("max_deviation", 0)
+    
+    def get_report_round(self) -> int:
+        """Last round the reporters' median was aggregated for, 0 before the first"""
+        return self._global_state("oracle").get("report_round", 0)
+    
+    def _next_history_box(self) -> bytes:
+        """History page the oracle's next price update writes to"""
+        slot = self.get_price_history_count() % HISTORY_CAPACITY
+        return history_box_name(slot // HISTORY_PAGE_SIZE)
+    
+    def _position_args(self, position_id: int) -> List[bytes]:
+        """Position id argument, only passed in box mode"""
+        if self.config.lending_positions != POSITIONS_BOX:
+            return []
+        return [position_id.to_bytes(8, 'big')]
+    
+    def _position_boxes(self, owner: str, position_type: str, position_id: int) -> List[Tuple[int, bytes]]:
+        """Box reference of an existing position, empty unless positions live in boxes"""
+        if self.config.lending_positions != POSITIONS_BOX:
+            return []
+        prefix, _, _ = POSITION_BOXES[position_type]
+        return [(0, prefix + decode_address(owner) + position_id.to_bytes(8, 'big'))]
+    
+    def _new_position_boxes(self, owner: str, position_type: str) -> List[Tuple[int, bytes]]:
+        """Box references for opening a position: the owner's id counter and the next position"""
+        if self.config.lending_positions != POSITIONS_BOX:
+            return []
+        _, count_prefix, _ = POSITION_BOXES[position_type]
+        next_id = self.get_position_count(owner, position_type)
+        return [(0, count_prefix + decode_address(owner))] + self._position_boxes(owner, position_type, next_id)
+    
+    def get_position_count(self, owner: str, position_type: str) -> int:
+        """Number of lend or borrow positions an account has opened, ids run from 0"""
+        _, count_prefix, _ = POSITION_BOXES[position_type]
+        value = self._read_box(self.config.lending_app_id, count_prefix + decode_address(owner))
+        return int.from_bytes(value, 'big') if value else 0
+    
+    def get_positions(self, owner: str, position_type: str, page: int = 0,
+                      page_size: int = POSITION_PAGE_SIZE, max_workers: int = BOX_READ_WORKERS) -> List[Dict]:
+        """One page of an account's box-mode positions, oldest first, read concurrently"""
+        count = self.get_position_count(owner, position_type)
+        ids = range(page * page_size, min((page + 1) * page_size, count))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(lambda position_id: self.get_position(owner, position_type, position_id), ids))
+    
+    def list_positions(self, position_type: str) -> List[Tuple[str, int]]:
+        """(owner, position id) of every box-mode position of a type"""
+        prefix, _, _ = POSITION_BOXES[position_type]
+        try:
+            boxes = self.algod_client.application_boxes(self.config.lending_app_id)
+        except Exception as e:
+            raise Exception(f"Failed to list positions: {str(e)}")
+        
+        # Position names are prefix + 32-byte owner + 8-byte id; counters share no prefix with them
+        positions = []
+        for box in boxes['boxes']:
+            name = base64.b64decode(box['name'])
+            if len(name) == len(prefix) + 40 and name.startswith(prefix):
+                owner = encode_address(name[len(prefix):len(prefix) + 32])
+                positions.append((owner, int.from_bytes(name[-8:], 'big')))
+        return positions
+    
+    def liquidate_positions(self, liquidator_address: str, positions: List[Tuple[str, int]],
+                            private_key: str) -> List[TransactionResult]:
+        """Liquidate (borrower, position id) pairs in full liquidate_batch calls, one result per submitted group.
+        The contract skips positions that are healthy or already closed; ids are ignored in local mode."""
+        results = []
+        params = self.algod_client.suggested_params()
+        batch_size = MAX_LIQUIDATION_BATCH[self.config.lending_positions]
+        batches = [positions[i:i + batch_size] for i in range(0, len(positions), batch_size)]
+        
+        # Each call pays for itself, the collateral payout and any budget top-up calls
+        params.flat_fee = True
+        
+        # Pack up to MAX_GROUP_SIZE liquidate_batch calls into each atomic group
+        for start in range(0, len(batches), MAX_GROUP_SIZE):
+            try:
+                txns = []
+                for batch in batches[start:start + MAX_GROUP_SIZE]:
+                    opups = -(-len(batch) * LIQUIDATION_ITEM_BUDGET // APP_CALL_BUDGET)
+                    params.fee = params.min_fee * (2 + opups)
+                    if self.config.lending_positions == POSITIONS_BOX:
+                        keys = [decode_address(owner) + position_id.to_bytes(8, 'big') for owner, position_id in batch]
+                        refs = {"app_args": [self._method("lending", "liquidate_batch")] + keys,
+                                "boxes": [(0, BORROW_BOX_PREFIX + key) for key in keys]}
+                    else:
+                        refs = {"app_args": [self._method("lending", "liquidate_batch")],
+                                "accounts": [owner for owner, _ in batch]}
+                    txns.append(transaction.ApplicationCallTxn(
+                        sender=liquidator_address,
+                        sp=params,
+                        index=self.config.lending_app_id,
+                        on_complete=transaction.OnComplete.NoOpOC,
+                        foreign_apps=[self.config.oracle_app_id],
+                        **refs
+                    ))
+                
+                # Group transactions
+                if len(txns) > 1:
+                    gid = transaction.calculate_group_id(txns)
+                    for txn in txns:
+                        txn.group = gid
+                
+                # Sign and submit
+                tx_id = self.algod_client.send_transactions([txn.sign(private_key) for txn in txns])
+                results.append(TransactionResult(success=True, tx_id=tx_id, app_id=self.config.lending_app_id))
+                
+            except Exception as e:
+                results.append(TransactionResult(success=False, tx_id="", error=str(e)))
+        
+        return results
+    
+    def update_trading_fee(self, new_fee: int, private_key: str) -> TransactionResult:
+        """Set the trading fee in basis points (manager only)"""
+        try:
+            reason = self.check_trading_fee(self.config.manager_address, new_fee)
+            if reason:
+                return self._reject("update_fee", reason)
             
-            # Create the transaction
+            params = self.algod_client.suggested_params()
             txn = transaction.ApplicationCallTxn(
-                sender=user_address,
+                sender=self.config.manager_address,
                 sp=params,
-                index=self.config.lending_app_id,
+                index=self.config.trading_app_id,
                 on_complete=transaction.OnComplete.NoOpOC,
-                app_args=[b"position", position_type.encode()]
+                app_args=[self._method("trading", "update_fee"), new_fee.to_bytes(8, 'big')]
             )
             
-            # This would need to be properly executed and the result parsed
-            # For now, return empty position
-            return {
-                "amount": 0,
-                "start_time": 0,
-                "duration": 0,
-                "interest_rate": 0,
-                "status": 0
-            }
+            tx_id = self.algod_client.send_transaction(txn.sign(private_key))
+            self._state_cache.pop(("state", "trading"), None)
+            return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.trading_app_id)
             
         except Exception as e:
-            raise Exception(f"Failed to get position: {str(e)}")
+            return TransactionResult(success=False, tx_id="", error=str(e))
     
     def update_price(self, new_price: int, private_key: str) -> TransactionResult:
-        """Update vGold price (oracle only)"""
+        """Update vGold price (oracle only), signed by the oracle address's key"""
         try:
+            sender = account.address_from_private_key(private_key)
+            reason = self.check_price_update(sender, new_price)
+            if reason:
+                return self._reject("update_price", reason)
+            
             # Get suggested parameters
             params = self.algod_client.suggested_params()
             
             # Create the transaction
             txn = transaction.ApplicationCallTxn(
-                sender=self.config.manager_address,
+                sender=sender,
                 sp=params,
                 index=self.config.oracle_app_id,
                 on_complete=transaction.OnComplete.NoOpOC,
-                app_args=[b"update", new_price.to_bytes(8, 'big')]
+                app_args=[self._method("oracle", "update"), new_price.to_bytes(8, 'big')],
+                boxes=[(0, self._next_history_box()), (0, CHECKPOINT_BOX)]
             )
             
             # Sign and submit
@@ -345,6 +1025,128 @@ class ContractService:
             
         except Exception as e:
             return TransactionResult(success=False, tx_id="", error=str(e))
+    
+    def update_prices(self, prices: Dict[int, int], private_key: str) -> TransactionResult:
+        """Set many assets' prices, by oracle slot, in one update_prices call (oracle only, multi-asset mode)"""
+        try:
+            sender = account.address_from_private_key(private_key)
+            reason = self.check_asset_prices(sender, prices)
+            if reason:
+                return self._reject("update_prices", reason)
+            
+            packed = b"".join(struct.pack(">QQ", slot, price) for slot, price in sorted(prices.items()))
+            boxes = [(0, ASSETS_BOX)]
+            budget = len(prices) * PRICE_ITEM_BUDGET
+            if VGOLD_ASSET_SLOT in prices:
+                boxes += [(0, self._next_history_box()), (0, CHECKPOINT_BOX)]
+                budget += VGOLD_PRICE_BUDGET
+            
+            # The call pays for itself and any budget top-up calls
+            params = self.algod_client.suggested_params()
+            params.flat_fee = True
+            opups = -(-budget // APP_CALL_BUDGET)
+            params.fee = params.min_fee * (1 + opups)
+            
+            txn = transaction.ApplicationCallTxn(
+                sender=sender,
+                sp=params,
+                index=self.config.oracle_app_id,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=[self._method("oracle", "update_prices"), packed],
+                boxes=boxes
+            )
+            
+            tx_id = self.algod_client.send_transaction(txn.sign(private_key))
+            self._state_cache.pop(("assets",), None)
+            return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.oracle_app_id)
+            
+        except Exception as e:
+            return TransactionResult(success=False, tx_id="", error=str(e))
+
+    def set_reporters(self, reporters: List[str], quorum: int, max_deviation: int,
+                      private_key: str) -> TransactionResult:
+        """Replace the oracle's reporter set, quorum and outlier bound in basis points (manager only)"""
+        try:
+            # The contract takes the addresses in ascending order
+            keys = sorted(decode_address(reporter) for reporter in reporters)
+            params = self.algod_client.suggested_params()
+            txn = transaction.ApplicationCallTxn(
+                sender=self.config.manager_address,
+                sp=params,
+                index=self.config.oracle_app_id,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=[
+                    self._method("oracle", "set_reporters"), b"".join(keys),
+                    quorum.to_bytes(8, 'big'), max_deviation.to_bytes(8, 'big'),
+                ],
+                boxes=[(0, REPORTERS_BOX)]
+            )
+            
+            tx_id = self.algod_client.send_transaction(txn.sign(private_key))
+            self._state_cache.pop(("state", "oracle"), None)
+            self._state_cache.pop(("reporters",), None)
+            return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.oracle_app_id)
+            
+        except Exception as e:
+            return TransactionResult(success=False, tx_id="", error=str(e))
+    
+    def aggregate_prices(self, round_number: int, quotes: Dict[str, int],
+                         sign_report: Callable[[str, transaction.Transaction], transaction.SignedTransaction],
+                         private_key: str) -> TransactionResult:
+        """Submit reporters' quotes for a round as one atomic group: a report call per reporter,
+        sorted by price, then the aggregate call that sets the median. sign_report(reporter, txn)
+        returns the reporter's signature; the aggregating account pays every fee."""
+        try:
+            reason = self.check_reports(quotes)
+            if reason:
+                return self._reject("aggregate", reason)
+            
+            sender = account.address_from_private_key(private_key)
+            indexes = {reporter: i for i, reporter in enumerate(self._cached(("reporters",), self.get_reporters))}
+            round_arg = round_number.to_bytes(8, 'big')
+            
+            # Reports are free, the aggregate call pays for the whole group
+            params = self.algod_client.suggested_params()
+            params.flat_fee = True
+            params.fee = 0
+            txns = [
+                transaction.ApplicationCallTxn(
+                    sender=reporter,
+                    sp=params,
+                    index=self.config.oracle_app_id,
+                    on_complete=transaction.OnComplete.NoOpOC,
+                    app_args=[
+                        self._method("oracle", "report"), round_arg,
+                        price.to_bytes(8, 'big'), indexes[reporter].to_bytes(8, 'big'),
+                    ]
+                )
+                for reporter, price in sorted(quotes.items(), key=lambda quote: quote[1])
+            ]
+            
+            aggregate_params = self.algod_client.suggested_params()
+            aggregate_params.flat_fee = True
+            aggregate_params.fee = aggregate_params.min_fee * (len(txns) + 1)
+            txns.append(transaction.ApplicationCallTxn(
+                sender=sender,
+                sp=aggregate_params,
+                index=self.config.oracle_app_id,
+                on_complete=transaction.OnComplete.NoOpOC,
+                app_args=[self._method("oracle", "aggregate"), round_arg],
+                boxes=[(0, REPORTERS_BOX), (0, self._next_history_box()), (0, CHECKPOINT_BOX)]
+            ))
+            
+            # Group transactions, then collect every reporter's signature
+            gid = transaction.calculate_group_id(txns)
+            for txn in txns:
+                txn.group = gid
+            signed = [sign_report(txn.sender, txn) for txn in txns[:-1]] + [txns[-1].sign(private_key)]
+            
+            tx_id = self.algod_client.send_transactions(signed)
+            self._state_cache.pop(("state", "oracle"), None)
+            return TransactionResult(success=True, tx_id=tx_id, app_id=self.config.oracle_app_id)
+            
+        except Exception as e:
+            return TransactionResult(success=False, tx_id="", error=str(e))
 
 # Factory function to create contract service
 def create_contract_service(algod_client: algod.AlgodClient, config_dict: Dict) -> ContractService:
@@ -352,6 +1154,27 @@ def create_contract_service(algod_client: algod.AlgodClient, config_dict: Dict)
     config = ContractConfig(**config_dict)
     return ContractService(algod_client, config)
 
+def load_deployed_config(path: str) -> Dict:
+    """ContractService config from the deploy_contracts.py output"""
+    with open(path) as f:
+        deployed = json.load(f)
+    
+    contracts = deployed["contracts"]
+    return {
+        "vgold_app_id": contracts["vgold"]["app_id"],
+        "trading_app_id": contracts["trading"]["app_id"],
+        "lending_app_id": contracts["lending"]["app_id"],
+        "oracle_app_id": contracts["oracle"]["app_id"],
+        "manager_address": deployed["manager_address"],
+        "treasury_address": deployed["manager_address"],
+        "dispatch": deployed["dispatch"],
+        "vgold_balances": deployed["vgold_balances"],
+        "vgold_asset_id": deployed["vgold_asset_id"],
+        "lending_positions": deployed["lending_positions"],
+        "oracle_assets": deployed.get("oracle_assets", ASSETS_SINGLE),
+        "oracle_reporters": deployed.get("oracle_reporters", REPORTERS_SINGLE),
+    }
+
 # Example usage and configuration
 if __name__ == "__main__":
     # Example configuration
@@ -361,7 +1184,13 @@ if __name__ == "__main__":
         "lending_app_id": 0,  # Will be set after deployment
         "oracle_app_id": 0,  # Will be set after deployment
         "manager_address": "YOUR_MANAGER_ADDRESS",
-        "treasury_address": "YOUR_TREASURY_ADDRESS"
+        "treasury_address": "YOUR_TREASURY_ADDRESS",
+        "dispatch": "names",  # or "selector"
+        "vgold_balances": "local",  # or "box", "asa"
+        "vgold_asset_id": 0,  # ASA mode only, set after create_asset
+        "lending_positions": "local",  # or "box"
+        "oracle_assets": "single",  # or "multi"
+        "oracle_reporters": "single"  # or "median"
     }
     
     print("Contract Service created successfully!")
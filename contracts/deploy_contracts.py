@@ -9,20 +9,56 @@ from typing import Dict, List, Tuple
 from algosdk import account, mnemonic
 from algosdk.v2client import algod
 from algosdk import transaction
-from algosdk.encoding import encode_address
+from algosdk.encoding import decode_address
 import base64
 
 # Import compiled contracts
-from vgold_token import vgold_token
+from vgold_token import BALANCES_ASA, BALANCES_BOX, BALANCES_LOCAL, vgold_token
 from trading_contract import trading_contract
-from lending_contract import lending_contract
-from price_oracle import price_oracle
+from lending_contract import POSITIONS_BOX, POSITIONS_LOCAL, lending_contract
+from price_oracle import (
+    ASSET_SLOT_BYTES, ASSETS_BOX, ASSETS_MULTI, ASSETS_SINGLE, CHECKPOINT_BOX, CHECKPOINT_BYTES,
+    HISTORY_PAGE_BYTES, HISTORY_PAGES, MAX_ASSETS, MAX_REPORTERS, REPORTER_BYTES, REPORTERS_BOX, REPORTERS_MEDIAN,
+    REPORTERS_SINGLE, history_box_name, price_oracle,
+)
+from router import CONTRACT_METHODS, DISPATCH_NAMES, VGOLD_METHODS, method_arg
+
+# Initial vGold supply, and the app funding for the app account's own minimum balance and first boxes
+INITIAL_SUPPLY = 1000000000
+BOX_FUNDING = 1000000
+
+# App account funding for holding an ASA (base plus one asset minimum balance)
+ASSET_FUNDING = 300000
+
+# Oracle app funding: base minimum balance plus every price history box and the checkpoint box
+HISTORY_FUNDING = (
+    100000
+    + HISTORY_PAGES * (2500 + 400 * (len(history_box_name(0)) + HISTORY_PAGE_BYTES))
+    + 2500 + 400 * (len(CHECKPOINT_BOX) + CHECKPOINT_BYTES)
+)
+
+# Extra oracle app funding for the multi-asset price box
+ASSETS_FUNDING = 2500 + 400 * (len(ASSETS_BOX) + MAX_ASSETS * ASSET_SLOT_BYTES)
+
+# Extra oracle app funding for the median mode reporter box
+REPORTERS_FUNDING = 2500 + 400 * (len(REPORTERS_BOX) + MAX_REPORTERS * REPORTER_BYTES)
+
+# Approval plus clear program bytes per program page, and the extra pages allowed
+PROGRAM_PAGE_SIZE = 2048
+MAX_EXTRA_PAGES = 3
 
 class ContractDeployer:
     """Handles deployment of all GoldChain smart contracts"""
     
-    def __init__(self, algod_client: algod.AlgodClient, manager_mnemonic: str):
+    def __init__(self, algod_client: algod.AlgodClient, manager_mnemonic: str, dispatch: str = DISPATCH_NAMES,
+                 balances: str = BALANCES_LOCAL, positions: str = POSITIONS_LOCAL, assets: str = ASSETS_SINGLE,
+                 reporters: str = REPORTERS_SINGLE):
         self.algod_client = algod_client
+        self.dispatch = dispatch
+        self.balances = balances
+        self.positions = positions
+        self.assets = assets
+        self.reporters = reporters
         self.manager_private_key = mnemonic.to_private_key(manager_mnemonic)
         self.manager_address = account.address_from_private_key(self.manager_private_key)
         
@@ -37,7 +73,9 @@ class ContractDeployer:
         except Exception as e:
             raise Exception(f"Failed to compile contract: {str(e)}")
     
-    def deploy_contract(self, contract_teal: str, app_args: List[bytes] = None) -> Tuple[int, str]:
+    def deploy_contract(self, contract_teal: str, app_args: List[bytes] = None,
+                        global_schema: transaction.StateSchema = None,
+                        local_schema: transaction.StateSchema = None) -> Tuple[int, str]:
         """Deploy a smart contract and return app ID and address"""
         try:
             # Compile contract
@@ -46,6 +84,11 @@ class ContractDeployer:
             # Get suggested parameters
             params = self.algod_client.suggested_params()
             
+            # The approval program doubles as the clear program, so both count against the pages
+            extra_pages = (2 * len(compiled_program) - 1) // PROGRAM_PAGE_SIZE
+            if extra_pages > MAX_EXTRA_PAGES:
+                raise Exception(f"Program too large: {len(compiled_program)} bytes")
+            
             # Create application creation transaction
             txn = transaction.ApplicationCreateTxn(
                 sender=self.manager_address,
@@ -53,9 +96,10 @@ class ContractDeployer:
                 on_complete=transaction.OnComplete.NoOpOC,
                 approval_program=compiled_program,
                 clear_program=compiled_program,  # Using same program for both
-                global_schema=transaction.StateSchema(num_uints=10, num_byte_slices=10),
-                local_schema=transaction.StateSchema(num_uints=10, num_byte_slices=10),
-                app_args=app_args or []
+                global_schema=global_schema or transaction.StateSchema(num_uints=10, num_byte_slices=10),
+                local_schema=local_schema or transaction.StateSchema(num_uints=10, num_byte_slices=10),
+                app_args=app_args or [],
+                extra_pages=extra_pages
             )
             
             # Sign and submit transaction
@@ -81,25 +125,137 @@ class ContractDeployer:
         
         # Compile the contract
         from pyteal import compileTeal, Mode
-        contract_teal = compileTeal(vgold_token(), Mode.Application, version=6)
+        contract_teal = compileTeal(vgold_token(self.dispatch, self.balances), Mode.Application, version=8)
         
         # Deploy contract
         app_id, app_address = self.deploy_contract(contract_teal)
         
+        if self.balances == BALANCES_BOX:
+            self.mint_box_supply(app_id, app_address)
+        elif self.balances == BALANCES_ASA:
+            self.contract_addresses['vgold_asset_id'] = self.create_vgold_asset(app_id, app_address)
+        
         print(f"vGold Token deployed - App ID: {app_id}, Address: {app_address}")
         return app_id, app_address
     
+    def mint_box_supply(self, app_id: int, app_address: str):
+        """Fund the box-mode vGold app and mint the initial supply to the manager"""
+        params = self.algod_client.suggested_params()
+        
+        # Grouped right before the mint, so it also pays for the manager's new balance box
+        fund_txn = transaction.PaymentTxn(
+            sender=self.manager_address,
+            sp=params,
+            receiver=app_address,
+            amt=BOX_FUNDING
+        )
+        mint_txn = transaction.ApplicationNoOpTxn(
+            sender=self.manager_address,
+            sp=params,
+            index=app_id,
+            app_args=[method_arg(VGOLD_METHODS, "mint", self.dispatch), INITIAL_SUPPLY.to_bytes(8, 'big')],
+            accounts=[self.manager_address],
+            boxes=[(0, decode_address(self.manager_address))]
+        )
+        
+        gid = transaction.calculate_group_id([fund_txn, mint_txn])
+        fund_txn.group = gid
+        mint_txn.group = gid
+        
+        tx_id = self.algod_client.send_transactions([
+            fund_txn.sign(self.manager_private_key),
+            mint_txn.sign(self.manager_private_key)
+        ])
+        transaction.wait_for_confirmation(self.algod_client, tx_id, 4)
+        print(f"Minted {INITIAL_SUPPLY} vGold into the manager's balance box")
+    
+    def call_with_funding(self, app_id: int, app_address: str, app_args: List[bytes], funding: int,
+                          foreign_assets: List[int] = None) -> Dict:
+        """Fund an app account and call it in one group, paying for one inner transaction"""
+        params = self.algod_client.suggested_params()
+        
+        fund_txn = transaction.PaymentTxn(
+            sender=self.manager_address,
+            sp=params,
+            receiver=app_address,
+            amt=funding
+        )
+        
+        # Flat fee covers the inner transaction
+        call_params = self.algod_client.suggested_params()
+        call_params.flat_fee = True
+        call_params.fee = 2 * call_params.min_fee
+        call_txn = transaction.ApplicationNoOpTxn(
+            sender=self.manager_address,
+            sp=call_params,
+            index=app_id,
+            app_args=app_args,
+            foreign_assets=foreign_assets or []
+        )
+        
+        gid = transaction.calculate_group_id([fund_txn, call_txn])
+        fund_txn.group = gid
+        call_txn.group = gid
+        
+        self.algod_client.send_transactions([
+            fund_txn.sign(self.manager_private_key),
+            call_txn.sign(self.manager_private_key)
+        ])
+        return transaction.wait_for_confirmation(self.algod_client, call_txn.get_txid(), 4)
+    
+    def fund_app(self, app_address: str, amount: int):
+        """Fund an app account, e.g. for box minimum balances"""
+        txn = transaction.PaymentTxn(
+            sender=self.manager_address,
+            sp=self.algod_client.suggested_params(),
+            receiver=app_address,
+            amt=amount
+        )
+        tx_id = self.algod_client.send_transaction(txn.sign(self.manager_private_key))
+        transaction.wait_for_confirmation(self.algod_client, tx_id, 4)
+    
+    def create_vgold_asset(self, app_id: int, app_address: str) -> int:
+        """Have the ASA-mode vGold app create the vGold ASA with itself as reserve"""
+        result = self.call_with_funding(
+            app_id, app_address, [method_arg(VGOLD_METHODS, "create_asset", self.dispatch)], ASSET_FUNDING
+        )
+        asset_id = result['inner-txns'][0]['asset-index']
+        
+        print(f"vGold ASA created - Asset ID: {asset_id}")
+        return asset_id
+    
+    def opt_in_vgold_asset(self, contract: str, app_id: int, app_address: str):
+        """Opt a trading or lending app into the vGold ASA"""
+        self.call_with_funding(
+            app_id, app_address,
+            [method_arg(CONTRACT_METHODS[contract], "opt_in_asset", self.dispatch)],
+            ASSET_FUNDING,
+            [self.contract_addresses['vgold_asset_id']]
+        )
+        print(f"{contract.capitalize()} contract opted in to the vGold ASA")
+    
+    def vgold_arg(self, vgold_app_id: int) -> bytes:
+        """Creation argument pointing a contract at vGold: the ASA id in ASA mode, the app id otherwise"""
+        if self.balances == BALANCES_ASA:
+            return self.contract_addresses['vgold_asset_id'].to_bytes(8, 'big')
+        return vgold_app_id.to_bytes(8, 'big')
+    
     def deploy_price_oracle(self) -> Tuple[int, str]:
         """Deploy price oracle contract"""
         print("Deploying Price Oracle Contract...")
         
         # Compile the contract
         from pyteal import compileTeal, Mode
-        contract_teal = compileTeal(price_oracle(), Mode.Application, version=6)
+        contract_teal = compileTeal(price_oracle(self.dispatch, self.assets, self.reporters), Mode.Application, version=8)
         
         # Deploy contract
         app_id, app_address = self.deploy_contract(contract_teal)
         
+        # The app account pays the minimum balance of its price history (and asset and reporter) boxes
+        funding = HISTORY_FUNDING + (ASSETS_FUNDING if self.assets == ASSETS_MULTI else 0)
+        funding += REPORTERS_FUNDING if self.reporters == REPORTERS_MEDIAN else 0
+        self.fund_app(app_address, funding)
+        
         print(f"Price Oracle deployed - App ID: {app_id}, Address: {app_address}")
         return app_id, app_address
     
@@ -109,31 +265,39 @@ class ContractDeployer:
         
         # Compile the contract
         from pyteal import compileTeal, Mode
-        contract_teal = compileTeal(trading_contract(), Mode.Application, version=6)
+        contract_teal = compileTeal(trading_contract(self.dispatch, self.balances), Mode.Application, version=8)
         
-        # Deploy with vGold app ID and oracle address as arguments
-        app_args = [
-            vgold_app_id.to_bytes(8, 'big'),
-            encode_address(self.contract_addresses['oracle'])
-        ]
+        # Deploy with vGold app ID (or ASA id) and the oracle app ID trades price against
+        app_args = [self.vgold_arg(vgold_app_id), oracle_app_id.to_bytes(8, 'big')]
         
         app_id, app_address = self.deploy_contract(contract_teal, app_args)
+        if self.balances == BALANCES_ASA:
+            self.opt_in_vgold_asset("trading", app_id, app_address)
         
         print(f"Trading Contract deployed - App ID: {app_id}, Address: {app_address}")
         return app_id, app_address
     
-    def deploy_lending_contract(self, vgold_app_id: int) -> Tuple[int, str]:
+    def deploy_lending_contract(self, vgold_app_id: int, oracle_app_id: int) -> Tuple[int, str]:
         """Deploy lending contract"""
         print("Deploying Lending Contract...")
         
         # Compile the contract
         from pyteal import compileTeal, Mode
-        contract_teal = compileTeal(lending_contract(), Mode.Application, version=6)
+        contract_teal = compileTeal(lending_contract(self.dispatch, self.balances, self.positions), Mode.Application, version=8)
         
-        # Deploy with vGold app ID as argument
-        app_args = [vgold_app_id.to_bytes(8, 'big')]
+        # Deploy with vGold app ID (or ASA id) and the oracle app ID liquidations price against
+        app_args = [self.vgold_arg(vgold_app_id), oracle_app_id.to_bytes(8, 'big')]
         
-        app_id, app_address = self.deploy_contract(contract_teal, app_args)
+        # Interest index state needs more global uints, local positions are one packed record per kind
+        app_id, app_address = self.deploy_contract(
+            contract_teal, app_args,
+            global_schema=transaction.StateSchema(num_uints=16, num_byte_slices=4),
+            local_schema=transaction.StateSchema(num_uints=0, num_byte_slices=2)
+        )
+        if self.balances == BALANCES_ASA:
+            self.opt_in_vgold_asset("lending", app_id, app_address)
+        if self.positions == POSITIONS_BOX:
+            self.fund_app(app_address, BOX_FUNDING)
         
         print(f"Lending Contract deployed - App ID: {app_id}, Address: {app_address}")
         return app_id, app_address
@@ -160,7 +324,7 @@ class ContractDeployer:
             self.contract_addresses['trading_app_id'] = trading_app_id
             
             # 4. Deploy Lending Contract
-            lending_app_id, lending_address = self.deploy_lending_contract(vgold_app_id)
+            lending_app_id, lending_address = self.deploy_lending_contract(vgold_app_id, oracle_app_id)
             self.contract_addresses['lending'] = lending_address
             self.contract_addresses['lending_app_id'] = lending_app_id
             
@@ -179,6 +343,12 @@ class ContractDeployer:
         config = {
             "network": "testnet",
             "manager_address": self.manager_address,
+            "dispatch": self.dispatch,
+            "vgold_balances": self.balances,
+            "vgold_asset_id": self.contract_addresses.get('vgold_asset_id', 0),
+            "lending_positions": self.positions,
+            "oracle_assets": self.assets,
+            "oracle_reporters": self.reporters,
             "contracts": {
                 "vgold": {
                     "app_id": self.contract_addresses['vgold_app_id'],
@@ -207,6 +377,7 @@ class ContractDeployer:
         # Also save environment variables format
         env_content = f"""# GoldChain Smart Contract Addresses
 REACT_APP_VGOLD_APP_ID={self.contract_addresses['vgold_app_id']}
+REACT_APP_VGOLD_ASSET_ID={self.contract_addresses.get('vgold_asset_id', 0)}
 REACT_APP_TRADING_APP_ID={self.contract_addresses['trading_app_id']}
 REACT_APP_LENDING_APP_ID={self.contract_addresses['lending_app_id']}
 REACT_APP_ORACLE_APP_ID={self.contract_addresses['oracle_app_id']}
@@ -245,6 +416,11 @@ def main():
     # Configuration
     ALGOD_URL = os.getenv("ALGOD_URL", "https://testnet-api.algonode.cloud")
     ALGOD_TOKEN = os.getenv("ALGOD_TOKEN", "")
+    DISPATCH = os.getenv("GOLDCHAIN_DISPATCH", DISPATCH_NAMES)
+    BALANCES = os.getenv("GOLDCHAIN_BALANCES", BALANCES_LOCAL)
+    POSITIONS = os.getenv("GOLDCHAIN_POSITIONS", POSITIONS_LOCAL)
+    ASSETS = os.getenv("GOLDCHAIN_ORACLE_ASSETS", ASSETS_SINGLE)
+    REPORTERS = os.getenv("GOLDCHAIN_ORACLE_REPORTERS", REPORTERS_SINGLE)
     
     # Manager mnemonic (read securely from environment)
     MANAGER_MNEMONIC = os.getenv("DEPLOYER_MNEMONIC", "").strip()
@@ -257,7 +433,7 @@ def main():
         algod_client = algod.AlgodClient(ALGOD_TOKEN, ALGOD_URL)
         
         # Create deployer
-        deployer = ContractDeployer(algod_client, MANAGER_MNEMONIC)
+        deployer = ContractDeployer(algod_client, MANAGER_MNEMONIC, DISPATCH, BALANCES, POSITIONS, ASSETS, REPORTERS)
         
         # Deploy all contracts
         deployer.setup_contracts()
@@ -4,167 +4,291 @@ Handles lending and borrowing operations with collateral management.
 """
 
 from pyteal import *
+from algo_payment import receive_algo, received_algo
+from oracle_twap import load_oracle_cumulative, twap
+from router import DISPATCH_NAMES, HOT_METHODS, LENDING_METHODS, VGOLD_METHODS, method_arg, route_noop
+from state_keys import LENDING_KEYS, LENDING_LOCAL_KEYS, ORACLE_KEYS
+from vgold_asset import VGOLD_ASSET_ID, opt_in_vgold, receive_vgold, send_vgold
+from vgold_token import BALANCES_ASA, BALANCES_LOCAL
 
-def lending_contract():
+# Position storage modes
+POSITIONS_LOCAL = "local"  # one lend and one borrow position per account in local state
+POSITIONS_BOX = "box"      # any number per account, one box per (account, position id)
+
+# Box mode: name prefixes (followed by the 32-byte owner address and, for positions,
+# the 8-byte position id) and the uint64 fields packed in each record, in order
+LEND_BOX_PREFIX = b"l"
+BORROW_BOX_PREFIX = b"b"
+LEND_COUNT_PREFIX = b"nl"    # next lend position id of an owner
+BORROW_COUNT_PREFIX = b"nb"  # next borrow position id of an owner
+LEND_FIELDS = ["amount", "start_time", "duration", "index", "status"]
+BORROW_FIELDS = ["amount", "collateral", "start_time", "duration", "index", "status"]
+
+# Interest indexes: a position owes (or earns) amount * current index / index at open
+INDEX_SCALE = 1_000_000_000  # index value of 1.0
+SECONDS_PER_YEAR = 365 * 86400
+DEFAULT_BORROW_RATE = 600  # 6% APR in basis points
+DEFAULT_LEND_RATE = 400    # 4% APR in basis points
+
+# Collateral ratios in percent: required to borrow, and below which a position is liquidatable
+DEFAULT_MIN_COLLATERAL_RATIO = 150
+DEFAULT_LIQUIDATION_THRESHOLD = 120
+
+# Liquidation: oracle prices are microALGO per whole vGold (6 decimals), and
+# liquidate_batch asks for this much opcode budget per position
+VGOLD_UNIT = 1_000_000
+LIQUIDATION_DISCOUNT = 5000
+LIQUIDATION_ITEM_BUDGET = 150
+
+def lending_contract(dispatch: str = DISPATCH_NAMES, balances: str = BALANCES_LOCAL,
+                     positions: str = POSITIONS_LOCAL):
     """Main lending contract logic"""
+    if positions not in (POSITIONS_LOCAL, POSITIONS_BOX):
+        raise ValueError(f"Unknown position storage mode: {positions}")
+    use_boxes = positions == POSITIONS_BOX
+    
+    # In ASA mode vGold moves as asset transfers instead of calls to the token app
+    use_asa = balances == BALANCES_ASA
+    
+    # Inner call to the vGold token app (app mode)
+    def vgold_call(method, amount, sender, accounts=None):
+        fields = {
+            TxnField.type_enum: TxnType.ApplicationCall,
+            TxnField.application_id: App.globalGet(VGOLD_APP_ID),
+            TxnField.application_args: [Bytes(method_arg(VGOLD_METHODS, method, dispatch)), Itob(amount)],
+            TxnField.sender: sender,
+        }
+        if accounts:
+            fields[TxnField.accounts] = accounts
+        return Seq([
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.SetFields(fields),
+            InnerTxnBuilder.Submit(),
+        ])
     
     # Global state keys
-    VGOLD_APP_ID = Bytes("vgold_app_id")
-    MANAGER = Bytes("manager")
-    TREASURY = Bytes("treasury")
-    MIN_COLLATERAL_RATIO = Bytes("min_collateral_ratio")
-    LIQUIDATION_THRESHOLD = Bytes("liquidation_threshold")
-    
-    # Local state keys for positions
-    LEND_AMOUNT = Bytes("lend_amount")
-    LEND_START = Bytes("lend_start")
-    LEND_DURATION = Bytes("lend_duration")
-    LEND_INTEREST = Bytes("lend_interest")
-    LEND_STATUS = Bytes("lend_status")
-    
-    BORROW_AMOUNT = Bytes("borrow_amount")
-    BORROW_COLLATERAL = Bytes("borrow_collateral")
-    BORROW_START = Bytes("borrow_start")
-    BORROW_DURATION = Bytes("borrow_duration")
-    BORROW_INTEREST = Bytes("borrow_interest")
-    BORROW_STATUS = Bytes("borrow_status")
+    VGOLD_APP_ID = Bytes(LENDING_KEYS["vgold_app_id"])
+    MANAGER = Bytes(LENDING_KEYS["manager"])
+    TREASURY = Bytes(LENDING_KEYS["treasury"])
+    MIN_COLLATERAL_RATIO = Bytes(LENDING_KEYS["min_collateral_ratio"])
+    LIQUIDATION_THRESHOLD = Bytes(LENDING_KEYS["liquidation_threshold"])
+    ORACLE_APP_ID = Bytes(LENDING_KEYS["oracle_app_id"])
+    
+    # Global state keys for the interest index model
+    BORROW_INDEX = Bytes(LENDING_KEYS["borrow_index"])
+    LEND_INDEX = Bytes(LENDING_KEYS["lend_index"])
+    BORROW_RATE = Bytes(LENDING_KEYS["borrow_rate"])
+    LEND_RATE = Bytes(LENDING_KEYS["lend_rate"])
+    LAST_ACCRUAL = Bytes(LENDING_KEYS["last_accrual"])
+    TOTAL_SCALED_BORROWED = Bytes(LENDING_KEYS["total_scaled_borrowed"])
+    TOTAL_SCALED_LENT = Bytes(LENDING_KEYS["total_scaled_lent"])
+    RESERVES = Bytes(LENDING_KEYS["reserves"])
+    
+    # Local state keys for positions: each account's lend and borrow record, packed like the boxes
+    LOCAL_KEYS = {kind: Bytes(LENDING_LOCAL_KEYS[kind]) for kind in ("lend", "borrow")}
+    BOX_PREFIXES = {"lend": LEND_BOX_PREFIX, "borrow": BORROW_BOX_PREFIX}
+    COUNT_PREFIXES = {"lend": LEND_COUNT_PREFIX, "borrow": BORROW_COUNT_PREFIX}
+    BOX_FIELDS = {"lend": LEND_FIELDS, "borrow": BORROW_FIELDS}
+    
+    # Position ids are per owner and kind, and never reused
+    position_id = ScratchVar(TealType.uint64)
+    
+    def position_box(kind, owner, position_id_bytes):
+        return Concat(Bytes(BOX_PREFIXES[kind]), owner, position_id_bytes)
+    
+    # The position record loaded by load_position, its fields read with get_field
+    position_record = ScratchVar(TealType.bytes)
+    
+    # Load a position's packed record with one state read, all zero (status 0) if there is none.
+    # Local mode reads the account at account_index, box mode the owner's 8-byte position id
+    # (application_args[1] by default).
+    def load_position(kind, account_index=Int(0), owner=Txn.sender(), id_bytes=Txn.application_args[1]):
+        if use_boxes:
+            record = App.box_get(position_box(kind, owner, id_bytes))
+        else:
+            record = App.localGetEx(account_index, Global.current_application_id(), LOCAL_KEYS[kind])
+        return Seq([
+            record,
+            position_record.store(If(record.hasValue(), record.value(), BytesZero(Int(len(BOX_FIELDS[kind]) * 8)))),
+        ])
+    
+    # Read one field of the loaded position
+    def get_field(kind, name):
+        return ExtractUint64(position_record.load(), Int(BOX_FIELDS[kind].index(name) * 8))
+    
+    # Update the status of the loaded position
+    def set_status(kind, status, account_index=Int(0), owner=Txn.sender(), id_bytes=Txn.application_args[1]):
+        offset = Int(BOX_FIELDS[kind].index("status") * 8)
+        if use_boxes:
+            return App.box_replace(position_box(kind, owner, id_bytes), offset, Itob(status))
+        return App.localPut(account_index, LOCAL_KEYS[kind], Replace(position_record.load(), offset, Itob(status)))
+    
+    # Store a new position for the sender; box mode allocates the next id and logs it
+    def open_position(kind, values):
+        record = Concat(*[Itob(values[name]) for name in BOX_FIELDS[kind]])
+        if not use_boxes:
+            return App.localPut(Int(0), LOCAL_KEYS[kind], record)
+        
+        count_box = Concat(Bytes(COUNT_PREFIXES[kind]), Txn.sender())
+        count = App.box_get(count_box)
+        return Seq([
+            count,
+            position_id.store(If(count.hasValue(), Btoi(count.value()), Int(0))),
+            App.box_put(count_box, Itob(position_id.load() + Int(1))),
+            App.box_put(position_box(kind, Txn.sender(), Itob(position_id.load())), record),
+            Log(Itob(position_id.load())),
+        ])
+    
+    # Advance both indexes to now and book the borrow/lend interest spread as reserves
+    borrow_growth = ScratchVar(TealType.uint64)
+    lend_growth = ScratchVar(TealType.uint64)
+    
+    @Subroutine(TealType.none)
+    def accrue():
+        elapsed = Global.latest_timestamp() - App.globalGet(LAST_ACCRUAL)
+        borrow_interest = WideRatio([App.globalGet(TOTAL_SCALED_BORROWED), borrow_growth.load()], [Int(INDEX_SCALE)])
+        lend_interest = WideRatio([App.globalGet(TOTAL_SCALED_LENT), lend_growth.load()], [Int(INDEX_SCALE)])
+        reserves = App.globalGet(RESERVES) + borrow_interest
+        
+        return If(elapsed > Int(0), Seq([
+            borrow_growth.store(WideRatio(
+                [App.globalGet(BORROW_INDEX), App.globalGet(BORROW_RATE), elapsed],
+                [Int(SECONDS_PER_YEAR * 10000)]
+            )),
+            lend_growth.store(WideRatio(
+                [App.globalGet(LEND_INDEX), App.globalGet(LEND_RATE), elapsed],
+                [Int(SECONDS_PER_YEAR * 10000)]
+            )),
+            
+            # Reserves absorb a shortfall down to zero
+            App.globalPut(RESERVES, If(reserves > lend_interest, reserves - lend_interest, Int(0))),
+            App.globalPut(BORROW_INDEX, App.globalGet(BORROW_INDEX) + borrow_growth.load()),
+            App.globalPut(LEND_INDEX, App.globalGet(LEND_INDEX) + lend_growth.load()),
+            App.globalPut(LAST_ACCRUAL, Global.latest_timestamp()),
+        ]))
+    
+    # Scaled balance of an amount opened at an index snapshot
+    def scaled(amount, snapshot):
+        return WideRatio([amount, Int(INDEX_SCALE)], [snapshot])
+    
+    # Current value of an amount opened at an index snapshot
+    def accrued(amount, snapshot, index_key):
+        return WideRatio([amount, App.globalGet(index_key)], [snapshot])
     
     # Application creation
     def on_creation():
         return Seq([
             # Set global state
-            App.globalPut(VGOLD_APP_ID, Btoi(Txn.application_args[0])),
+            App.globalPut(VGOLD_ASSET_ID if use_asa else VGOLD_APP_ID, Btoi(Txn.application_args[0])),
             App.globalPut(MANAGER, Txn.sender()),
             App.globalPut(TREASURY, Txn.sender()),
-            App.globalPut(MIN_COLLATERAL_RATIO, Int(150)),  # 150% collateral ratio
-            App.globalPut(LIQUIDATION_THRESHOLD, Int(120)),  # 120% liquidation threshold
+            App.globalPut(MIN_COLLATERAL_RATIO, Int(DEFAULT_MIN_COLLATERAL_RATIO)),  # 150% collateral ratio
+            App.globalPut(LIQUIDATION_THRESHOLD, Int(DEFAULT_LIQUIDATION_THRESHOLD)),  # 120% liquidation threshold
+            
+            # Optional second argument: the price oracle app liquidations check against
+            App.globalPut(ORACLE_APP_ID, If(Txn.application_args.length() > Int(1),
+                                            Btoi(Txn.application_args[1]), Int(0))),
+            
+            # Interest indexes start at 1.0
+            App.globalPut(BORROW_INDEX, Int(INDEX_SCALE)),
+            App.globalPut(LEND_INDEX, Int(INDEX_SCALE)),
+            App.globalPut(BORROW_RATE, Int(DEFAULT_BORROW_RATE)),
+            App.globalPut(LEND_RATE, Int(DEFAULT_LEND_RATE)),
+            App.globalPut(LAST_ACCRUAL, Global.latest_timestamp()),
             
             Approve()
         ])
     
     # Lend vGold tokens
     def lend_vgold():
+        # Get lending parameters
+        amount = Btoi(Txn.application_args[1])
+        duration_days = Btoi(Txn.application_args[2])
+
         return Seq([
-            # Get lending parameters
-            amount = Btoi(Txn.application_args[1]),
-            duration_days = Btoi(Txn.application_args[2]),
-            
-            # Calculate interest rate based on duration
-            interest_rate = If(
-                duration_days <= Int(30), Int(400),  # 4% APY
-                If(
-                    duration_days <= Int(90), Int(550),  # 5.5% APY
-                    Int(700)  # 7% APY
-                )
-            ),
+            accrue(),
             
             # Transfer vGold from lender to contract
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields({
-                TxnField.type_enum: TxnType.ApplicationCall,
-                TxnField.application_id: App.globalGet(VGOLD_APP_ID),
-                TxnField.application_args: [Bytes("transfer"), Itob(amount)],
-                TxnField.sender: Txn.sender(),
-                TxnField.accounts: [Global.current_application_address()],
-            }),
-            InnerTxnBuilder.Submit(),
+            receive_vgold(amount) if use_asa else
+            vgold_call("transfer", amount, Txn.sender(), [Global.current_application_address()]),
             
-            # Store lending position
-            App.localPut(Int(0), LEND_AMOUNT, amount),
-            App.localPut(Int(0), LEND_START, Global.latest_timestamp()),
-            App.localPut(Int(0), LEND_DURATION, duration_days * Int(86400)),  # Convert days to seconds
-            App.localPut(Int(0), LEND_INTEREST, interest_rate),
-            App.localPut(Int(0), LEND_STATUS, Int(1)),  # Active
+            # Add to the pool's scaled lent balance
+            App.globalPut(TOTAL_SCALED_LENT,
+                         App.globalGet(TOTAL_SCALED_LENT) + scaled(amount, App.globalGet(LEND_INDEX))),
+            
+            # Store lending position with the current lend index
+            open_position("lend", {
+                "amount": amount,
+                "start_time": Global.latest_timestamp(),
+                "duration": duration_days * Int(86400),  # Lock period, converted to seconds
+                "index": App.globalGet(LEND_INDEX),
+                "status": Int(1),  # Active
+            }),
             
             Approve()
         ])
     
     # Borrow vGold with ALGO collateral
     def borrow_vgold():
+        # Get borrowing parameters
+        amount = Btoi(Txn.application_args[1])
+        duration_days = Btoi(Txn.application_args[2])
+
+        # Calculate required collateral (150% of borrowed amount)
+        collateral_ratio = App.globalGet(MIN_COLLATERAL_RATIO)
+        required_collateral = amount * collateral_ratio / Int(100)
+
         return Seq([
-            # Get borrowing parameters
-            amount = Btoi(Txn.application_args[1]),
-            duration_days = Btoi(Txn.application_args[2]),
+            accrue(),
             
-            # Calculate interest rate based on duration
-            interest_rate = If(
-                duration_days <= Int(30), Int(600),  # 6% APY
-                If(
-                    duration_days <= Int(90), Int(750),  # 7.5% APY
-                    Int(900)  # 9% APY
-                )
-            ),
-            
-            # Calculate required collateral (150% of borrowed amount)
-            collateral_ratio = App.globalGet(MIN_COLLATERAL_RATIO),
-            required_collateral = amount * collateral_ratio / Int(100),
+            # Borrower pays the ALGO collateral in the preceding group transaction
+            receive_algo(),
             
             # Check if provided collateral is sufficient
-            Assert(Txn.amount() >= required_collateral),
+            Assert(received_algo() >= required_collateral),
             
-            # Transfer ALGO collateral to contract
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields({
-                TxnField.type_enum: TxnType.Payment,
-                TxnField.receiver: Global.current_application_address(),
-                TxnField.amount: Txn.amount(),
-                TxnField.sender: Txn.sender(),
-            }),
-            InnerTxnBuilder.Submit(),
+            # Lend vGold to borrower: from the lent pool in ASA mode, minted otherwise
+            send_vgold(Txn.sender(), amount) if use_asa else
+            vgold_call("mint", amount, Global.current_application_address(), [Txn.sender()]),
             
-            # Mint vGold tokens to borrower
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields({
-                TxnField.type_enum: TxnType.ApplicationCall,
-                TxnField.application_id: App.globalGet(VGOLD_APP_ID),
-                TxnField.application_args: [Bytes("mint"), Itob(amount)],
-                TxnField.sender: Global.current_application_address(),
-                TxnField.accounts: [Txn.sender()],
-            }),
-            InnerTxnBuilder.Submit(),
+            # Add to the pool's scaled borrowed balance
+            App.globalPut(TOTAL_SCALED_BORROWED,
+                         App.globalGet(TOTAL_SCALED_BORROWED) + scaled(amount, App.globalGet(BORROW_INDEX))),
             
-            # Store borrowing position
-            App.localPut(Int(0), BORROW_AMOUNT, amount),
-            App.localPut(Int(0), BORROW_COLLATERAL, Txn.amount()),
-            App.localPut(Int(0), BORROW_START, Global.latest_timestamp()),
-            App.localPut(Int(0), BORROW_DURATION, duration_days * Int(86400)),
-            App.localPut(Int(0), BORROW_INTEREST, interest_rate),
-            App.localPut(Int(0), BORROW_STATUS, Int(1)),  # Active
+            # Store borrowing position with the current borrow index
+            open_position("borrow", {
+                "amount": amount,
+                "collateral": received_algo(),
+                "start_time": Global.latest_timestamp(),
+                "duration": duration_days * Int(86400),
+                "index": App.globalGet(BORROW_INDEX),
+                "status": Int(1),  # Active
+            }),
             
             Approve()
         ])
     
     # Repay loan and get collateral back
+    # Box mode: application_args[1] is the position id
     def repay_loan():
+        # Get position details
+        borrow_amount = get_field("borrow", "amount")
+        snapshot = get_field("borrow", "index")
+        collateral = get_field("borrow", "collateral")
+
+        # Principal plus interest accrued through the borrow index
+        total_repay = accrued(borrow_amount, snapshot, BORROW_INDEX)
+
         return Seq([
-            # Get position details
-            borrow_amount = App.localGet(Int(0), BORROW_AMOUNT),
-            borrow_start = App.localGet(Int(0), BORROW_START),
-            borrow_duration = App.localGet(Int(0), BORROW_DURATION),
-            interest_rate = App.localGet(Int(0), BORROW_INTEREST),
-            collateral = App.localGet(Int(0), BORROW_COLLATERAL),
-            
-            # Calculate interest
-            time_elapsed = Global.latest_timestamp() - borrow_start,
-            max_duration = borrow_duration,
-            actual_duration = If(time_elapsed > max_duration, max_duration, time_elapsed),
-            
-            # Calculate interest amount (annual rate)
-            interest_amount = borrow_amount * interest_rate * actual_duration / (Int(365) * Int(86400) * Int(10000)),
-            total_repay = borrow_amount + interest_amount,
+            accrue(),
+            load_position("borrow"),
             
             # Check if borrower has sufficient vGold
             # This would need to check the vGold balance from the token contract
             
-            # Burn vGold tokens from borrower
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields({
-                TxnField.type_enum: TxnType.ApplicationCall,
-                TxnField.application_id: App.globalGet(VGOLD_APP_ID),
-                TxnField.application_args: [Bytes("burn"), Itob(total_repay)],
-                TxnField.sender: Txn.sender(),
-            }),
-            InnerTxnBuilder.Submit(),
+            # Take repayment: a grouped deposit back into the pool in ASA mode, burned otherwise
+            receive_vgold(total_repay) if use_asa else
+            vgold_call("burn", total_repay, Txn.sender()),
             
             # Return collateral to borrower
             InnerTxnBuilder.Begin(),
@@ -176,98 +300,217 @@ def lending_contract():
             }),
             InnerTxnBuilder.Submit(),
             
-            # Update position status
-            App.localPut(Int(0), BORROW_STATUS, Int(0)),  # Repaid
+            # Update position status and the pool's scaled balance
+            Assert(get_field("borrow", "status") == Int(1)),
+            set_status("borrow", Int(0)),  # Repaid
+            App.globalPut(TOTAL_SCALED_BORROWED,
+                         App.globalGet(TOTAL_SCALED_BORROWED) - scaled(borrow_amount, snapshot)),
             
             Approve()
         ])
     
     # Claim lending returns
+    # Box mode: application_args[1] is the position id
     def claim_returns():
+        # Get position details
+        lend_amount = get_field("lend", "amount")
+        lend_start = get_field("lend", "start_time")
+        lend_duration = get_field("lend", "duration")
+        snapshot = get_field("lend", "index")
+
+        time_elapsed = Global.latest_timestamp() - lend_start
+
+        # Principal plus interest accrued through the lend index
+        total_returns = accrued(lend_amount, snapshot, LEND_INDEX)
+
         return Seq([
-            # Get position details
-            lend_amount = App.localGet(Int(0), LEND_AMOUNT),
-            lend_start = App.localGet(Int(0), LEND_START),
-            lend_duration = App.localGet(Int(0), LEND_DURATION),
-            interest_rate = App.localGet(Int(0), LEND_INTEREST),
+            accrue(),
+            load_position("lend"),
             
             # Check if lending period has ended
-            time_elapsed = Global.latest_timestamp() - lend_start,
             Assert(time_elapsed >= lend_duration),
             
-            # Calculate interest
-            interest_amount = lend_amount * interest_rate * lend_duration / (Int(365) * Int(86400) * Int(10000)),
-            total_returns = lend_amount + interest_amount,
-            
             # Transfer vGold back to lender
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields({
-                TxnField.type_enum: TxnType.ApplicationCall,
-                TxnField.application_id: App.globalGet(VGOLD_APP_ID),
-                TxnField.application_args: [Bytes("transfer"), Itob(total_returns)],
-                TxnField.sender: Global.current_application_address(),
-                TxnField.accounts: [Txn.sender()],
-            }),
-            InnerTxnBuilder.Submit(),
+            send_vgold(Txn.sender(), total_returns) if use_asa else
+            vgold_call("transfer", total_returns, Global.current_application_address(), [Txn.sender()]),
             
-            # Update position status
-            App.localPut(Int(0), LEND_STATUS, Int(0)),  # Completed
+            # Update position status and the pool's scaled balance
+            Assert(get_field("lend", "status") == Int(1)),
+            set_status("lend", Int(0)),  # Completed
+            App.globalPut(TOTAL_SCALED_LENT,
+                         App.globalGet(TOTAL_SCALED_LENT) - scaled(lend_amount, snapshot)),
             
             Approve()
         ])
     
-    # Liquidate undercollateralized position
-    def liquidate():
+    # Oracle price of one vGold in microALGO, the oracle app must be Txn.applications[1]
+    oracle_price = ScratchVar(TealType.uint64)
+    
+    def load_oracle_price():
+        price = App.globalGetEx(Txn.applications[1], Bytes(ORACLE_KEYS["current_price"]))
         return Seq([
-            # Check if caller is authorized (manager or anyone if undercollateralized)
-            # This is a simplified version - in production, you'd check collateral ratio
-            
-            # Get position details
-            borrow_amount = App.localGet(Int(0), BORROW_AMOUNT),
-            collateral = App.localGet(Int(0), BORROW_COLLATERAL),
-            
-            # Transfer collateral to liquidator (with discount)
-            liquidation_discount = Int(5000),  # 5% discount
-            liquidator_amount = collateral * (Int(10000) - liquidation_discount) / Int(10000),
-            
+            Assert(Txn.applications[1] == App.globalGet(ORACLE_APP_ID)),
+            price,
+            Assert(price.hasValue()),
+            Assert(price.value() > Int(0)),
+            oracle_price.store(price.value()),
+        ])
+    
+    # Average oracle price since an earlier oracle "cumulative" read, passed as
+    # application_args 1 and 2 (cumulative price, timestamp); the oracle app is Txn.applications[1]
+    oracle_twap = ScratchVar(TealType.uint64)
+    
+    def load_oracle_twap():
+        return Seq([
+            Assert(Txn.applications[1] == App.globalGet(ORACLE_APP_ID)),
+            load_oracle_cumulative(Txn.applications[1], oracle_twap),
+            oracle_twap.store(twap(
+                Btoi(Txn.application_args[1]), Btoi(Txn.application_args[2]), oracle_twap.load()
+            )),
+        ])
+    
+    def get_twap():
+        return Seq([
+            load_oracle_twap(),
+            Log(Itob(oracle_twap.load())),
+            Approve()
+        ])
+    
+    # Per-position liquidation state
+    liquidation_collateral = ScratchVar(TealType.uint64)
+    liquidation_debt = ScratchVar(TealType.uint64)
+    liquidation_payout = ScratchVar(TealType.uint64)
+    liquidated_count = ScratchVar(TealType.uint64)
+    liquidation_eligible = ScratchVar(TealType.uint64)
+    
+    # Liquidate one active borrow position if its collateral is below liquidation_threshold
+    # of its debt (with interest) at the oracle price, adding the liquidator's share to the payout.
+    # With require_eligible a healthy or closed position rejects, otherwise it is skipped.
+    # Local mode reads the borrower at account_index, box mode the owner's position id_bytes.
+    @Subroutine(TealType.none)
+    def liquidate_position(account_index, owner, id_bytes, require_eligible):
+        amount = get_field("borrow", "amount")
+        snapshot = get_field("borrow", "index")
+        collateral = get_field("borrow", "collateral")
+        status = get_field("borrow", "status")
+        
+        debt_value = WideRatio([liquidation_debt.load(), oracle_price.load()], [Int(VGOLD_UNIT)])
+        
+        # And evaluates both sides, and a missing or closed record's zero snapshot would divide by
+        # zero, so the debt is only computed for an active position
+        check = If(
+            status == Int(1),
+            Seq([
+                liquidation_debt.store(accrued(amount, snapshot, BORROW_INDEX)),
+                liquidation_eligible.store(
+                    liquidation_collateral.load() * Int(100) < debt_value * App.globalGet(LIQUIDATION_THRESHOLD)
+                ),
+            ]),
+            liquidation_eligible.store(Int(0)),
+        )
+        settle = Seq([
+            set_status("borrow", Int(2), account_index, owner, id_bytes),  # Liquidated
+            App.globalPut(TOTAL_SCALED_BORROWED,
+                         App.globalGet(TOTAL_SCALED_BORROWED) - scaled(amount, snapshot)),
+            liquidation_payout.store(liquidation_payout.load() + liquidation_collateral.load()
+                                     * (Int(10000) - Int(LIQUIDATION_DISCOUNT)) / Int(10000)),
+            liquidated_count.store(liquidated_count.load() + Int(1)),
+        ])
+        return Seq([
+            load_position("borrow", account_index, owner, id_bytes),
+            liquidation_collateral.store(collateral),
+            check,
+            If(liquidation_eligible.load(), settle, Assert(Not(require_eligible))),
+        ])
+    
+    # Pay the liquidator the accumulated collateral share
+    def pay_liquidator():
+        return If(liquidation_payout.load() > Int(0), Seq([
             InnerTxnBuilder.Begin(),
             InnerTxnBuilder.SetFields({
                 TxnField.type_enum: TxnType.Payment,
                 TxnField.receiver: Txn.sender(),
-                TxnField.amount: liquidator_amount,
-                TxnField.sender: Global.current_application_address(),
+                TxnField.amount: liquidation_payout.load(),
+                TxnField.fee: Int(0),  # Covered by the outer call
             }),
             InnerTxnBuilder.Submit(),
+        ]))
+    
+    # Liquidate undercollateralized position, the oracle app is Txn.applications[1]
+    # Local mode: the borrower is Txn.accounts[1]
+    # Box mode: the borrower is Txn.accounts[1] and application_args[1] the position id
+    def liquidate():
+        return Seq([
+            accrue(),
+            load_oracle_price(),
+            liquidation_payout.store(Int(0)),
+            liquidated_count.store(Int(0)),
+            liquidate_position(Int(1), Txn.accounts[1], Txn.application_args[1] if use_boxes else Bytes(""), Int(1)),
+            pay_liquidator(),
+            
+            Approve()
+        ])
+    
+    # Liquidate every eligible position in a list, skipping healthy or closed ones, and log the count.
+    # The oracle app is Txn.applications[1].
+    # Local mode: the borrowers are Txn.accounts[1..]
+    # Box mode: application_args[1..] are 32-byte borrower address + 8-byte position id
+    def liquidate_batch():
+        i = ScratchVar(TealType.uint64)
+        if use_boxes:
+            key = Txn.application_args[i.load()]
+            count = Txn.application_args.length()
+            position = liquidate_position(Int(0), Extract(key, Int(0), Int(32)), Extract(key, Int(32), Int(8)), Int(0))
+        else:
+            count = Txn.accounts.length() + Int(1)
+            position = liquidate_position(i.load(), Txn.sender(), Bytes(""), Int(0))
+        
+        return Seq([
+            # Pool budget with inner app calls paid from the group's fee credit if the batch needs it
+            OpUp(OpUpMode.OnCall).ensure_budget(
+                (count - Int(1)) * Int(LIQUIDATION_ITEM_BUDGET), OpUpFeeSource.GroupCredit
+            ),
             
-            # Update position status
-            App.localPut(Int(0), BORROW_STATUS, Int(2)),  # Liquidated
+            accrue(),
+            load_oracle_price(),
+            liquidation_payout.store(Int(0)),
+            liquidated_count.store(Int(0)),
+            For(i.store(Int(1)), i.load() < count, i.store(i.load() + Int(1))).Do(position),
+            pay_liquidator(),
+            Log(Itob(liquidated_count.load())),
             
             Approve()
         ])
     
-    # Get position details
-    def get_position():
+    # Set the pool's borrow and lend rates in basis points (manager only)
+    def set_rates():
+        borrow_rate = Btoi(Txn.application_args[1])
+        lend_rate = Btoi(Txn.application_args[2])
+
         return Seq([
-            # Return position details based on type
-            position_type = Txn.application_args[1],
+            Assert(Txn.sender() == App.globalGet(MANAGER)),
+            Assert(lend_rate <= borrow_rate),
             
+            # Interest up to now accrues at the old rates
+            accrue(),
+            App.globalPut(BORROW_RATE, borrow_rate),
+            App.globalPut(LEND_RATE, lend_rate),
+            
+            Approve()
+        ])
+    
+    # Get position details: log the packed record of the application_args[1] ("lend"/"borrow")
+    # position, box mode reads position id application_args[2]
+    def get_position():
+        position_type = Txn.application_args[1]
+        id_bytes = Txn.application_args[2] if use_boxes else Bytes("")
+
+        return Seq([
             If(position_type == Bytes("lend"),
-                Seq([
-                    App.localPut(Int(0), Bytes("amount"), App.localGet(Int(0), LEND_AMOUNT)),
-                    App.localPut(Int(0), Bytes("start"), App.localGet(Int(0), LEND_START)),
-                    App.localPut(Int(0), Bytes("duration"), App.localGet(Int(0), LEND_DURATION)),
-                    App.localPut(Int(0), Bytes("interest"), App.localGet(Int(0), LEND_INTEREST)),
-                    App.localPut(Int(0), Bytes("status"), App.localGet(Int(0), LEND_STATUS)),
-                ]),
-                Seq([
-                    App.localPut(Int(0), Bytes("amount"), App.localGet(Int(0), BORROW_AMOUNT)),
-                    App.localPut(Int(0), Bytes("collateral"), App.localGet(Int(0), BORROW_COLLATERAL)),
-                    App.localPut(Int(0), Bytes("start"), App.localGet(Int(0), BORROW_START)),
-                    App.localPut(Int(0), Bytes("duration"), App.localGet(Int(0), BORROW_DURATION)),
-                    App.localPut(Int(0), Bytes("interest"), App.localGet(Int(0), BORROW_INTEREST)),
-                    App.localPut(Int(0), Bytes("status"), App.localGet(Int(0), BORROW_STATUS)),
-                ])
+                load_position("lend", id_bytes=id_bytes),
+                load_position("borrow", id_bytes=id_bytes)
             ),
+            Log(position_record.load()),
             
             Approve()
         ])
@@ -277,21 +520,24 @@ def lending_contract():
         return Cond(
             [Txn.application_id() == Int(0), on_creation()],
             [Txn.on_completion() == OnComplete.NoOp, 
-             Cond(
-                [Txn.application_args[0] == Bytes("lend"), lend_vgold()],
-                [Txn.application_args[0] == Bytes("borrow"), borrow_vgold()],
-                [Txn.application_args[0] == Bytes("repay"), repay_loan()],
-                [Txn.application_args[0] == Bytes("claim"), claim_returns()],
-                [Txn.application_args[0] == Bytes("liquidate"), liquidate()],
-                [Txn.application_args[0] == Bytes("position"), get_position()],
-                [Int(1), Reject()]
-             )],
+             route_noop(LENDING_METHODS, {
+                 "lend": lend_vgold(),
+                 "borrow": borrow_vgold(),
+                 "repay": repay_loan(),
+                 "claim": claim_returns(),
+                 "liquidate": liquidate(),
+                 "position": get_position(),
+                 "opt_in_asset": opt_in_vgold(App.globalGet(MANAGER)) if use_asa else Reject(),
+                 "set_rates": set_rates(),
+                 "liquidate_batch": liquidate_batch(),
+                 "twap": get_twap(),
+             }, dispatch, HOT_METHODS["lending"])],
             [Txn.on_completion() == OnComplete.OptIn, Approve()],
             [Txn.on_completion() == OnComplete.CloseOut, Approve()],
             [Txn.on_completion() == OnComplete.UpdateApplication, 
-             Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()],
+             Seq([Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()])],
             [Txn.on_completion() == OnComplete.DeleteApplication, 
-             Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()],
+             Seq([Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()])],
             [Int(1), Reject()]
         )
     
@@ -299,5 +545,5 @@ def lending_contract():
 
 if __name__ == "__main__":
     # Compile the contract
-    compiled = compileTeal(lending_contract(), Mode.Application, version=6)
+    compiled = compileTeal(lending_contract(), Mode.Application, version=8)
     print(compiled)
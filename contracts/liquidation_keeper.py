@@ -0,0 +1,287 @@
+"""
+Liquidation Keeper - GoldChain
+Watches the price oracle and liquidates undercollateralized borrow positions
+through ContractService. The position index is fed by the block follower's lending calls.
+
+Usage:
+    KEEPER_MNEMONIC="..." python liquidation_keeper.py [--config deployed/contracts.json] [--interval 4] [--from-round N]
+"""
+
+import argparse
+import asyncio
+import bisect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from algosdk import account, mnemonic
+from algosdk.encoding import encode_address
+from algosdk.v2client import algod
+
+from block_follower import AppCallEvent, BlockFollower
+from contract_service import (
+    BOX_READ_WORKERS, MAX_GROUP_SIZE, MAX_LIQUIDATION_BATCH, ContractService, TransactionResult,
+    create_contract_service, load_deployed_config,
+)
+from lending_contract import BORROW_FIELDS, POSITIONS_BOX, VGOLD_UNIT
+
+# A borrow position: borrower address and position id (always 0 in local mode)
+PositionKey = Tuple[str, int]
+
+# Lending calls that open or close borrow positions
+POSITION_METHODS = ["borrow", "repay", "liquidate", "liquidate_batch"]
+
+
+@dataclass
+class ScanStats:
+    """Latency of the index scans run on oracle price updates"""
+    scans: int = 0
+    total_seconds: float = 0.0
+    last_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_unsafe: int = 0
+
+    def record(self, seconds: float, unsafe: int) -> None:
+        self.scans += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_unsafe = unsafe
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.scans if self.scans else 0.0
+
+
+class PositionIndex:
+    """Active borrow positions sorted by normalized liquidation price.
+
+    A position is unsafe once collateral * 100 * VGOLD_UNIT < debt * price * threshold, with
+    debt = amount * borrow_index / snapshot. All debts grow by the same borrow index, so the
+    order by collateral * snapshot / amount never changes between updates and the unsafe
+    positions are always the prefix below price * borrow_index * threshold / (100 * VGOLD_UNIT).
+    Keys are floats: the order only picks candidates, the contract makes the exact check.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[float, PositionKey]] = []
+        self._keys: Dict[PositionKey, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, position: PositionKey) -> bool:
+        return position in self._keys
+
+    @staticmethod
+    def sort_key(amount: int, collateral: int, snapshot: int) -> float:
+        """Normalized liquidation price of a position"""
+        return collateral * snapshot / amount
+
+    @staticmethod
+    def cutoff(price: int, borrow_index: int, threshold: int) -> float:
+        """Positions with a sort key below this are unsafe"""
+        return price * borrow_index * threshold / (100 * VGOLD_UNIT)
+
+    def add(self, position: PositionKey, amount: int, collateral: int, snapshot: int) -> None:
+        """Insert or move a position, O(log n) search plus a list insert"""
+        self.remove(position)
+        key = self.sort_key(amount, collateral, snapshot)
+        bisect.insort(self._entries, (key, position))
+        self._keys[position] = key
+
+    def add_many(self, positions: Iterable[Tuple[PositionKey, int, int, int]]) -> None:
+        """Bulk insert (position, amount, collateral, snapshot) with one sort"""
+        for position, amount, collateral, snapshot in positions:
+            if position in self._keys:
+                self.remove(position)
+            key = self.sort_key(amount, collateral, snapshot)
+            self._entries.append((key, position))
+            self._keys[position] = key
+        self._entries.sort()
+
+    def remove(self, position: PositionKey) -> bool:
+        """Drop a position, returns False if it was not indexed"""
+        key = self._keys.pop(position, None)
+        if key is None:
+            return False
+        del self._entries[bisect.bisect_left(self._entries, (key, position))]
+        return True
+
+    def unsafe(self, price: int, borrow_index: int, threshold: int) -> List[PositionKey]:
+        """Positions liquidatable at a price, O(log n + k)"""
+        end = bisect.bisect_left(self._entries, (self.cutoff(price, borrow_index, threshold),))
+        return [position for _, position in self._entries[:end]]
+
+
+class LiquidationKeeper:
+    """Liquidates unsafe borrow positions whenever the oracle price updates"""
+
+    def __init__(self, service: ContractService, liquidator_address: str, private_key: str):
+        self.service = service
+        self.liquidator_address = liquidator_address
+        self.private_key = private_key
+        self.index = PositionIndex()
+        self.stats = ScanStats()
+        self._lock = threading.Lock()  # The follower updates the index while the oracle poll scans it
+        self._last_update_time: Optional[int] = None
+
+    def track(self, owner: str, position_id: int, position: Dict[str, int]) -> None:
+        """Index an opened or changed position from its decoded fields, dropping it once closed"""
+        if position["status"] != 1 or position["amount"] == 0:
+            self.untrack(owner, position_id)
+            return
+        with self._lock:
+            self.index.add((owner, position_id), position["amount"], position["collateral"], position["index"])
+
+    def untrack(self, owner: str, position_id: int = 0) -> None:
+        """Stop watching a repaid or liquidated position"""
+        with self._lock:
+            self.index.remove((owner, position_id))
+
+    def read_positions(self, positions: List[PositionKey],
+                       max_workers: int = BOX_READ_WORKERS) -> List[Optional[Dict[str, int]]]:
+        """Current records of positions, read concurrently; None where a read failed"""
+        def read(position: PositionKey) -> Optional[Dict[str, int]]:
+            try:
+                return self.service.get_position(position[0], "borrow", position[1])
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(read, positions))
+
+    def refresh(self, positions: List[PositionKey]) -> None:
+        """Re-read positions and index their current state; one that can't be read keeps its entry"""
+        for (owner, position_id), record in zip(positions, self.read_positions(positions)):
+            if record is not None:
+                self.track(owner, position_id, record)
+
+    def bootstrap(self) -> int:
+        """Index every box-mode borrow position from one full box listing; returns how many are active.
+        Local mode has no listing, the follower replays lending calls from the app's creation instead."""
+        if self.service.config.lending_positions != POSITIONS_BOX:
+            return 0
+
+        positions = self.service.list_positions("borrow")
+        active = [
+            (position, record["amount"], record["collateral"], record["index"])
+            for position, record in zip(positions, self.read_positions(positions))
+            if record is not None and record["status"] == 1 and record["amount"] > 0
+        ]
+        with self._lock:
+            self.index.add_many(active)
+        return len(active)
+
+    @staticmethod
+    def touched_positions(event: AppCallEvent) -> List[PositionKey]:
+        """Box-mode positions a lending call opened or closed, from its args, accounts and logs"""
+        if event.method == "borrow":
+            return [(event.sender, int.from_bytes(event.logs[-1], 'big'))]  # The new position id is logged
+        if event.method == "repay":
+            return [(event.sender, int.from_bytes(event.args[0], 'big'))]
+        if event.method == "liquidate":
+            return [(event.accounts[0], int.from_bytes(event.args[0], 'big'))]
+        if event.method == "liquidate_batch":
+            return [(encode_address(key[:32]), int.from_bytes(key[32:40], 'big')) for key in event.args]
+        return []
+
+    async def on_lending_call(self, event: AppCallEvent) -> None:
+        """Follower handler: update the index for the positions a lending call changed.
+        Local mode takes the new records from the call's local state delta; box deltas are not
+        in blocks, so box mode re-reads the positions named by the call."""
+        if self.service.config.lending_positions != POSITIONS_BOX:
+            for owner, fields in event.local_delta.items():
+                if "borrow" not in fields:
+                    continue
+                record = fields["borrow"]
+                if record:
+                    self.track(owner, 0, ContractService.decode_position(record, BORROW_FIELDS))
+                else:
+                    self.untrack(owner)
+            return
+
+        await asyncio.to_thread(self.refresh, self.touched_positions(event))
+
+    def scan(self, price: int, borrow_index: int, threshold: int) -> List[PositionKey]:
+        """Unsafe positions at a price, timed into stats"""
+        start = time.perf_counter()
+        with self._lock:
+            unsafe = self.index.unsafe(price, borrow_index, threshold)
+        self.stats.record(time.perf_counter() - start, len(unsafe))
+        return unsafe
+
+    def liquidate(self, positions: List[PositionKey]) -> List[TransactionResult]:
+        """Submit liquidations one atomic group at a time, re-reading the positions of accepted groups:
+        liquidated ones drop out and any the contract skipped as healthy stay indexed."""
+        results = []
+        group_size = MAX_LIQUIDATION_BATCH[self.service.config.lending_positions] * MAX_GROUP_SIZE
+        for start in range(0, len(positions), group_size):
+            group = positions[start:start + group_size]
+            group_results = self.service.liquidate_positions(self.liquidator_address, group, self.private_key)
+            if all(result.success for result in group_results):
+                self.refresh(group)
+            results.extend(group_results)
+        return results
+
+    def on_price_update(self, price: int) -> List[TransactionResult]:
+        """Find and liquidate positions made unsafe by a new oracle price"""
+        pool = self.service.get_pool_totals()
+        unsafe = self.scan(price, pool["borrow_index"], pool["liquidation_threshold"])
+        return self.liquidate(unsafe) if unsafe else []
+
+    def poll(self) -> List[TransactionResult]:
+        """One keeper tick: act on the oracle price if it changed since the last tick"""
+        price, update_time = self.service.get_oracle_price()
+        if update_time == self._last_update_time:
+            return []
+        self._last_update_time = update_time
+        return self.on_price_update(price)
+
+    async def run(self, poll_interval: float = 4.0, start_round: Optional[int] = None) -> None:
+        """Follow lending calls into the index and poll the oracle forever.
+        Box mode bootstraps from the box listing and follows from the round it was taken at. Local mode
+        follows from start_round, which should be the lending app's creation round so every position is seen."""
+        follower = BlockFollower(self.service.algod_client, self.service.config)
+        follower.on(self.on_lending_call, contracts=["lending"], methods=POSITION_METHODS)
+        if self.service.config.lending_positions == POSITIONS_BOX:
+            # Calls that land during the listing are followed again, re-reading them is harmless
+            start_round = (await asyncio.to_thread(self.service.algod_client.status))["last-round"]
+            active = await asyncio.to_thread(self.bootstrap)
+            print(f"Bootstrapped {active} active positions at round {start_round}")
+
+        following = asyncio.create_task(follower.run(start_round))
+        try:
+            while not following.done():
+                results = await asyncio.to_thread(self.poll)
+                if results:
+                    failed = [result.error for result in results if not result.success]
+                    print(f"Liquidated {self.stats.last_unsafe} candidates in {len(results)} groups, "
+                          f"{len(failed)} failed, scan {self.stats.last_seconds * 1e6:.0f}us "
+                          f"(mean {self.stats.mean_seconds * 1e6:.0f}us, max {self.stats.max_seconds * 1e6:.0f}us)")
+                    for error in failed:
+                        print(f"  {error}")
+
+                await asyncio.sleep(poll_interval)
+            following.result()  # A follower that stopped raises here
+        finally:
+            following.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Liquidate undercollateralized GoldChain borrow positions")
+    parser.add_argument("--config", default="deployed/contracts.json", help="deploy_contracts.py output")
+    parser.add_argument("--algod-url", default=os.getenv("ALGOD_URL", "http://localhost:4001"))
+    parser.add_argument("--algod-token", default=os.getenv("ALGOD_TOKEN", "a" * 64))
+    parser.add_argument("--interval", type=float, default=4.0, help="Seconds between oracle polls")
+    parser.add_argument("--from-round", type=int, help="Local mode: the lending app's creation round")
+    args = parser.parse_args()
+
+    private_key = mnemonic.to_private_key(os.environ["KEEPER_MNEMONIC"])
+    service = create_contract_service(algod.AlgodClient(args.algod_token, args.algod_url),
+                                      load_deployed_config(args.config))
+    keeper = LiquidationKeeper(service, account.address_from_private_key(private_key), private_key)
+    asyncio.run(keeper.run(args.interval, args.from_round))
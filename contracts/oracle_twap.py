@@ -0,0 +1,39 @@
+"""
+Oracle TWAP Helpers - Algorand Smart Contract Helpers
+Time-weighted average prices from the price oracle's cumulative price.
+
+The oracle adds price * seconds held to price_cumulative at every update, so the
+cumulative at any moment is price_cumulative + current_price * (now - price_update_time),
+and the TWAP between two observations is their cumulative difference over the time between them.
+"""
+
+from pyteal import *
+from state_keys import ORACLE_KEYS
+
+
+def cumulative_price(cumulative: Expr, price: Expr, update_time: Expr) -> Expr:
+    """Cumulative price (microALGO-seconds) carried from the last update to now"""
+    return cumulative + price * (Global.latest_timestamp() - update_time)
+
+
+def load_oracle_cumulative(oracle: Expr, result: ScratchVar) -> Expr:
+    """Store the oracle app's cumulative price as of now in result"""
+    cumulative = App.globalGetEx(oracle, Bytes(ORACLE_KEYS["price_cumulative"]))
+    price = App.globalGetEx(oracle, Bytes(ORACLE_KEYS["current_price"]))
+    update_time = App.globalGetEx(oracle, Bytes(ORACLE_KEYS["price_update_time"]))
+    return Seq([
+        cumulative,
+        price,
+        update_time,
+        Assert(price.hasValue()),
+        Assert(update_time.hasValue()),
+        result.store(cumulative_price(cumulative.value(), price.value(), update_time.value())),
+    ])
+
+
+def twap(start_cumulative: Expr, start_time: Expr, cumulative_now: Expr) -> Expr:
+    """Average price from an earlier observation (cumulative, timestamp) to now"""
+    return Seq([
+        Assert(start_time < Global.latest_timestamp()),
+        (cumulative_now - start_cumulative) / (Global.latest_timestamp() - start_time),
+    ])
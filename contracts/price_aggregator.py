@@ -0,0 +1,162 @@
+"""
+Price Aggregator - GoldChain
+Collects vGold quotes from the oracle's registered reporters every tick and submits
+them as one atomic group: a report call signed by each reporter and an aggregate call
+that sets the median on chain. Quotes the oracle would count as outliers are dropped
+before submitting, so one bad reporter cannot get the round rejected.
+
+Usage:
+    AGGREGATOR_MNEMONIC="..." REPORTER_MNEMONICS="...;...;..." \\
+        python price_aggregator.py --sources a.txt b.txt c.txt [--config deployed/contracts.json] [--interval 60]
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from algosdk import account, mnemonic
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from contract_service import ContractService, TransactionResult, create_contract_service, is_inlier, load_deployed_config, median_quote
+from price_oracle import MAX_REPORTS
+
+
+class Reporter:
+    """An oracle reporter: quotes the vGold price for a round and signs its report call"""
+    address: str
+
+    def quote(self, round_number: int) -> Optional[int]:
+        """Price in microALGO per vGold, None to sit the round out"""
+        raise NotImplementedError
+
+    def sign(self, txn: transaction.Transaction) -> transaction.SignedTransaction:
+        raise NotImplementedError
+
+
+class LocalReporter(Reporter):
+    """A reporter whose key and price source live in this process"""
+
+    def __init__(self, private_key: str, source: Callable[[], Optional[int]]):
+        self.private_key = private_key
+        self.address = account.address_from_private_key(private_key)
+        self.source = source
+
+    def quote(self, round_number: int) -> Optional[int]:
+        return self.source()
+
+    def sign(self, txn: transaction.Transaction) -> transaction.SignedTransaction:
+        return txn.sign(self.private_key)
+
+
+def file_source(path: str) -> Callable[[], Optional[int]]:
+    """Price source reading an integer price from a file, None while it is missing or empty"""
+    def read() -> Optional[int]:
+        try:
+            with open(path) as f:
+                text = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return int(text) if text else None
+    return read
+
+
+@dataclass
+class RoundResult:
+    """One aggregation round: the quotes submitted, those dropped and the outcome"""
+    round_number: int
+    quotes: Dict[str, int]
+    outliers: Dict[str, int] = field(default_factory=dict)
+    missing: List[str] = field(default_factory=list)
+    median: Optional[int] = None
+    result: Optional[TransactionResult] = None
+
+
+class PriceAggregator:
+    """Collects reporter quotes and submits one aggregate group per tick"""
+
+    def __init__(self, service: ContractService, reporters: List[Reporter], private_key: str,
+                 quote_timeout: float = 2.0):
+        self.service = service
+        self.reporters = {reporter.address: reporter for reporter in reporters}
+        self.private_key = private_key
+        self.quote_timeout = quote_timeout
+
+    def collect(self, round_number: int) -> Tuple[Dict[str, int], List[str]]:
+        """Quotes of every reporter that answered within quote_timeout, and those that did not"""
+        pool = ThreadPoolExecutor(max_workers=len(self.reporters))
+        futures = {address: pool.submit(reporter.quote, round_number) for address, reporter in self.reporters.items()}
+        wait(futures.values(), timeout=self.quote_timeout)
+        pool.shutdown(wait=False)
+
+        quotes, missing = {}, []
+        for address, future in futures.items():
+            price = future.result() if future.done() and not future.exception() else None
+            if price is None:
+                missing.append(address)
+            else:
+                quotes[address] = price
+        return quotes, missing
+
+    def select(self, quotes: Dict[str, int]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Split quotes into the inliers the oracle would accept around their median, at most
+        MAX_REPORTS of them closest first, and the outliers"""
+        if not quotes:
+            return {}, {}
+        _, max_deviation = self.service.get_reporter_settings()
+        median = median_quote(list(quotes.values()))
+        inliers = {a: p for a, p in quotes.items() if is_inlier(p, median, max_deviation)}
+        closest = sorted(inliers, key=lambda address: abs(inliers[address] - median))[:MAX_REPORTS]
+        selected = {address: inliers[address] for address in closest}
+        return selected, {a: p for a, p in quotes.items() if a not in selected}
+
+    def run_round(self, round_number: Optional[int] = None) -> RoundResult:
+        """Collect, filter and submit one round, by default the one after the oracle's last"""
+        if round_number is None:
+            round_number = self.service.get_report_round() + 1
+        quotes, missing = self.collect(round_number)
+        selected, outliers = self.select(quotes)
+        round_result = RoundResult(round_number, selected, outliers, missing)
+        if selected:
+            round_result.median = median_quote(list(selected.values()))
+        round_result.result = self.service.aggregate_prices(
+            round_number, selected, lambda address, txn: self.reporters[address].sign(txn), self.private_key
+        )
+        return round_result
+
+    def run(self, interval: float = 60.0) -> None:
+        """Submit a round every interval seconds forever"""
+        while True:
+            started = time.monotonic()
+            round_result = self.run_round()
+            result = round_result.result
+            status = f"tx {result.tx_id}" if result.success else f"failed: {result.error}"
+            print(f"Round {round_result.round_number}: median {round_result.median} from "
+                  f"{len(round_result.quotes)} quotes, {len(round_result.outliers)} outliers, "
+                  f"{len(round_result.missing)} missing, {status}")
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate GoldChain oracle reporter quotes on chain")
+    parser.add_argument("--config", default="deployed/contracts.json", help="deploy_contracts.py output")
+    parser.add_argument("--algod-url", default=os.getenv("ALGOD_URL", "http://localhost:4001"))
+    parser.add_argument("--algod-token", default=os.getenv("ALGOD_TOKEN", "a" * 64))
+    parser.add_argument("--sources", nargs="+", required=True, help="Price file per reporter, as REPORTER_MNEMONICS")
+    parser.add_argument("--interval", type=float, default=60.0, help="Seconds between rounds")
+    parser.add_argument("--quote-timeout", type=float, default=2.0, help="Seconds to wait for quotes")
+    args = parser.parse_args()
+
+    reporter_keys = [mnemonic.to_private_key(m.strip()) for m in os.environ["REPORTER_MNEMONICS"].split(";")]
+    if len(reporter_keys) != len(args.sources):
+        parser.error("one --sources file is needed per reporter mnemonic")
+
+    service = create_contract_service(algod.AlgodClient(args.algod_token, args.algod_url),
+                                      load_deployed_config(args.config))
+    reporters = [LocalReporter(key, file_source(path)) for key, path in zip(reporter_keys, args.sources)]
+    aggregator = PriceAggregator(service, reporters, mnemonic.to_private_key(os.environ["AGGREGATOR_MNEMONIC"]),
+                                 args.quote_timeout)
+    aggregator.run(args.interval)
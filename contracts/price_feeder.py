@@ -0,0 +1,244 @@
+"""
+Price Feeder - GoldChain
+Pushes vGold prices from a local source to the price oracle, only when the price has
+moved more than a deviation threshold or a heartbeat interval has passed since the
+last update. Ticks that arrive between polls are coalesced into the latest one, a
+failed update is retried on the next poll, and each update's latency from the source
+tick to its confirmed round is measured.
+
+Sources are pluggable: a file holding the latest "price [timestamp]" line, or a UDP
+socket receiving one such line per datagram. Malformed lines are dropped and counted.
+
+Usage:
+    ORACLE_MNEMONIC="..." python price_feeder.py --file price.txt [--deviation 50] [--heartbeat 3600]
+    ORACLE_MNEMONIC="..." python price_feeder.py --udp 127.0.0.1:9100
+"""
+
+import argparse
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from algosdk import mnemonic
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from contract_service import ContractService, TransactionResult, create_contract_service, load_deployed_config
+
+
+@dataclass(frozen=True)
+class PriceTick:
+    """A price from the source and when it was observed there (Unix seconds)"""
+    price: int
+    source_time: float
+
+
+def parse_tick(line: str, received: float) -> Optional[PriceTick]:
+    """A tick from a "price [timestamp]" line, stamped received if it carries no timestamp.
+    None for a blank line, ValueError unless it starts with a positive integer price."""
+    fields = line.split()
+    if not fields:
+        return None
+    price = int(fields[0])
+    if price <= 0:
+        raise ValueError(f"Price must be positive: {price}")
+    return PriceTick(price, float(fields[1]) if len(fields) > 1 else received)
+
+
+class PriceSource:
+    """Where the feeder reads prices from"""
+    malformed = 0  # Lines dropped because they did not parse
+
+    def poll(self) -> List[PriceTick]:
+        """Ticks that arrived since the last poll, oldest first, without blocking"""
+        raise NotImplementedError
+
+    def _parse(self, line: str, received: float) -> Optional[PriceTick]:
+        """parse_tick, counting and dropping a malformed line instead of raising"""
+        try:
+            return parse_tick(line, received)
+        except ValueError:
+            self.malformed += 1
+            return None
+
+    def close(self) -> None:
+        pass
+
+
+class FileSource(PriceSource):
+    """A file another process rewrites with the latest "price [timestamp]" line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[int] = None
+
+    def poll(self) -> List[PriceTick]:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return []
+            with open(self.path) as f:
+                line = f.readline()
+        except FileNotFoundError:
+            return []
+        self._mtime = mtime
+        tick = self._parse(line, mtime / 1e9)
+        return [tick] if tick else []
+
+
+class UdpSource(PriceSource):
+    """A UDP socket receiving one "price [timestamp]" line per datagram"""
+
+    def __init__(self, host: str, port: int):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+
+    def poll(self) -> List[PriceTick]:
+        ticks = []
+        while True:
+            try:
+                data = self.sock.recv(256)
+            except BlockingIOError:
+                return ticks
+            tick = self._parse(data.decode(errors="replace"), time.time())
+            if tick:
+                ticks.append(tick)
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+@dataclass
+class FeedPolicy:
+    """When a tick is worth an oracle update"""
+    deviation_bps: int = 50       # price moved at least this many basis points from the last update
+    heartbeat_seconds: float = 3600.0  # or this long has passed since it
+
+    def should_update(self, last_price: int, last_time: float, price: int, now: float) -> bool:
+        if now - last_time >= self.heartbeat_seconds:
+            return True
+        return abs(price - last_price) * 10000 >= last_price * self.deviation_bps
+
+
+@dataclass
+class FeedStats:
+    """Ticks seen, updates sent and their source-to-confirmation latency"""
+    ticks: int = 0
+    malformed: int = 0
+    coalesced: int = 0
+    skipped: int = 0
+    updates: int = 0
+    failures: int = 0
+    total_latency: float = 0.0
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def record(self, latency: float) -> None:
+        self.updates += 1
+        self.total_latency += latency
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.updates if self.updates else 0.0
+
+
+class PriceFeeder:
+    """Feeds the oracle from a price source on deviation or heartbeat"""
+
+    def __init__(self, service: ContractService, source: PriceSource, private_key: str,
+                 policy: Optional[FeedPolicy] = None, confirm_rounds: int = 4):
+        self.service = service
+        self.source = source
+        self.private_key = private_key
+        self.policy = policy or FeedPolicy()
+        self.confirm_rounds = confirm_rounds
+        self.stats = FeedStats()
+        self.last_price, self.last_time = service.get_oracle_price()
+        self._latest: Optional[PriceTick] = None
+        self._pending = False  # The last update of _latest failed and is due again
+
+    def tick(self, now: Optional[float] = None) -> Optional[TransactionResult]:
+        """Poll the source once and update the oracle with the latest tick if the policy says so,
+        or retry the update that failed on the last poll"""
+        now = now or time.time()
+        ticks = self.source.poll()
+        self.stats.ticks += len(ticks)
+        self.stats.malformed = self.source.malformed
+        self.stats.coalesced += max(0, len(ticks) - 1)
+        if ticks:
+            self._latest = ticks[-1]
+        elif now - self.last_time >= self.policy.heartbeat_seconds:
+            # Heartbeat while the source is quiet: the last price it gave, as of now
+            self._latest = PriceTick(self._latest.price if self._latest else self.last_price, now)
+        elif not self._pending:
+            return None
+
+        if not self.policy.should_update(self.last_price, self.last_time, self._latest.price, now):
+            self.stats.skipped += 1
+            self._pending = False
+            return None
+        result = self.submit(self._latest)
+        self._pending = not result.success
+        return result
+
+    def submit(self, tick: PriceTick) -> TransactionResult:
+        """Update the oracle and wait for the round it lands in, timing it from the tick"""
+        result = self.service.update_price(tick.price, self.private_key)
+        if result.success:
+            try:
+                transaction.wait_for_confirmation(self.service.algod_client, result.tx_id, self.confirm_rounds)
+            except Exception as e:
+                result = TransactionResult(success=False, tx_id=result.tx_id, error=str(e))
+        if not result.success:
+            self.stats.failures += 1
+            return result
+
+        self.stats.record(time.time() - tick.source_time)
+        self.last_price, self.last_time = tick.price, time.time()
+        return result
+
+    def run(self, poll_interval: float = 1.0) -> None:
+        """Feed forever"""
+        try:
+            while True:
+                result = self.tick()
+                if result is not None:
+                    status = f"tx {result.tx_id}" if result.success else f"failed: {result.error}"
+                    print(f"Price {self.last_price}: {status}, latency {self.stats.last_latency:.2f}s "
+                          f"(mean {self.stats.mean_latency:.2f}s, max {self.stats.max_latency:.2f}s), "
+                          f"{self.stats.updates} updates from {self.stats.ticks} ticks, "
+                          f"{self.stats.malformed} malformed")
+                time.sleep(poll_interval)
+        finally:
+            self.source.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feed the GoldChain price oracle on deviation or heartbeat")
+    parser.add_argument("--config", default="deployed/contracts.json", help="deploy_contracts.py output")
+    parser.add_argument("--algod-url", default=os.getenv("ALGOD_URL", "http://localhost:4001"))
+    parser.add_argument("--algod-token", default=os.getenv("ALGOD_TOKEN", "a" * 64))
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--file", help="File holding the latest \"price [timestamp]\" line")
+    source_group.add_argument("--udp", help="host:port receiving \"price [timestamp]\" datagrams")
+    parser.add_argument("--deviation", type=int, default=50, help="Basis points that trigger an update")
+    parser.add_argument("--heartbeat", type=float, default=3600.0, help="Seconds after which to update anyway")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between source polls")
+    args = parser.parse_args()
+
+    if args.file:
+        price_source = FileSource(args.file)
+    else:
+        host, port = args.udp.rsplit(":", 1)
+        price_source = UdpSource(host, int(port))
+
+    service = create_contract_service(algod.AlgodClient(args.algod_token, args.algod_url),
+                                      load_deployed_config(args.config))
+    feeder = PriceFeeder(service, price_source, mnemonic.to_private_key(os.environ["ORACLE_MNEMONIC"]),
+                         FeedPolicy(args.deviation, args.heartbeat))
+    feeder.run(args.interval)
@@ -0,0 +1,100 @@
+"""
+Price History - GoldChain
+Reads the price oracle's box ring buffer as NumPy arrays, pages fetched concurrently,
+and decodes its hourly/daily checkpoints into the signed changes the oracle reports.
+
+Each page box holds HISTORY_PAGE_SIZE big-endian (price, timestamp) uint64 pairs and
+update n (counting from 0) sits in slot n % HISTORY_CAPACITY, so the last
+min(count, HISTORY_CAPACITY) updates are the slots from count - that many, wrapping.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+from contract_service import BOX_READ_WORKERS, ContractService
+from price_oracle import CHANGE_WINDOWS, CHECKPOINT_BYTES, HISTORY_CAPACITY, HISTORY_PAGE_SIZE
+
+
+@dataclass
+class PriceHistory:
+    """Oracle price updates, oldest first"""
+    prices: np.ndarray      # microALGO per vGold (uint64)
+    timestamps: np.ndarray  # update times (uint64)
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @classmethod
+    def from_pages(cls, pages: Dict[int, bytes], count: int, last: Optional[int] = None) -> "PriceHistory":
+        """Build from raw page contents by page index, given the oracle's update count"""
+        points = np.zeros((HISTORY_CAPACITY, 2), dtype=np.uint64)
+        for page, data in pages.items():
+            if data:
+                start = page * HISTORY_PAGE_SIZE
+                points[start:start + HISTORY_PAGE_SIZE] = np.frombuffer(data, dtype=">u8").reshape(-1, 2)
+
+        slots = _slots(count, last)
+        return cls(prices=points[slots, 0], timestamps=points[slots, 1])
+
+    @classmethod
+    def from_service(cls, service: ContractService, last: Optional[int] = None,
+                     max_workers: int = BOX_READ_WORKERS) -> "PriceHistory":
+        """Read the last updates still in the buffer (all of them by default), one request per page"""
+        count = service.get_price_history_count()
+        pages = sorted(set((_slots(count, last) // HISTORY_PAGE_SIZE).tolist()))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            contents = dict(zip(pages, pool.map(service.get_price_history_page, pages)))
+        return cls.from_pages(contents, count, last)
+
+
+def _slots(count: int, last: Optional[int] = None) -> np.ndarray:
+    """Ring buffer slots of the last updates still held, oldest first"""
+    held = min(count, HISTORY_CAPACITY, count if last is None else last)
+    return np.arange(count - held, count, dtype=np.int64) % HISTORY_CAPACITY
+
+
+def decode_change(value: int) -> int:
+    """Signed basis points from the oracle's two's complement uint64 change"""
+    return value - 2 ** 64 if value >= 2 ** 63 else value
+
+
+def signed_change(old_price: int, new_price: int) -> int:
+    """The oracle's change from old_price to new_price in basis points, floored"""
+    return (new_price - old_price) * 10000 // old_price if old_price else 0
+
+
+@dataclass
+class PriceCheckpoints:
+    """The oracle's checkpoint box with the price and update time it was rolled with"""
+    slots: np.ndarray  # hourly then daily prices in effect at each period's start (uint64)
+    current_price: int
+    update_time: int
+
+    @classmethod
+    def from_box(cls, data: bytes, current_price: int, update_time: int) -> "PriceCheckpoints":
+        """Decode the raw box, empty before the first update"""
+        slots = np.frombuffer(data, dtype=">u8").astype(np.uint64) if data else np.zeros(0, dtype=np.uint64)
+        return cls(slots=slots, current_price=current_price, update_time=update_time)
+
+    @classmethod
+    def from_service(cls, service: ContractService) -> "PriceCheckpoints":
+        """Read the checkpoint box and oracle price"""
+        price, update_time = service.get_oracle_price()
+        return cls.from_box(service.get_price_checkpoints(), price, update_time)
+
+    def price_back(self, window: str, now: int) -> int:
+        """Price at the start of the period window's length before now's, like the contract"""
+        period, back, first, size = CHANGE_WINDOWS[window]
+        target = now // period - back
+        if len(self.slots) < CHECKPOINT_BYTES // 8 or target > self.update_time // period:
+            return self.current_price
+        return int(self.slots[first + target % size])
+
+    def changes(self, now: Optional[int] = None) -> Dict[str, int]:
+        """Signed 24h, 7d and 30d changes in basis points, as the oracle's change method reports them"""
+        now = now or int(time.time())
+        return {window: signed_change(self.price_back(window, now), self.current_price) for window in CHANGE_WINDOWS}
@@ -4,16 +4,116 @@ Manages gold price updates and provides price data to other contracts.
 """
 
 from pyteal import *
+from oracle_twap import cumulative_price
+from router import DISPATCH_NAMES, HOT_METHODS, ORACLE_METHODS, method_arg, route_noop
+from state_keys import ORACLE_KEYS, ORACLE_LOCAL_KEYS
 
-def price_oracle():
+# Accepted price range in microALGO per vGold (0.001 to 1 ALGO)
+MIN_PRICE = 1_000
+MAX_PRICE = 1_000_000
+
+# Asset modes
+ASSETS_SINGLE = "single"  # vGold only
+ASSETS_MULTI = "multi"    # vGold plus per-asset price slots, set in batches by update_prices
+
+# Multi-asset mode: MAX_ASSETS slots of ASSET_FIELDS uint64s packed in the ASSETS_BOX box.
+# Slot VGOLD_ASSET_SLOT is vGold itself, kept in global state as in single mode.
+# update_prices takes packed (slot, price) uint64 pairs and asks for PRICE_ITEM_BUDGET
+# opcodes per pair, plus VGOLD_PRICE_BUDGET for the checkpoints and history of a vGold price.
+ASSETS_BOX = b"a"
+MAX_ASSETS = 32
+ASSET_FIELDS = ["price", "update_time", "min_price", "max_price"]
+ASSET_SLOT_BYTES = len(ASSET_FIELDS) * 8
+VGOLD_ASSET_SLOT = 0
+PRICE_ITEM_BUDGET = 60
+VGOLD_PRICE_BUDGET = 300
+
+# Reporter modes
+REPORTERS_SINGLE = "single"  # the oracle address sets the vGold price
+REPORTERS_MEDIAN = "median"  # the median of several reporters' quotes sets it
+
+# Median mode: up to MAX_REPORTERS addresses, ascending, in the REPORTERS_BOX box. A round
+# is one atomic group: a report call (round, price, reporter index) signed by each reporter,
+# sorted by price, then an aggregate call (round) that sets the median. Quotes further than
+# max_deviation basis points from the median are outliers, and at least reporter_quorum
+# quotes must be inliers.
+REPORTERS_BOX = b"r"
+MAX_REPORTERS = 16
+MAX_REPORTS = 15  # a full group less the aggregate call
+REPORTER_BYTES = 32
+
+# Price history ring buffer: HISTORY_PAGES boxes named HISTORY_BOX_PREFIX + 8-byte page index,
+# each holding HISTORY_PAGE_SIZE (price, timestamp) uint64 pairs. Update n (counting from 0)
+# is written to slot n % HISTORY_CAPACITY, overwriting the oldest once the buffer is full.
+HISTORY_BOX_PREFIX = b"h"
+HISTORY_PAGE_SIZE = 32
+HISTORY_PAGES = 32
+HISTORY_CAPACITY = HISTORY_PAGE_SIZE * HISTORY_PAGES
+HISTORY_POINT_BYTES = 16
+HISTORY_PAGE_BYTES = HISTORY_PAGE_SIZE * HISTORY_POINT_BYTES
+
+def history_box_name(page: int) -> bytes:
+    """Box name of a price history page"""
+    return HISTORY_BOX_PREFIX + page.to_bytes(8, 'big')
+
+# Price checkpoints: the price in effect at the start of each hour and each day, kept in
+# CHECKPOINT_HOURS and CHECKPOINT_DAYS uint64 slots (period number modulo their count) in
+# one box, hours first. Updates roll them forward to their own hour and day.
+CHECKPOINT_BOX = b"k"
+CHECKPOINT_HOURS = 25  # this hour and the 24 before it
+CHECKPOINT_DAYS = 31   # this day and the 30 before it
+CHECKPOINT_BYTES = (CHECKPOINT_HOURS + CHECKPOINT_DAYS) * 8
+
+# (period seconds, first slot, slots) of each checkpoint ring
+CHECKPOINT_RINGS = [(3600, 0, CHECKPOINT_HOURS), (86400, CHECKPOINT_HOURS, CHECKPOINT_DAYS)]
+
+# Reported changes, in order: (period seconds, periods back, first slot, slots)
+CHANGE_WINDOWS = {
+    "24h": (3600, 24, 0, CHECKPOINT_HOURS),
+    "7d": (86400, 7, CHECKPOINT_HOURS, CHECKPOINT_DAYS),
+    "30d": (86400, 30, CHECKPOINT_HOURS, CHECKPOINT_DAYS),
+}
+
+
+def signed_change(old_price: Expr, new_price: Expr) -> Expr:
+    """floor((new - old) * 10000 / old) basis points, negative changes as two's complement uint64"""
+    return If(
+        old_price == Int(0),
+        Int(0),
+        If(
+            new_price >= old_price,
+            (new_price - old_price) * Int(10000) / old_price,
+            # -ceil(drop) == ~(ceil(drop) - 1), and ceil(drop) >= 1 here
+            BitwiseNot(((old_price - new_price) * Int(10000) + old_price - Int(1)) / old_price - Int(1)),
+        ),
+    )
+
+
+def price_oracle(dispatch: str = DISPATCH_NAMES, assets: str = ASSETS_SINGLE, reporters: str = REPORTERS_SINGLE):
     """Main price oracle contract logic"""
+    if assets not in (ASSETS_SINGLE, ASSETS_MULTI):
+        raise ValueError(f"Unknown asset mode: {assets}")
+    if reporters not in (REPORTERS_SINGLE, REPORTERS_MEDIAN):
+        raise ValueError(f"Unknown reporter mode: {reporters}")
+    use_assets = assets == ASSETS_MULTI
+    use_median = reporters == REPORTERS_MEDIAN
     
     # Global state keys
-    CURRENT_PRICE = Bytes("current_price")
-    PRICE_UPDATE_TIME = Bytes("price_update_time")
-    ORACLE_ADDRESS = Bytes("oracle_address")
-    MANAGER = Bytes("manager")
-    PRICE_HISTORY = Bytes("price_history")
+    CURRENT_PRICE = Bytes(ORACLE_KEYS["current_price"])
+    PRICE_UPDATE_TIME = Bytes(ORACLE_KEYS["price_update_time"])
+    ORACLE_ADDRESS = Bytes(ORACLE_KEYS["oracle_address"])
+    MANAGER = Bytes(ORACLE_KEYS["manager"])
+    PRICE_HISTORY = Bytes(ORACLE_KEYS["price_history"])
+    PRICE_CUMULATIVE = Bytes(ORACLE_KEYS["price_cumulative"])
+    REPORTER_QUORUM = Bytes(ORACLE_KEYS["reporter_quorum"])
+    MAX_DEVIATION = Bytes(ORACLE_KEYS["max_deviation"])
+    REPORT_ROUND = Bytes(ORACLE_KEYS["report_round"])
+    
+    # Price-time accumulated up to now, in microALGO-seconds
+    def cumulative_now():
+        return cumulative_price(
+            App.globalGet(PRICE_CUMULATIVE), App.globalGet(CURRENT_PRICE), App.globalGet(PRICE_UPDATE_TIME)
+        )
     
     # Application creation
     def on_creation():
@@ -24,43 +124,296 @@ def price_oracle():
             App.globalPut(ORACLE_ADDRESS, Txn.sender()),
             App.globalPut(MANAGER, Txn.sender()),
             App.globalPut(PRICE_HISTORY, Int(0)),  # Counter for price history
+            App.globalPut(PRICE_CUMULATIVE, Int(0)),
             
             Approve()
         ])
     
+    # Append a point to the price history and count it
+    def record_price(price):
+        slot = App.globalGet(PRICE_HISTORY) % Int(HISTORY_CAPACITY)
+        page = Concat(Bytes(HISTORY_BOX_PREFIX), Itob(slot / Int(HISTORY_PAGE_SIZE)))
+        return Seq([
+            Pop(BoxCreate(page, Int(HISTORY_PAGE_BYTES))),  # No-op once the page exists
+            BoxReplace(
+                page,
+                slot % Int(HISTORY_PAGE_SIZE) * Int(HISTORY_POINT_BYTES),
+                Concat(Itob(price), Itob(Global.latest_timestamp())),
+            ),
+            App.globalPut(PRICE_HISTORY, App.globalGet(PRICE_HISTORY) + Int(1)),
+        ])
+    
+    # Roll the checkpoint rings from the last update's hour and day to now, filling the
+    # periods in between with the outgoing price (the whole box the first time)
+    checkpoint_fill = ScratchVar(TealType.bytes)
+    checkpoints_created = ScratchVar(TealType.uint64)
+    checkpoint_count = ScratchVar(TealType.uint64)
+    checkpoint_start = ScratchVar(TealType.uint64)
+    
+    def fill_checkpoints(first, start, count):
+        return BoxReplace(
+            Bytes(CHECKPOINT_BOX),
+            (Int(first) + start) * Int(8),
+            Extract(checkpoint_fill.load(), Int(0), count * Int(8)),
+        )
+    
+    def roll_ring(period, first, size):
+        now = Global.latest_timestamp() / Int(period)
+        elapsed = now - App.globalGet(PRICE_UPDATE_TIME) / Int(period)
+        start, count = checkpoint_start.load(), checkpoint_count.load()
+        return Seq([
+            checkpoint_count.store(If(Or(checkpoints_created.load(), elapsed > Int(size)), Int(size), elapsed)),
+            checkpoint_start.store((now + Int(size) + Int(1) - count) % Int(size)),
+            
+            # The rolled slots are contiguous or wrap around the end of the ring once
+            If(start + count <= Int(size),
+               fill_checkpoints(first, start, count),
+               Seq([
+                   fill_checkpoints(first, start, Int(size) - start),
+                   fill_checkpoints(first, Int(0), start + count - Int(size)),
+               ])),
+        ])
+    
+    def roll_checkpoints(old_price):
+        return Seq([
+            checkpoints_created.store(BoxCreate(Bytes(CHECKPOINT_BOX), Int(CHECKPOINT_BYTES))),
+            
+            # 32 copies of the price, enough for the largest ring
+            checkpoint_fill.store(Itob(old_price)),
+            *[checkpoint_fill.store(Concat(checkpoint_fill.load(), checkpoint_fill.load())) for _ in range(5)],
+            *[roll_ring(period, first, size) for period, first, size in CHECKPOINT_RINGS],
+        ])
+    
+    # Price some periods back from a checkpoint ring, the current price if no update
+    # has rolled the ring that far yet
+    def price_back(checkpoints, period, back, first, size):
+        target = Global.latest_timestamp() / Int(period) - Int(back)
+        return If(
+            Or(Not(checkpoints.hasValue()), target > App.globalGet(PRICE_UPDATE_TIME) / Int(period)),
+            App.globalGet(CURRENT_PRICE),
+            ExtractUint64(checkpoints.value(), (Int(first) + target % Int(size)) * Int(8)),
+        )
+    
+    # Set the vGold price: roll checkpoints and accumulate the outgoing price over the
+    # time it held, update it, then append it to the price history
+    @Subroutine(TealType.none)
+    def set_vgold_price(new_price):
+        return Seq([
+            roll_checkpoints(App.globalGet(CURRENT_PRICE)),
+            App.globalPut(PRICE_CUMULATIVE, cumulative_now()),
+            App.globalPut(CURRENT_PRICE, new_price),
+            App.globalPut(PRICE_UPDATE_TIME, Global.latest_timestamp()),
+            record_price(new_price),
+        ])
+    
     # Update price (only by oracle address)
     def update_price():
+        # Get new price from application args
+        new_price = Btoi(Txn.application_args[1])
+
+        old_price = App.globalGet(CURRENT_PRICE)
+
         return Seq([
             # Check if caller is authorized oracle
             Assert(Txn.sender() == App.globalGet(ORACLE_ADDRESS)),
             
-            # Get new price from application args
-            new_price = Btoi(Txn.application_args[1]),
-            
             # Validate price is reasonable (between 0.001 and 1 ALGO per vGold)
-            Assert(new_price >= Int(1000)),  # 0.001 ALGO
-            Assert(new_price <= Int(1000000)),  # 1 ALGO
+            Assert(new_price >= Int(MIN_PRICE)),
+            Assert(new_price <= Int(MAX_PRICE)),
             
             # Store old price in history
-            old_price = App.globalGet(CURRENT_PRICE),
-            App.localPut(Int(0), Bytes("old_price"), old_price),
+            App.localPut(Int(0), Bytes(ORACLE_LOCAL_KEYS["old_price"]), old_price),
             
             # Update current price
-            App.globalPut(CURRENT_PRICE, new_price),
-            App.globalPut(PRICE_UPDATE_TIME, Global.latest_timestamp()),
+            set_vgold_price(new_price),
             
-            # Increment price history counter
-            App.globalPut(PRICE_HISTORY, App.globalGet(PRICE_HISTORY) + Int(1)),
+            Approve()
+        ])
+    
+    # Multi-asset mode: set many assets' prices in one call, within each asset's bounds.
+    # application_args[1] is packed (slot, price) uint64 pairs.
+    asset_slot = ScratchVar(TealType.uint64)
+    asset_price = ScratchVar(TealType.uint64)
+    asset_record = ScratchVar(TealType.bytes)
+    
+    def update_prices():
+        prices = Txn.application_args[1]
+        i = ScratchVar(TealType.uint64)
+        offset = asset_slot.load() * Int(ASSET_SLOT_BYTES)
+        
+        return Seq([
+            Assert(Txn.sender() == App.globalGet(ORACLE_ADDRESS)),
+            Assert(Len(prices) % Int(16) == Int(0)),
+            
+            # Pool budget with inner app calls paid from the group's fee credit
+            OpUp(OpUpMode.OnCall).ensure_budget(
+                Len(prices) / Int(16) * Int(PRICE_ITEM_BUDGET), OpUpFeeSource.GroupCredit
+            ),
+            
+            For(i.store(Int(0)), i.load() < Len(prices), i.store(i.load() + Int(16))).Do(Seq([
+                asset_slot.store(ExtractUint64(prices, i.load())),
+                asset_price.store(ExtractUint64(prices, i.load() + Int(8))),
+                Assert(asset_slot.load() < Int(MAX_ASSETS)),
+                If(asset_slot.load() == Int(VGOLD_ASSET_SLOT),
+                   # In median mode only the reporters set the vGold price
+                   Reject() if use_median else Seq([
+                       Assert(asset_price.load() >= Int(MIN_PRICE)),
+                       Assert(asset_price.load() <= Int(MAX_PRICE)),
+                       OpUp(OpUpMode.OnCall).ensure_budget(Int(VGOLD_PRICE_BUDGET), OpUpFeeSource.GroupCredit),
+                       set_vgold_price(asset_price.load()),
+                   ]),
+                   Seq([
+                       # Unregistered slots have a max_price of 0 and reject every price
+                       asset_record.store(BoxExtract(Bytes(ASSETS_BOX), offset, Int(ASSET_SLOT_BYTES))),
+                       Assert(asset_price.load() >= ExtractUint64(asset_record.load(), Int(16))),
+                       Assert(asset_price.load() <= ExtractUint64(asset_record.load(), Int(24))),
+                       BoxReplace(Bytes(ASSETS_BOX), offset, Concat(
+                           Itob(asset_price.load()), Itob(Global.latest_timestamp())
+                       )),
+                   ])),
+            ])),
             
             Approve()
         ])
     
+    # Register an asset slot or change its bounds (manager only), args: slot, min price, max price
+    def set_asset():
+        slot = Btoi(Txn.application_args[1])
+        return Seq([
+            Assert(Txn.sender() == App.globalGet(MANAGER)),
+            Assert(slot != Int(VGOLD_ASSET_SLOT)),
+            Assert(slot < Int(MAX_ASSETS)),
+            Assert(Btoi(Txn.application_args[2]) > Int(0)),
+            Assert(Btoi(Txn.application_args[2]) < Btoi(Txn.application_args[3])),
+            Pop(BoxCreate(Bytes(ASSETS_BOX), Int(MAX_ASSETS * ASSET_SLOT_BYTES))),  # No-op once it exists
+            BoxReplace(Bytes(ASSETS_BOX), slot * Int(ASSET_SLOT_BYTES) + Int(16), Concat(
+                Txn.application_args[2], Txn.application_args[3]
+            )),
+            Approve()
+        ])
+    
+    # One asset's slot (price, update time, min and max price), its slot in application_args[1]
+    def get_asset_price():
+        slot = Btoi(Txn.application_args[1])
+        return Seq([
+            Log(If(slot == Int(VGOLD_ASSET_SLOT),
+                   Concat(
+                       Itob(App.globalGet(CURRENT_PRICE)), Itob(App.globalGet(PRICE_UPDATE_TIME)),
+                       Itob(Int(MIN_PRICE)), Itob(Int(MAX_PRICE)),
+                   ),
+                   BoxExtract(Bytes(ASSETS_BOX), slot * Int(ASSET_SLOT_BYTES), Int(ASSET_SLOT_BYTES)))),
+            Approve()
+        ])
+    
+    # Median mode: one reporter's quote, args: round, price, reporter index.
+    # The aggregate call at the end of the group checks and counts it.
+    def report():
+        index = Btoi(Txn.application_args[3])
+        return Seq([
+            Assert(index < Int(MAX_REPORTERS)),
+            Assert(BoxExtract(Bytes(REPORTERS_BOX), index * Int(REPORTER_BYTES), Int(REPORTER_BYTES)) == Txn.sender()),
+            Approve()
+        ])
+    
+    # Median mode: set the price to the median of the group's reports for a round, args: round
+    report_count = ScratchVar(TealType.uint64)
+    report_mask = ScratchVar(TealType.uint64)
+    last_quote = ScratchVar(TealType.uint64)
+    median_price = ScratchVar(TealType.uint64)
+    inliers = ScratchVar(TealType.uint64)
+    
+    def aggregate():
+        round_arg = Txn.application_args[1]
+        i = ScratchVar(TealType.uint64)
+        quote = lambda index: Btoi(Gtxn[index].application_args[2])
+        reporter_bit = ShiftLeft(Int(1), Btoi(Gtxn[i.load()].application_args[3]))
+        deviation = If(quote(i.load()) > median_price.load(),
+                       quote(i.load()) - median_price.load(),
+                       median_price.load() - quote(i.load()))
+        report_method = Bytes("base16", method_arg(ORACLE_METHODS, "report", dispatch).hex())
+        
+        return Seq([
+            # Every other call in the group is a report for this round
+            Assert(Txn.group_index() == Global.group_size() - Int(1)),
+            report_count.store(Txn.group_index()),
+            Assert(App.globalGet(REPORTER_QUORUM) > Int(0)),  # Reporters registered
+            Assert(report_count.load() >= App.globalGet(REPORTER_QUORUM)),
+            Assert(Btoi(round_arg) > App.globalGet(REPORT_ROUND)),
+            
+            # Quotes sorted by price, each reporter at most once
+            report_mask.store(Int(0)),
+            last_quote.store(Int(0)),
+            For(i.store(Int(0)), i.load() < report_count.load(), i.store(i.load() + Int(1))).Do(Seq([
+                Assert(Gtxn[i.load()].type_enum() == TxnType.ApplicationCall),
+                Assert(Gtxn[i.load()].application_id() == Global.current_application_id()),
+                Assert(Gtxn[i.load()].on_completion() == OnComplete.NoOp),
+                Assert(Gtxn[i.load()].application_args[0] == report_method),
+                Assert(Gtxn[i.load()].application_args[1] == round_arg),
+                Assert(quote(i.load()) >= last_quote.load()),
+                Assert(BitwiseAnd(report_mask.load(), reporter_bit) == Int(0)),
+                last_quote.store(quote(i.load())),
+                report_mask.store(BitwiseOr(report_mask.load(), reporter_bit)),
+            ])),
+            
+            # The middle quote, or the mean of the middle two
+            median_price.store(
+                (quote((report_count.load() - Int(1)) / Int(2)) + quote(report_count.load() / Int(2))) / Int(2)
+            ),
+            
+            # Enough quotes must be within max_deviation of the median
+            inliers.store(Int(0)),
+            For(i.store(Int(0)), i.load() < report_count.load(), i.store(i.load() + Int(1))).Do(
+                If(deviation * Int(10000) <= median_price.load() * App.globalGet(MAX_DEVIATION),
+                   inliers.store(inliers.load() + Int(1)))
+            ),
+            Assert(inliers.load() >= App.globalGet(REPORTER_QUORUM)),
+            
+            Assert(median_price.load() >= Int(MIN_PRICE)),
+            Assert(median_price.load() <= Int(MAX_PRICE)),
+            App.globalPut(REPORT_ROUND, Btoi(round_arg)),
+            set_vgold_price(median_price.load()),
+            
+            Approve()
+        ])
+    
+    # Median mode: replace the reporter set (manager only), args: addresses in ascending
+    # order, quorum, max deviation in basis points
+    def set_reporters():
+        addresses = Txn.application_args[1]
+        quorum = Btoi(Txn.application_args[2])
+        i = ScratchVar(TealType.uint64)
+        return Seq([
+            Assert(Txn.sender() == App.globalGet(MANAGER)),
+            Assert(Len(addresses) % Int(REPORTER_BYTES) == Int(0)),
+            Assert(Len(addresses) <= Int(MAX_REPORTERS * REPORTER_BYTES)),
+            Assert(quorum > Int(0)),
+            Assert(quorum <= Int(MAX_REPORTS)),
+            Assert(quorum * Int(REPORTER_BYTES) <= Len(addresses)),
+            Assert(Btoi(Txn.application_args[3]) > Int(0)),
+            
+            # Ascending, so no reporter is registered twice
+            For(i.store(Int(REPORTER_BYTES)), i.load() < Len(addresses), i.store(i.load() + Int(REPORTER_BYTES))).Do(
+                Assert(BytesLt(
+                    Extract(addresses, i.load() - Int(REPORTER_BYTES), Int(REPORTER_BYTES)),
+                    Extract(addresses, i.load(), Int(REPORTER_BYTES)),
+                ))
+            ),
+            
+            Pop(BoxCreate(Bytes(REPORTERS_BOX), Int(MAX_REPORTERS * REPORTER_BYTES))),  # No-op once it exists
+            BoxReplace(Bytes(REPORTERS_BOX), Int(0), Concat(
+                addresses, BytesZero(Int(MAX_REPORTERS * REPORTER_BYTES) - Len(addresses))
+            )),
+            App.globalPut(REPORTER_QUORUM, quorum),
+            App.globalPut(MAX_DEVIATION, Btoi(Txn.application_args[3])),
+            Approve()
+        ])
+    
     # Get current price
     def get_price():
         return Seq([
             # Return current price
-            App.localPut(Int(0), Bytes("price"), App.globalGet(CURRENT_PRICE)),
-            App.localPut(Int(0), Bytes("timestamp"), App.globalGet(PRICE_UPDATE_TIME)),
+            App.localPut(Int(0), Bytes(ORACLE_LOCAL_KEYS["price"]), App.globalGet(CURRENT_PRICE)),
+            App.localPut(Int(0), Bytes(ORACLE_LOCAL_KEYS["timestamp"]), App.globalGet(PRICE_UPDATE_TIME)),
             Approve()
         ])
     
@@ -68,7 +421,14 @@ def price_oracle():
     def get_price_history():
         return Seq([
             # Return price history count
-            App.localPut(Int(0), Bytes("history_count"), App.globalGet(PRICE_HISTORY)),
+            App.localPut(Int(0), Bytes(ORACLE_LOCAL_KEYS["history_count"]), App.globalGet(PRICE_HISTORY)),
+            Approve()
+        ])
+    
+    # Cumulative price and its timestamp, for TWAPs between any two reads
+    def get_cumulative():
+        return Seq([
+            Log(Concat(Itob(cumulative_now()), Itob(Global.latest_timestamp()))),
             Approve()
         ])
     
@@ -86,63 +446,73 @@ def price_oracle():
     
     # Emergency price update (manager only)
     def emergency_update():
+        # Get new price from application args
+        new_price = Btoi(Txn.application_args[1])
+
         return Seq([
             # Check if caller is manager
             Assert(Txn.sender() == App.globalGet(MANAGER)),
             
-            # Get new price from application args
-            new_price = Btoi(Txn.application_args[1]),
-            
             # Update current price
-            App.globalPut(CURRENT_PRICE, new_price),
-            App.globalPut(PRICE_UPDATE_TIME, Global.latest_timestamp()),
+            set_vgold_price(new_price),
             
             Approve()
         ])
     
-    # Calculate price change percentage
+    # One page of the price history, its page index in application_args[1]
+    def get_history_page():
+        page = BoxGet(Concat(Bytes(HISTORY_BOX_PREFIX), Txn.application_args[1]))
+        return Seq([
+            page,
+            Assert(page.hasValue()),
+            Log(page.value()),
+            Approve()
+        ])
+    
+    # Signed 24h, 7d and 30d price changes in basis points, logged in that order,
+    # the 24h change also kept in local state
     def get_price_change():
+        checkpoints = BoxGet(Bytes(CHECKPOINT_BOX))
+        changes = [
+            signed_change(price_back(checkpoints, *window), App.globalGet(CURRENT_PRICE))
+            for window in CHANGE_WINDOWS.values()
+        ]
+
         return Seq([
-            # Get current and previous prices
-            current_price = App.globalGet(CURRENT_PRICE),
-            old_price = App.localGet(Int(0), Bytes("old_price")),
-            
-            # Calculate percentage change
-            price_diff = current_price - old_price,
-            change_percentage = price_diff * Int(10000) / old_price,  # In basis points
-            
-            App.localPut(Int(0), Bytes("change_percentage"), change_percentage),
+            checkpoints,
+            Log(Concat(*[Itob(change) for change in changes])),
+            App.localPut(Int(0), Bytes(ORACLE_LOCAL_KEYS["change_percentage"]), changes[0]),
             Approve()
         ])
     
     # Set price bounds (manager only)
     def set_price_bounds():
+        # Store price bounds
+        min_price = Btoi(Txn.application_args[1])
+        max_price = Btoi(Txn.application_args[2])
+
         return Seq([
             # Check if caller is manager
             Assert(Txn.sender() == App.globalGet(MANAGER)),
             
-            # Store price bounds
-            min_price = Btoi(Txn.application_args[1]),
-            max_price = Btoi(Txn.application_args[2]),
-            
-            App.globalPut(Bytes("min_price"), min_price),
-            App.globalPut(Bytes("max_price"), max_price),
+            App.globalPut(Bytes(ORACLE_KEYS["min_price"]), min_price),
+            App.globalPut(Bytes(ORACLE_KEYS["max_price"]), max_price),
             
             Approve()
         ])
     
     # Validate price within bounds
     def validate_price():
+        # Get price and bounds
+        price = Btoi(Txn.application_args[1])
+        min_price = App.globalGet(Bytes(ORACLE_KEYS["min_price"]))
+        max_price = App.globalGet(Bytes(ORACLE_KEYS["max_price"]))
+
+        # Check if price is within bounds
+        is_valid = And(price >= min_price, price <= max_price)
+
         return Seq([
-            # Get price and bounds
-            price = Btoi(Txn.application_args[1]),
-            min_price = App.globalGet(Bytes("min_price")),
-            max_price = App.globalGet(Bytes("max_price")),
-            
-            # Check if price is within bounds
-            is_valid = And(price >= min_price, price <= max_price),
-            
-            App.localPut(Int(0), Bytes("is_valid"), If(is_valid, Int(1), Int(0))),
+            App.localPut(Int(0), Bytes(ORACLE_LOCAL_KEYS["is_valid"]), If(is_valid, Int(1), Int(0))),
             Approve()
         ])
     
@@ -151,23 +521,30 @@ def price_oracle():
         return Cond(
             [Txn.application_id() == Int(0), on_creation()],
             [Txn.on_completion() == OnComplete.NoOp, 
-             Cond(
-                [Txn.application_args[0] == Bytes("update"), update_price()],
-                [Txn.application_args[0] == Bytes("get_price"), get_price()],
-                [Txn.application_args[0] == Bytes("history"), get_price_history()],
-                [Txn.application_args[0] == Bytes("update_oracle"), update_oracle()],
-                [Txn.application_args[0] == Bytes("emergency"), emergency_update()],
-                [Txn.application_args[0] == Bytes("change"), get_price_change()],
-                [Txn.application_args[0] == Bytes("set_bounds"), set_price_bounds()],
-                [Txn.application_args[0] == Bytes("validate"), validate_price()],
-                [Int(1), Reject()]
-             )],
+             route_noop(ORACLE_METHODS, {
+                 "update": Reject() if use_median else update_price(),
+                 "get_price": get_price(),
+                 "history": get_price_history(),
+                 "update_oracle": update_oracle(),
+                 "emergency": emergency_update(),
+                 "change": get_price_change(),
+                 "set_bounds": set_price_bounds(),
+                 "validate": validate_price(),
+                 "cumulative": get_cumulative(),
+                 "history_page": get_history_page(),
+                 "update_prices": update_prices() if use_assets else Reject(),
+                 "set_asset": set_asset() if use_assets else Reject(),
+                 "asset_price": get_asset_price() if use_assets else Reject(),
+                 "report": report() if use_median else Reject(),
+                 "aggregate": aggregate() if use_median else Reject(),
+                 "set_reporters": set_reporters() if use_median else Reject(),
+             }, dispatch, HOT_METHODS["oracle"])],
             [Txn.on_completion() == OnComplete.OptIn, Approve()],
             [Txn.on_completion() == OnComplete.CloseOut, Approve()],
             [Txn.on_completion() == OnComplete.UpdateApplication, 
-             Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()],
+             Seq([Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()])],
             [Txn.on_completion() == OnComplete.DeleteApplication, 
-             Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()],
+             Seq([Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()])],
             [Int(1), Reject()]
         )
     
@@ -175,5 +552,5 @@ def price_oracle():
 
 if __name__ == "__main__":
     # Compile the contract
-    compiled = compileTeal(price_oracle(), Mode.Application, version=6)
+    compiled = compileTeal(price_oracle(), Mode.Application, version=8)
     print(compiled)
@@ -0,0 +1,175 @@
+"""
+Price Stream - GoldChain
+Follows the price oracle once, round by round, and fans each new vGold price out to
+any number of subscribers over a TCP or Unix socket as JSON lines:
+
+    {"price": 50123, "timestamp": 1760000000, "round": 41234567}
+
+Every subscriber has its own bounded queue. A subscriber that falls behind drops its
+oldest queued prices, never slowing the others or the follower, and new subscribers
+get the last price straight away. algod load is one status and one state read per
+round however many consumers are connected, and algod errors are retried with backoff
+rather than ending the stream.
+
+Usage:
+    python price_stream.py [--config deployed/contracts.json] [--port 8765 | --unix /tmp/goldchain-price.sock]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Optional, Set
+
+from algosdk.v2client import algod
+
+from contract_service import ContractService, create_contract_service, load_deployed_config
+
+# Prices queued per subscriber before its oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 16
+
+# Seconds to wait after a failed algod call, doubling while it keeps failing
+FOLLOW_RETRY_SECONDS = 1.0
+FOLLOW_MAX_RETRY_SECONDS = 30.0
+
+
+@dataclass(frozen=True)
+class PriceUpdate:
+    """An oracle price, its update time and the round it was first seen in"""
+    price: int
+    timestamp: int
+    round: int
+
+    def encode(self) -> bytes:
+        return json.dumps(asdict(self)).encode() + b"\n"
+
+    @classmethod
+    def decode(cls, line: bytes) -> "PriceUpdate":
+        return cls(**json.loads(line))
+
+
+class Subscriber:
+    """One consumer's queue of prices, dropping the oldest when it is full"""
+
+    def __init__(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, update: PriceUpdate) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(update)
+
+    async def get(self) -> PriceUpdate:
+        return await self.queue.get()
+
+
+class PriceBroadcaster:
+    """Fans price updates out to subscribers, caching the last one for late joiners"""
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.last: Optional[PriceUpdate] = None
+        self.published = 0
+
+    def subscribe(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE) -> Subscriber:
+        subscriber = Subscriber(maxsize)
+        if self.last is not None:
+            subscriber.offer(self.last)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def publish(self, update: PriceUpdate) -> None:
+        self.last = update
+        self.published += 1
+        for subscriber in self.subscribers:
+            subscriber.offer(update)
+
+
+async def follow_oracle(service: ContractService, broadcaster: PriceBroadcaster,
+                        retry_seconds: float = FOLLOW_RETRY_SECONDS) -> None:
+    """Publish the oracle price whenever its update time changes, checking once per round.
+    A failed algod call is logged and retried after a backoff, never ending the follow."""
+    round_number = None
+    last_update_time = None
+    delay = retry_seconds
+    while True:
+        try:
+            if round_number is None:
+                round_number = (await asyncio.to_thread(service.algod_client.status))["last-round"]
+
+            price, update_time = await asyncio.to_thread(service.get_oracle_price)
+            if update_time != last_update_time:
+                last_update_time = update_time
+                broadcaster.publish(PriceUpdate(price, update_time, round_number))
+
+            status = await asyncio.to_thread(service.algod_client.status_after_block, round_number)
+            round_number = status["last-round"]
+            delay = retry_seconds
+        except Exception as e:
+            print(f"Following the oracle failed after round {round_number}: {e}; retrying in {delay:g}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, FOLLOW_MAX_RETRY_SECONDS)
+
+
+async def stream_to_client(broadcaster: PriceBroadcaster, reader: asyncio.StreamReader,
+                           writer: asyncio.StreamWriter) -> None:
+    """Write prices to one connected client until it disconnects"""
+    subscriber = broadcaster.subscribe()
+    try:
+        while True:
+            update = await subscriber.get()
+            writer.write(update.encode())
+            await writer.drain()  # Only this client waits on a slow reader
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        writer.close()
+
+
+async def serve(service: ContractService, port: int = 8765, host: str = "127.0.0.1",
+                unix_path: Optional[str] = None) -> None:
+    """Follow the oracle and serve its prices on a TCP port or Unix socket forever"""
+    broadcaster = PriceBroadcaster()
+    handler = lambda reader, writer: stream_to_client(broadcaster, reader, writer)
+    if unix_path:
+        server = await asyncio.start_unix_server(handler, unix_path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    async with server:
+        await asyncio.gather(server.serve_forever(), follow_oracle(service, broadcaster))
+
+
+async def subscribe(port: int = 8765, host: str = "127.0.0.1",
+                    unix_path: Optional[str] = None) -> AsyncIterator[PriceUpdate]:
+    """Prices from a running price stream, starting with its last one"""
+    if unix_path:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while line := await reader.readline():
+            yield PriceUpdate.decode(line)
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream GoldChain oracle prices to subscribers")
+    parser.add_argument("--config", default="deployed/contracts.json", help="deploy_contracts.py output")
+    parser.add_argument("--algod-url", default=os.getenv("ALGOD_URL", "http://localhost:4001"))
+    parser.add_argument("--algod-token", default=os.getenv("ALGOD_TOKEN", "a" * 64))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Serve on this Unix socket path instead of TCP")
+    args = parser.parse_args()
+
+    service = create_contract_service(algod.AlgodClient(args.algod_token, args.algod_url),
+                                      load_deployed_config(args.config))
+    asyncio.run(serve(service, args.port, args.host, args.unix))
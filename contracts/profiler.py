@@ -0,0 +1,405 @@
+"""
+Contract Profiler
+Runs every NoOp/ABI method of the PyTeal and AlgoKit contracts through
+algod simulate with execution tracing and reports per-method costs as JSON.
+
+Usage (against LocalNet or any algod with simulate enabled):
+    python profiler.py                      # print the profile
+    python profiler.py --update-baseline    # record profile_baseline.json
+    python profiler.py --check              # fail if any cost regressed
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from algosdk import abi, account, encoding, mnemonic, transaction
+from algosdk.atomic_transaction_composer import (
+    AccountTransactionSigner,
+    AtomicTransactionComposer,
+    TransactionWithSigner,
+)
+from algosdk.kmd import KMDClient
+from algosdk.source_map import SourceMap
+from algosdk.v2client import algod
+from algosdk.v2client.models import SimulateRequest, SimulateRequestTransactionGroup, SimulateTraceConfig
+from pyteal import Mode, compileTeal
+
+from lending_contract import lending_contract
+from price_oracle import price_oracle
+from router import CONTRACT_METHODS, DISPATCH_NAMES, method_arg
+from trading_contract import trading_contract
+from vgold_token import vgold_token
+
+BASELINE_PATH = Path(__file__).parent / "profile_baseline.json"
+ALGOPY_ARTIFACTS = Path(__file__).parent.parent / "projects" / "GoldChainAlgo" / "smart_contracts" / "artifacts"
+
+# Maximum opcode budget of a single app call
+AVM_OPCODE_BUDGET = 700
+
+STATE_READ_OPS = {
+    "app_global_get", "app_global_get_ex", "app_local_get", "app_local_get_ex",
+    "box_get", "box_extract", "box_len",
+}
+STATE_WRITE_OPS = {
+    "app_global_put", "app_global_del", "app_local_put", "app_local_del",
+    "box_put", "box_replace", "box_create", "box_del", "box_splice", "box_resize",
+}
+
+PYTEAL_CONTRACTS = {
+    "vgold": vgold_token,
+    "trading": trading_contract,
+    "lending": lending_contract,
+    "oracle": price_oracle,
+}
+
+# Sample uint64 arguments for ABI methods whose asserts reject the generic default
+ABI_SAMPLE_ARGS = {
+    "update_price": {"new_price": 50_000},
+    "emergency_update": {"new_price": 50_000},
+    "validate_price": {"price": 50_000},
+    "set_price_bounds": {"min_price": 1_000, "max_price": 1_000_000},
+    "set_trading_fee": {"new_fee": 25},
+    "set_collateral_ratio": {"new_ratio": 150},
+    "borrow_vgold": {"collateral_amount": 1_500_000},
+    "lend_vgold": {"duration_days": 30},
+    "get_twap": {"start_cumulative": 0, "start_time": 0},
+}
+DEFAULT_UINT = 1_000_000
+
+# PyTeal methods paid for by an ALGO payment grouped before the call, and its amount
+PYTEAL_PAYMENTS = {
+    ("trading", "buy"): 1_000_000,
+    ("lending", "borrow"): 1_500_000,
+}
+
+
+def get_localnet_account(algod_client: algod.AlgodClient) -> Tuple[str, str]:
+    """Profiling account from PROFILER_MNEMONIC or the LocalNet default wallet"""
+    phrase = os.getenv("PROFILER_MNEMONIC", "").strip()
+    if phrase:
+        private_key = mnemonic.to_private_key(phrase)
+        return account.address_from_private_key(private_key), private_key
+
+    kmd = KMDClient(os.getenv("KMD_TOKEN", "a" * 64), os.getenv("KMD_URL", "http://localhost:4002"))
+    wallet = next(w for w in kmd.list_wallets() if w["name"] == "unencrypted-default-wallet")
+    handle = kmd.init_wallet_handle(wallet["id"], "")
+    try:
+        address = max(
+            kmd.list_keys(handle),
+            key=lambda addr: algod_client.account_info(addr)["amount"],
+        )
+        return address, kmd.export_key(handle, "", address)
+    finally:
+        kmd.release_wallet_handle(handle)
+
+
+class ContractProfiler:
+    """Deploys contracts and profiles their methods with simulate"""
+
+    def __init__(self, algod_client: algod.AlgodClient, address: str, private_key: str):
+        self.algod_client = algod_client
+        self.address = address
+        self.private_key = private_key
+
+    def compile(self, teal: str) -> Tuple[bytes, List[str], SourceMap]:
+        """Compile TEAL and keep the source map for opcode lookups"""
+        result = self.algod_client.compile(teal, source_map=True)
+        return base64.b64decode(result["result"]), teal.splitlines(), SourceMap(result["sourcemap"])
+
+    def send(self, txn: transaction.Transaction) -> Dict:
+        """Sign, submit and wait for a transaction"""
+        tx_id = self.algod_client.send_transaction(txn.sign(self.private_key))
+        return transaction.wait_for_confirmation(self.algod_client, tx_id, 4)
+
+    def create_app(self, approval: bytes, clear: bytes, global_schema: transaction.StateSchema,
+                   local_schema: transaction.StateSchema, app_args: Optional[List[bytes]] = None,
+                   opt_in: bool = True) -> int:
+        """Create an app, fund its account and opt the profiling account in"""
+        params = self.algod_client.suggested_params()
+        result = self.send(transaction.ApplicationCreateTxn(
+            sender=self.address,
+            sp=params,
+            on_complete=transaction.OnComplete.NoOpOC,
+            approval_program=approval,
+            clear_program=clear,
+            global_schema=global_schema,
+            local_schema=local_schema,
+            app_args=app_args or [],
+            extra_pages=(len(approval) + len(clear) - 1) // 2048,
+        ))
+        app_id = result["application-index"]
+
+        # Fund the app account so inner transactions and boxes can be simulated
+        self.send(transaction.PaymentTxn(self.address, params, transaction.get_application_address(app_id), 1_000_000))
+        if opt_in and local_schema.num_uints + local_schema.num_byte_slices > 0:
+            self.send(transaction.ApplicationOptInTxn(self.address, params, app_id))
+        return app_id
+
+    def simulate(self, txns: List[transaction.Transaction]) -> Dict:
+        """Simulate an unsigned group with execution tracing"""
+        request = SimulateRequest(
+            txn_groups=[SimulateRequestTransactionGroup(
+                txns=[transaction.SignedTransaction(txn, None) for txn in txns]
+            )],
+            allow_empty_signatures=True,
+            allow_unnamed_resources=True,
+            exec_trace_config=SimulateTraceConfig(enable=True, state_change=True),
+        )
+        return self.algod_client.simulate_transactions(request)
+
+    def measure(self, txns: List[transaction.Transaction], teal_lines: List[str], source_map: SourceMap) -> Dict:
+        """Opcode cost, inner transactions and state access for the app call closing a group"""
+        group = self.simulate(txns)["txn-groups"][0]
+        result = group["txn-results"][-1]
+        trace = result.get("exec-trace", {}).get("approval-program-trace", [])
+
+        reads = writes = 0
+        for step in trace:
+            line = source_map.get_line_for_pc(step["pc"])
+            op = teal_lines[line].split()[0] if line is not None else ""
+            reads += op in STATE_READ_OPS
+            writes += op in STATE_WRITE_OPS
+
+        return {
+            "opcode_cost": result.get("app-budget-consumed", 0),
+            "budget_used_pct": round(100 * result.get("app-budget-consumed", 0) / AVM_OPCODE_BUDGET, 1),
+            "inner_txns": count_inner_txns(result["txn-result"]),
+            "state_reads": reads,
+            "state_writes": writes,
+            "failure": group.get("failure-message"),
+        }
+
+    def profile_pyteal(self) -> Dict:
+        """Profile every NoOp method of the PyTeal contracts"""
+        report = {}
+        app_ids: Dict[str, int] = {}
+        schema = transaction.StateSchema(num_uints=10, num_byte_slices=10)
+        creation_args = {
+            "trading": lambda: [app_ids["vgold"].to_bytes(8, 'big'), app_ids["oracle"].to_bytes(8, 'big')],
+            "lending": lambda: [app_ids["vgold"].to_bytes(8, 'big'), app_ids["oracle"].to_bytes(8, 'big')],
+        }
+        schemas = {"lending": transaction.StateSchema(num_uints=16, num_byte_slices=4)}
+
+        for name in ("vgold", "oracle", "trading", "lending"):
+            teal = compileTeal(PYTEAL_CONTRACTS[name](DISPATCH_NAMES), Mode.Application, version=8)
+            approval, teal_lines, source_map = self.compile(teal)
+            app_ids[name] = self.create_app(approval, approval, schemas.get(name, schema), schema,
+                                            creation_args.get(name, list)())
+
+            methods = {}
+            for method in CONTRACT_METHODS[name]:
+                txn = transaction.ApplicationNoOpTxn(
+                    sender=self.address,
+                    sp=self.algod_client.suggested_params(),
+                    index=app_ids[name],
+                    app_args=[method_arg(CONTRACT_METHODS[name], method)] + self.pyteal_args(name, method, app_ids),
+                    accounts=[self.address],
+                    foreign_apps=[app_ids["oracle"]] if name in ("trading", "lending") else None,  # Prices read the oracle
+                )
+                txns = [txn]
+                if (name, method) in PYTEAL_PAYMENTS:
+                    payment = transaction.PaymentTxn(
+                        self.address,
+                        self.algod_client.suggested_params(),
+                        transaction.get_application_address(app_ids[name]),
+                        PYTEAL_PAYMENTS[(name, method)],
+                    )
+                    txns = transaction.assign_group_id([payment, txn])
+                methods[method] = self.measure(txns, teal_lines, source_map)
+
+            report[name] = {
+                "app_id": app_ids[name],
+                "program_size": {"approval": len(approval), "clear": len(approval)},
+                "methods": methods,
+            }
+        return report
+
+    def pyteal_args(self, contract: str, method: str, app_ids: Dict[str, int]) -> List[bytes]:
+        """Sample arguments for a PyTeal NoOp method"""
+        itob = lambda value: value.to_bytes(8, 'big')
+        address = encoding.decode_address(self.address)
+        return {
+            ("vgold", "transfer"): [itob(1)],
+            ("vgold", "mint"): [itob(1)],
+            ("vgold", "burn"): [itob(1)],
+            ("trading", "sell"): [itob(1_000_000)],
+            ("trading", "update_oracle"): [itob(app_ids["oracle"])],
+            ("trading", "update_fee"): [itob(25)],
+            ("trading", "twap"): [itob(0), itob(0)],
+            ("lending", "lend"): [itob(1_000_000), itob(30)],
+            ("lending", "borrow"): [itob(1_000_000), itob(30)],
+            ("lending", "position"): [b"lend"],
+            ("lending", "twap"): [itob(0), itob(0)],
+            ("oracle", "update"): [itob(50_000)],
+            ("oracle", "update_oracle"): [address],
+            ("oracle", "emergency"): [itob(50_000)],
+            ("oracle", "set_bounds"): [itob(1_000), itob(1_000_000)],
+            ("oracle", "validate"): [itob(50_000)],
+            ("oracle", "history_page"): [itob(0)],
+            ("oracle", "update_prices"): [itob(0) + itob(50_000)],
+            ("oracle", "set_asset"): [itob(1), itob(1_000), itob(1_000_000)],
+            ("oracle", "asset_price"): [itob(0)],
+        }.get((contract, method), [])
+
+    def profile_algopy(self, artifacts: Path) -> Dict:
+        """Profile every ABI method of the compiled AlgoKit contracts"""
+        report = {}
+        for spec_path in sorted(artifacts.glob("*/*.arc56.json")):
+            spec = json.loads(spec_path.read_text())
+            name = spec["name"]
+            approval, teal_lines, source_map = self.compile((spec_path.parent / f"{name}.approval.teal").read_text())
+            clear, _, _ = self.compile((spec_path.parent / f"{name}.clear.teal").read_text())
+
+            schema = spec["state"]["schema"]
+            app_id = self.create_app(
+                approval, clear,
+                transaction.StateSchema(schema["global"]["ints"], schema["global"]["bytes"]),
+                transaction.StateSchema(schema["local"]["ints"], schema["local"]["bytes"]),
+                opt_in="OptIn" in spec.get("bareActions", {}).get("call", []),
+            )
+
+            methods = {}
+            for method_spec in spec["methods"]:
+                if "NoOp" not in method_spec.get("actions", {}).get("call", ["NoOp"]):
+                    continue
+                method = abi.Method.undictify(method_spec)
+                atc = AtomicTransactionComposer()
+                atc.add_method_call(
+                    app_id=app_id,
+                    method=method,
+                    sender=self.address,
+                    sp=self.algod_client.suggested_params(),
+                    signer=AccountTransactionSigner(self.private_key),
+                    method_args=[self.abi_arg(method.name, arg, app_id) for arg in method.args],
+                )
+                txns = [txn_with_signer.txn for txn_with_signer in atc.build_group()]
+                methods[method.name] = self.measure(txns, teal_lines, source_map)
+
+            report[name] = {
+                "app_id": app_id,
+                "program_size": {"approval": len(approval), "clear": len(clear)},
+                "methods": methods,
+            }
+        return report
+
+    def abi_arg(self, method_name: str, arg: abi.Argument, app_id: int) -> Any:
+        """Sample value for an ABI argument"""
+        override = ABI_SAMPLE_ARGS.get(method_name, {})
+        if arg.name in override:
+            return override[arg.name]
+        if abi.is_abi_transaction_type(arg.type):
+            # Grouped payments go to the app; override the amount through ABI_SAMPLE_ARGS[method]["<arg>_amount"]
+            payment = transaction.PaymentTxn(
+                self.address,
+                self.algod_client.suggested_params(),
+                transaction.get_application_address(app_id),
+                override.get(f"{arg.name}_amount", DEFAULT_UINT),
+            )
+            return TransactionWithSigner(payment, AccountTransactionSigner(self.private_key))
+        if abi.is_abi_reference_type(arg.type):
+            return self.address if arg.type == abi.ABIReferenceType.ACCOUNT else 0
+        return default_abi_value(arg.type, self.address)
+
+
+def default_abi_value(abi_type: abi.ABIType, address: str) -> Any:
+    """Generic sample value for an ABI type"""
+    if isinstance(abi_type, abi.UintType):
+        return DEFAULT_UINT
+    if isinstance(abi_type, abi.BoolType):
+        return False
+    if isinstance(abi_type, abi.StringType):
+        return "lend"
+    if isinstance(abi_type, abi.AddressType):
+        return address
+    if isinstance(abi_type, abi.ByteType):
+        return 0
+    if isinstance(abi_type, abi.TupleType):
+        return [default_abi_value(child, address) for child in abi_type.child_types]
+    if isinstance(abi_type, abi.ArrayStaticType):
+        return [default_abi_value(abi_type.child_type, address)] * abi_type.static_length
+    if isinstance(abi_type, abi.ArrayDynamicType):
+        return []
+    raise ValueError(f"No sample value for ABI type {abi_type}")
+
+
+def count_inner_txns(txn_result: Dict) -> int:
+    """Count inner transactions, including nested ones"""
+    return sum(1 + count_inner_txns(inner) for inner in txn_result.get("inner-txns", []))
+
+
+def find_regressions(profile: Dict, baseline: Dict, tolerance: float = 0.0) -> List[str]:
+    """Compare opcode costs and program sizes against the baseline"""
+    regressions = []
+
+    def check(label: str, current: int, previous: int):
+        if current > previous * (1 + tolerance):
+            regressions.append(f"{label}: {previous} -> {current}")
+
+    for family, contracts in baseline.items():
+        for contract, base in contracts.items():
+            current = profile.get(family, {}).get(contract)
+            if current is None:
+                regressions.append(f"{family}.{contract}: missing from profile")
+                continue
+            for program, size in base["program_size"].items():
+                check(f"{family}.{contract} {program} size", current["program_size"][program], size)
+            for method, cost in base["methods"].items():
+                if method not in current["methods"]:
+                    regressions.append(f"{family}.{contract}.{method}: missing from profile")
+                    continue
+                check(f"{family}.{contract}.{method} opcode cost",
+                      current["methods"][method]["opcode_cost"], cost["opcode_cost"])
+    return regressions
+
+
+def main() -> int:
+    """Profile all contracts and optionally check against the baseline"""
+    parser = argparse.ArgumentParser(description="Profile GoldChain contract methods with algod simulate")
+    parser.add_argument("--algod-url", default=os.getenv("ALGOD_URL", "http://localhost:4001"))
+    parser.add_argument("--algod-token", default=os.getenv("ALGOD_TOKEN", "a" * 64))
+    parser.add_argument("--artifacts", type=Path, default=ALGOPY_ARTIFACTS,
+                        help="AlgoKit build output (run `algokit project run build` first)")
+    parser.add_argument("--output", type=Path, help="Write the profile JSON here instead of stdout")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if any cost exceeds the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed relative increase, e.g. 0.05")
+    args = parser.parse_args()
+
+    algod_client = algod.AlgodClient(args.algod_token, args.algod_url)
+    profiler = ContractProfiler(algod_client, *get_localnet_account(algod_client))
+
+    profile = {"pyteal": profiler.profile_pyteal()}
+    if args.artifacts.exists():
+        profile["algopy"] = profiler.profile_algopy(args.artifacts)
+    else:
+        print(f"Skipping AlgoKit contracts, no artifacts at {args.artifacts}", file=sys.stderr)
+
+    output = json.dumps(profile, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.update_baseline:
+        BASELINE_PATH.write_text(output + "\n")
+        print(f"Baseline written to {BASELINE_PATH}", file=sys.stderr)
+
+    if args.check:
+        if not BASELINE_PATH.exists():
+            print(f"No baseline at {BASELINE_PATH}, run with --update-baseline first", file=sys.stderr)
+            return 1
+        regressions = find_regressions(profile, json.loads(BASELINE_PATH.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Quote Engine - GoldChain
+Buy and sell quotes computed with the trading contract's own integer arithmetic,
+one at a time or batched with NumPy, so clients never need a round trip to quote.
+
+buy:  gross = algo_amount * VGOLD_UNIT // price,  fee = gross * fee_bps // FEE_DENOMINATOR
+sell: gross = vgold_amount * price // VGOLD_UNIT, fee = gross * fee_bps // FEE_DENOMINATOR
+net = gross - fee. Every product is uint64 on chain, so a quote whose product
+overflows (or whose price is 0) is one the contract would reject.
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from trading_contract import DEFAULT_PRICE, DEFAULT_TRADING_FEE, FEE_DENOMINATOR, VGOLD_UNIT
+
+if TYPE_CHECKING:
+    from contract_service import ContractService
+
+MAX_UINT64 = 2 ** 64 - 1
+
+
+@dataclass(frozen=True)
+class Quote:
+    """One quote: vGold for a buy, microALGO for a sell"""
+    gross: int
+    fee: int
+    net: int
+
+
+@dataclass
+class BatchQuote:
+    """Quotes for broadcast amounts and prices; rows the contract would reject are 0 and not valid"""
+    gross: np.ndarray
+    fee: np.ndarray
+    net: np.ndarray
+    valid: np.ndarray
+
+
+def _quote(amount: int, multiplier: int, divisor: int, fee_bps: int) -> Quote:
+    """gross = amount * multiplier // divisor less the fee, rejecting what the AVM would"""
+    if divisor == 0:
+        raise ValueError("Price is zero")
+    if amount * multiplier > MAX_UINT64:
+        raise ValueError("Amount overflows uint64 on chain")
+    gross = amount * multiplier // divisor
+    if gross * fee_bps > MAX_UINT64:
+        raise ValueError("Fee overflows uint64 on chain")
+    fee = gross * fee_bps // FEE_DENOMINATOR
+    return Quote(gross, fee, gross - fee)
+
+
+def quote_buy(algo_amount: int, price: int = DEFAULT_PRICE, fee_bps: int = DEFAULT_TRADING_FEE) -> Quote:
+    """vGold received for algo_amount microALGO"""
+    return _quote(algo_amount, VGOLD_UNIT, price, fee_bps)
+
+
+def quote_sell(vgold_amount: int, price: int = DEFAULT_PRICE, fee_bps: int = DEFAULT_TRADING_FEE) -> Quote:
+    """microALGO received for vgold_amount vGold"""
+    return _quote(vgold_amount, price, VGOLD_UNIT, fee_bps)
+
+
+def _quote_batch(amounts, multipliers, divisors, fee_bps) -> BatchQuote:
+    """Vectorized _quote over broadcast uint64 arrays"""
+    amounts, multipliers, divisors, fee_bps = np.broadcast_arrays(
+        *(np.asarray(x, dtype=np.uint64) for x in (amounts, multipliers, divisors, fee_bps))
+    )
+    max_uint64 = np.uint64(MAX_UINT64)
+
+    # a * b overflows exactly when a > MAX // b
+    with np.errstate(divide="ignore"):
+        valid = (divisors > 0) & ((multipliers == 0) | (amounts <= max_uint64 // np.maximum(multipliers, 1)))
+        gross = np.where(valid, amounts * multipliers // np.maximum(divisors, 1), np.uint64(0))
+        valid &= (fee_bps == 0) | (gross <= max_uint64 // np.maximum(fee_bps, 1))
+    gross = np.where(valid, gross, np.uint64(0))
+    fee = gross * fee_bps // np.uint64(FEE_DENOMINATOR)
+    return BatchQuote(gross=gross, fee=fee, net=gross - fee, valid=valid)
+
+
+def quote_buy_batch(algo_amounts, prices=DEFAULT_PRICE, fee_bps=DEFAULT_TRADING_FEE) -> BatchQuote:
+    """vGold received for each microALGO amount and price, broadcast together"""
+    with np.errstate(over="ignore"):
+        return _quote_batch(algo_amounts, VGOLD_UNIT, prices, fee_bps)
+
+
+def quote_sell_batch(vgold_amounts, prices=DEFAULT_PRICE, fee_bps=DEFAULT_TRADING_FEE) -> BatchQuote:
+    """microALGO received for each vGold amount and price, broadcast together"""
+    with np.errstate(over="ignore"):
+        return _quote_batch(vgold_amounts, prices, VGOLD_UNIT, fee_bps)
+
+
+class QuoteEngine:
+    """Quotes at a cached price and trading fee"""
+
+    def __init__(self, price: int = DEFAULT_PRICE, fee_bps: int = DEFAULT_TRADING_FEE):
+        self.price = price
+        self.fee_bps = fee_bps
+
+    @classmethod
+    def from_service(cls, service: "ContractService", price: Optional[int] = None) -> "QuoteEngine":
+        """Engine at the trading contract's fee and the oracle price (or the given price)"""
+        if price is None:
+            price, _ = service.get_oracle_price()
+        return cls(price, service.get_trading_fee())
+
+    def buy(self, algo_amount: int) -> Quote:
+        """vGold received for algo_amount microALGO"""
+        return quote_buy(algo_amount, self.price, self.fee_bps)
+
+    def sell(self, vgold_amount: int) -> Quote:
+        """microALGO received for vgold_amount vGold"""
+        return quote_sell(vgold_amount, self.price, self.fee_bps)
+
+    def buy_batch(self, algo_amounts, prices=None) -> BatchQuote:
+        """Buy quotes for many amounts, at the cached price unless prices are given"""
+        return quote_buy_batch(algo_amounts, self.price if prices is None else prices, self.fee_bps)
+
+    def sell_batch(self, vgold_amounts, prices=None) -> BatchQuote:
+        """Sell quotes for many amounts, at the cached price unless prices are given"""
+        return quote_sell_batch(vgold_amounts, self.price if prices is None else prices, self.fee_bps)
@@ -0,0 +1,198 @@
+"""
+Risk Analytics - GoldChain
+Columnar NumPy risk scan of lending borrow positions over a grid of vGold prices.
+
+The integer math mirrors lending_contract.py exactly: debt with interest is
+amount * borrow_index / snapshot, its value is debt * price / VGOLD_UNIT (both
+128-bit WideRatio in the contract, floored), and a position is liquidatable when
+collateral * 100 < debt_value * liquidation_threshold. The collateral borrow_vgold
+requires is amount * min_collateral_ratio / 100, compared with microALGO whatever
+the price, as the contract does.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from contract_service import BOX_READ_WORKERS, ContractService
+from lending_contract import (
+    DEFAULT_LIQUIDATION_THRESHOLD, DEFAULT_MIN_COLLATERAL_RATIO, INDEX_SCALE, LIQUIDATION_DISCOUNT, VGOLD_UNIT,
+)
+
+# mul_div results from here up are beyond the float estimate and computed with Python ints
+MAX_EXACT = 2 ** 53
+MAX_UINT64 = 2 ** 64 - 1
+
+# Price grid rows evaluated at once by summarize, bounds memory to chunk * positions
+SUMMARY_CHUNK = 64
+
+
+def mul_div(a, b, c, round_up: bool = False, saturate: bool = False) -> np.ndarray:
+    """Exact floor (or ceiling) of a * b / c for broadcastable uint64 arrays, like WideRatio.
+    Estimates in float64 and corrects with the remainder computed in wrapping uint64 arithmetic;
+    the rare results from MAX_EXACT up are computed one by one with Python ints. A result past
+    uint64 (or c of 0) raises ValueError, or is MAX_UINT64 when saturate is set."""
+    a, b, c = (np.asarray(x, dtype=np.uint64) for x in (a, b, c))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        estimate = a.astype(np.float64) * b.astype(np.float64) / c.astype(np.float64)
+
+    # inf and nan included, and divisors a few of which would overflow the signed remainder below
+    large = ~(estimate < MAX_EXACT) | (c >= np.uint64(2 ** 61))
+    if large.any():
+        estimate = np.where(large, 0.0, estimate)
+
+    # a * b - q * c wraps modulo 2**64 but the true remainder is small, so its signed view is exact
+    q = np.floor(estimate).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        remainder = np.asarray(a * b - q * c).view(np.int64)
+    signed_c = c.astype(np.int64)
+    if large.any():
+        remainder, signed_c = np.where(large, 0, remainder), np.where(large, 1, signed_c)
+
+    # The estimate is off by at most a couple of units
+    while True:
+        low, high = remainder < 0, remainder >= signed_c
+        if not (low.any() or high.any()):
+            break
+        q = q - low + high
+        remainder = remainder + np.where(low, signed_c, 0) - np.where(high, signed_c, 0)
+    if round_up:
+        q = q + (remainder > 0)
+    q = np.array(q, dtype=np.uint64)
+
+    for index in map(tuple, np.argwhere(large)):
+        numerator = int(np.broadcast_to(a, q.shape)[index]) * int(np.broadcast_to(b, q.shape)[index])
+        divisor = int(np.broadcast_to(c, q.shape)[index])
+        if round_up:
+            numerator += divisor - 1
+        value = numerator // divisor if divisor else MAX_UINT64 + 1
+        if value > MAX_UINT64:
+            if not saturate:
+                raise ValueError("mul_div result overflows uint64")
+            value = MAX_UINT64
+        q[index] = value
+    return q
+
+
+@dataclass
+class BorrowPositions:
+    """Active borrow positions as columns, one row per position"""
+    owners: np.ndarray      # borrower addresses (object)
+    ids: np.ndarray         # position ids, 0 in local mode
+    amount: np.ndarray      # vGold borrowed (uint64)
+    collateral: np.ndarray  # microALGO collateral (uint64)
+    snapshot: np.ndarray    # borrow index at open (uint64)
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, int, Dict[str, int]]]) -> "BorrowPositions":
+        """Build from (owner, position id, decoded position) triples, keeping active positions only"""
+        active = [(owner, position_id, p) for owner, position_id, p in records if p["status"] == 1 and p["amount"] > 0]
+        column = lambda name: np.fromiter((p[name] for _, _, p in active), dtype=np.uint64, count=len(active))
+        return cls(
+            owners=np.array([owner for owner, _, _ in active], dtype=object),
+            ids=np.fromiter((position_id for _, position_id, _ in active), dtype=np.uint64, count=len(active)),
+            amount=column("amount"),
+            collateral=column("collateral"),
+            snapshot=column("index"),
+        )
+
+    @classmethod
+    def from_service(cls, service: ContractService, max_workers: int = BOX_READ_WORKERS) -> "BorrowPositions":
+        """Load every box-mode borrow position, read concurrently"""
+        keys = service.list_positions("borrow")
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            records = list(pool.map(lambda key: service.get_position(key[0], "borrow", key[1]), keys))
+        return cls.from_records((owner, position_id, record) for (owner, position_id), record in zip(keys, records))
+
+
+@dataclass
+class RiskGrid:
+    """Per-position figures, and per (price, position) figures with prices along axis 0"""
+    prices: np.ndarray               # (P,) microALGO per vGold
+    debt: np.ndarray                 # (N,) vGold owed with interest
+    interest: np.ndarray             # (N,) vGold interest owed
+    liquidation_price: np.ndarray    # (N,) lowest price at which the position is liquidatable
+    required_collateral: np.ndarray  # (N,) microALGO collateral borrow_vgold required for the amount
+    debt_value: np.ndarray           # (P, N) microALGO value of the debt
+    health_factor: np.ndarray        # (P, N) collateral / (debt value * threshold), below 1 is liquidatable
+    liquidatable: np.ndarray         # (P, N) the contract's liquidation check
+
+
+class RiskScanner:
+    """Vectorized health, liquidation price and interest over a price grid"""
+
+    def __init__(self, positions: BorrowPositions, borrow_index: int = INDEX_SCALE,
+                 min_collateral_ratio: int = DEFAULT_MIN_COLLATERAL_RATIO,
+                 liquidation_threshold: int = DEFAULT_LIQUIDATION_THRESHOLD):
+        self.positions = positions
+        self.min_collateral_ratio = min_collateral_ratio
+        self.liquidation_threshold = liquidation_threshold
+
+        # Price independent, computed once per scanner
+        self.debt = mul_div(positions.amount, np.uint64(borrow_index), positions.snapshot)
+        self.interest = self.debt - positions.amount
+        self.liquidation_price = self._liquidation_price()
+        self.required_collateral = positions.amount * np.uint64(min_collateral_ratio) // np.uint64(100)
+
+    @classmethod
+    def from_service(cls, service: ContractService) -> "RiskScanner":
+        """Scanner over every box-mode borrow position, with the pool's current index and ratios"""
+        pool = service.get_pool_totals()
+        return cls(BorrowPositions.from_service(service), pool["borrow_index"],
+                   pool["min_collateral_ratio"], pool["liquidation_threshold"])
+
+    def _liquidation_price(self) -> np.ndarray:
+        """Smallest price p with floor(debt * p / VGOLD_UNIT) * threshold > collateral * 100,
+        MAX_UINT64 for a position no uint64 price makes liquidatable"""
+        min_value = self.positions.collateral * np.uint64(100) // np.uint64(self.liquidation_threshold) + np.uint64(1)
+        return mul_div(min_value, np.uint64(VGOLD_UNIT), self.debt, round_up=True, saturate=True)
+
+    def debt_value(self, prices: np.ndarray) -> np.ndarray:
+        """(P, N) microALGO value of each position's debt at each price"""
+        prices = np.asarray(prices, dtype=np.uint64)
+        return mul_div(self.debt[np.newaxis, :], prices[:, np.newaxis], np.uint64(VGOLD_UNIT))
+
+    def scan(self, prices) -> RiskGrid:
+        """Every figure for every (price, position) pair in one vectorized pass"""
+        prices = np.asarray(prices, dtype=np.uint64)
+        debt_value = self.debt_value(prices)
+        collateral = self.positions.collateral[np.newaxis, :]
+        threshold_value = debt_value * np.uint64(self.liquidation_threshold)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            health_factor = collateral.astype(np.float64) * 100 / threshold_value.astype(np.float64)
+        return RiskGrid(
+            prices=prices,
+            debt=self.debt,
+            interest=self.interest,
+            liquidation_price=self.liquidation_price,
+            required_collateral=self.required_collateral,
+            debt_value=debt_value,
+            health_factor=health_factor,
+            liquidatable=collateral * np.uint64(100) < threshold_value,
+        )
+
+    def summarize(self, prices, chunk: int = SUMMARY_CHUNK) -> List[Dict[str, int]]:
+        """Per price: liquidatable positions, their debt and the collateral liquidators receive,
+        in bounded memory"""
+        prices = np.asarray(prices, dtype=np.uint64)
+        collateral = self.positions.collateral[np.newaxis, :]
+        liquidator_share = self.positions.collateral * np.uint64(10000 - LIQUIDATION_DISCOUNT) // np.uint64(10000)
+        summary = []
+        for start in range(0, len(prices), chunk):
+            debt_value = self.debt_value(prices[start:start + chunk])
+            liquidatable = collateral * np.uint64(100) < debt_value * np.uint64(self.liquidation_threshold)
+            for row, price in enumerate(prices[start:start + chunk]):
+                at_risk = liquidatable[row]
+                summary.append({
+                    "price": int(price),
+                    "liquidatable": int(at_risk.sum()),
+                    "debt_at_risk": int(self.debt[at_risk].sum()),
+                    "liquidator_collateral": int(liquidator_share[at_risk].sum()),
+                })
+        return summary
@@ -0,0 +1,117 @@
+"""
+Method Router - Algorand Smart Contract Helpers
+Builds the NoOp method dispatch shared by all GoldChain contracts.
+"""
+
+from typing import Dict, List, Optional
+from pyteal import *
+
+# Dispatch modes
+DISPATCH_NAMES = "names"        # application_args[0] is the method name
+DISPATCH_SELECTOR = "selector"  # application_args[0] is a 1-byte method selector
+
+# NoOp methods per contract, hot paths first.
+# In selector mode a method's selector is its index in this list, so only append.
+VGOLD_METHODS = ["transfer", "mint", "burn", "balance", "batch_transfer", "migrate", "create_asset"]
+TRADING_METHODS = ["buy", "sell", "update_oracle", "update_fee", "withdraw", "price", "opt_in_asset", "twap"]
+LENDING_METHODS = [
+    "lend", "borrow", "repay", "claim", "liquidate",
+    "position", "opt_in_asset", "set_rates", "liquidate_batch", "twap",
+]
+ORACLE_METHODS = [
+    "update", "get_price", "history", "update_oracle",
+    "emergency", "change", "set_bounds", "validate", "cumulative",
+    "history_page", "update_prices", "set_asset", "asset_price", "report",
+    "aggregate", "set_reporters",
+]
+
+# Leading methods that selector mode compares directly before the jump tree. A tree node costs
+# the same 4 ops as a direct compare, so the tree only pays off behind a long list; shorter
+# contracts compare every method and cost the same as name dispatch.
+HOT_METHODS = {
+    "vgold": len(VGOLD_METHODS),
+    "trading": len(TRADING_METHODS),
+    "lending": len(LENDING_METHODS),
+    "oracle": 5,   # update through emergency
+}
+
+CONTRACT_METHODS = {
+    "vgold": VGOLD_METHODS,
+    "trading": TRADING_METHODS,
+    "lending": LENDING_METHODS,
+    "oracle": ORACLE_METHODS,
+}
+
+
+def method_arg(methods: List[str], name: str, dispatch: str = DISPATCH_NAMES) -> bytes:
+    """Encode application_args[0] for a method under the given dispatch mode"""
+    if dispatch == DISPATCH_SELECTOR:
+        return methods.index(name).to_bytes(1, 'big')
+    return name.encode()
+
+
+def method_name(methods: List[str], arg: bytes, dispatch: str = DISPATCH_NAMES) -> Optional[str]:
+    """Decode application_args[0] back to a method name, None if it names no method"""
+    if dispatch == DISPATCH_SELECTOR:
+        return methods[arg[0]] if len(arg) == 1 and arg[0] < len(methods) else None
+    name = arg.decode(errors="replace")
+    return name if name in methods else None
+
+
+def route_noop(methods: List[str], handlers: Dict[str, Expr], dispatch: str = DISPATCH_NAMES, hot: int = 1) -> Expr:
+    """Build the NoOp router for a contract's methods"""
+    if dispatch == DISPATCH_NAMES:
+        return _route_by_name(methods, handlers)
+    if dispatch == DISPATCH_SELECTOR:
+        return _route_by_selector(methods, handlers, hot)
+    raise ValueError(f"Unknown dispatch mode: {dispatch}")
+
+
+def _route_by_name(methods: List[str], handlers: Dict[str, Expr]) -> Expr:
+    """Linear name comparison, cost grows with the method's position"""
+    return Cond(
+        *[[Txn.application_args[0] == Bytes(name), handlers[name]] for name in methods],
+        [Int(1), Reject()]
+    )
+
+
+def _route_by_selector(methods: List[str], handlers: Dict[str, Expr], hot: int) -> Expr:
+    """Hot selectors compared directly, the rest through a balanced jump tree"""
+    # PyTeal has no switch/match, so the jump table is a binary search over the selector byte,
+    # compared raw with b< so the tree needs no btoi or scratch slot
+    if hot < len(methods):
+        # b< compares as big-endian integers, so a zero-padded selector would pass for a method
+        # that method_name does not decode; only one-byte selectors enter the tree
+        router = Seq([
+            Assert(Len(Txn.application_args[0]) == Int(1)),
+            _selector_tree(methods, handlers, hot, len(methods), hot > 0, True),
+        ])
+    else:
+        router = Reject()
+
+    # Nested Ifs rather than Cond, so falling through to the tree costs nothing extra
+    for name in reversed(methods[:hot]):
+        router = If(Txn.application_args[0] == _selector(methods, name), handlers[name], router)
+    return router
+
+
+def _selector(methods: List[str], name: str) -> Expr:
+    """A method's selector as a byte constant"""
+    return Bytes("base16", method_arg(methods, name, DISPATCH_SELECTOR).hex())
+
+
+def _selector_tree(methods: List[str], handlers: Dict[str, Expr],
+                   lo: int, hi: int, check_lo: bool, check_hi: bool) -> Expr:
+    """Branch on the selector until a single method is left"""
+    if hi - lo == 1:
+        # Only the outermost leaves can see a selector outside the table
+        if check_lo or check_hi:
+            return If(Txn.application_args[0] == _selector(methods, methods[lo]), handlers[methods[lo]], Reject())
+        return handlers[methods[lo]]
+
+    mid = (lo + hi) // 2
+    return If(
+        BytesLt(Txn.application_args[0], _selector(methods, methods[mid])),
+        _selector_tree(methods, handlers, lo, mid, check_lo, False),
+        _selector_tree(methods, handlers, mid, hi, False, check_hi),
+    )
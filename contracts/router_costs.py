@@ -0,0 +1,123 @@
+"""
+Router Cost Comparison
+Compiles the NoOp router of every contract in both dispatch modes and
+reports the opcodes spent before each method's handler starts.
+"""
+
+import json
+import sys
+from typing import Dict, List
+
+from pyteal import *
+from router import CONTRACT_METHODS, DISPATCH_NAMES, DISPATCH_SELECTOR, HOT_METHODS, method_arg, route_noop
+
+# Marker handlers return 100 + method index, the marker itself costs 2 opcodes
+MARKER_BASE = 100
+MARKER_COST = 2
+
+# Selector arguments naming no method, besides one past the last and every method's selector
+# zero-padded to two bytes
+INVALID_SELECTORS = [b"", b"\x00\x00", b"\x00\x07", b"\x00\x00\x0a", b"\xff"]
+
+
+def compile_router(methods: List[str], dispatch: str, hot: int) -> List[str]:
+    """Compile a router whose handlers only return a per-method marker"""
+    handlers = {name: Return(Int(MARKER_BASE + i)) for i, name in enumerate(methods)}
+    teal = compileTeal(route_noop(methods, handlers, dispatch, hot), Mode.Application, version=8)
+    return [line.strip() for line in teal.splitlines() if line.strip() and not line.startswith("#")]
+
+
+def run_router(program: List[str], arg0: bytes) -> Dict:
+    """Execute a compiled router for one application_args[0] value"""
+    labels = {line[:-1]: i for i, line in enumerate(program) if line.endswith(":")}
+    stack: List = []
+    pc = 0
+    cost = 0
+
+    while pc < len(program):
+        line = program[pc]
+        pc += 1
+        if line.endswith(":"):
+            continue
+
+        op, *args = line.split()
+        cost += 1
+        if op == "txna" and args == ["ApplicationArgs", "0"]:
+            stack.append(arg0)
+        elif op == "byte" and args[0].startswith("0x"):
+            stack.append(bytes.fromhex(args[0][2:]))
+        elif op == "byte":
+            stack.append(args[0].strip('"').encode())
+        elif op == "int":
+            stack.append(int(args[0]))
+        elif op in ("==", "<"):
+            b, a = stack.pop(), stack.pop()
+            stack.append(int(a == b) if op == "==" else int(a < b))
+        elif op == "len":
+            stack.append(len(stack.pop()))
+        elif op == "b<":
+            b, a = stack.pop(), stack.pop()
+            stack.append(int(int.from_bytes(a, 'big') < int.from_bytes(b, 'big')))
+        elif op == "assert":
+            if not stack.pop():
+                return {"method": None, "cost": cost}
+        elif op == "bnz":
+            if stack.pop():
+                pc = labels[args[0]]
+        elif op == "bz":
+            if not stack.pop():
+                pc = labels[args[0]]
+        elif op == "b":
+            pc = labels[args[0]]
+        elif op == "return":
+            result = stack.pop()
+            return {"method": result - MARKER_BASE if result >= MARKER_BASE else None, "cost": cost - MARKER_COST}
+        elif op == "err":
+            return {"method": None, "cost": cost}
+        else:
+            raise ValueError(f"Unsupported opcode in router: {line}")
+
+    raise ValueError("Router fell through without returning")
+
+
+def compare_routers() -> Dict:
+    """Per-method dispatch cost for every contract in both modes"""
+    report = {}
+    for contract, methods in CONTRACT_METHODS.items():
+        programs = {
+            mode: compile_router(methods, mode, HOT_METHODS[contract])
+            for mode in (DISPATCH_NAMES, DISPATCH_SELECTOR)
+        }
+        rows = []
+        for i, name in enumerate(methods):
+            row = {"method": name}
+            for mode, program in programs.items():
+                result = run_router(program, method_arg(methods, name, mode))
+                assert result["method"] == i, f"{contract}.{name} routed to {result['method']} in {mode} mode"
+                row[mode] = result["cost"]
+            row["saved"] = row[DISPATCH_NAMES] - row[DISPATCH_SELECTOR]
+            rows.append(row)
+        padded = [i.to_bytes(2, 'big') for i in range(len(methods) + 1)]
+        for arg in INVALID_SELECTORS + [len(methods).to_bytes(1, 'big')] + padded:
+            result = run_router(programs[DISPATCH_SELECTOR], arg)
+            assert result["method"] is None, f"{contract} routed selector {arg.hex()} to {result['method']}"
+        report[contract] = rows
+    return report
+
+
+def print_report(report: Dict):
+    """Print the comparison as a table"""
+    print(f"{'contract':<10} {'method':<14} {DISPATCH_NAMES:>6} {DISPATCH_SELECTOR:>9} {'saved':>6}")
+    print("-" * 49)
+    for contract, rows in report.items():
+        for row in rows:
+            print(f"{contract:<10} {row['method']:<14} {row[DISPATCH_NAMES]:>6} "
+                  f"{row[DISPATCH_SELECTOR]:>9} {row['saved']:>6}")
+
+
+if __name__ == "__main__":
+    report = compare_routers()
+    if "--json" in sys.argv:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,199 @@
+"""
+State Keys - GoldChain
+Compact global and local state keys shared by the PyTeal contracts and the
+Python client. Every key byte counts toward state size limits and is
+serialized into every application_info/account_info response, so contracts
+store these short keys and clients map them back to field names.
+
+The AlgoKit contracts use the same keys (smart_contracts/_helpers/state_keys.py),
+so the client decodes both implementations alike.
+
+Usage:
+    python state_keys.py    # response payload size, verbose vs compact keys
+"""
+
+import base64
+import json
+from typing import Dict
+
+# Global state, per contract: field name -> key
+VGOLD_KEYS = {
+    "total_supply": b"ts",
+    "decimals": b"dc",
+    "name": b"nm",
+    "symbol": b"sy",
+    "creator": b"cr",
+    "manager": b"m",
+    "freeze": b"fz",
+    "clawback": b"cb",
+    "reserve": b"rs",
+    "asset_id": b"a",
+    "use_boxes": b"ub",
+}
+TRADING_KEYS = {
+    "vgold_app_id": b"va",
+    "vgold_asset_id": b"vs",
+    "oracle_app_id": b"o",
+    "trading_fee": b"f",
+    "manager": b"m",
+    "treasury": b"t",
+    "total_volume_algo": b"xa",
+    "total_volume_vgold": b"xv",
+    "total_fees_collected": b"fc",
+}
+LENDING_KEYS = {
+    "vgold_app_id": b"va",
+    "vgold_asset_id": b"vs",
+    "oracle_app_id": b"o",
+    "manager": b"m",
+    "treasury": b"t",
+    "min_collateral_ratio": b"cr",
+    "liquidation_threshold": b"lq",
+    "borrow_index": b"bi",
+    "lend_index": b"li",
+    "borrow_rate": b"br",
+    "lend_rate": b"lr",
+    "last_accrual": b"ac",
+    "total_scaled_borrowed": b"sb",
+    "total_scaled_lent": b"sl",
+    "total_collateral": b"tc",
+    "reserves": b"rv",
+}
+ORACLE_KEYS = {
+    "current_price": b"p",
+    "price_update_time": b"pt",
+    "oracle_address": b"o",
+    "manager": b"m",
+    "price_history": b"ph",
+    "min_price": b"mn",
+    "max_price": b"mx",
+    "last_price": b"lp",
+    "price_change_24h": b"c1",
+    "price_change_7d": b"c7",
+    "price_change_30d": b"c30",
+    "price_cumulative": b"pc",
+    "reporter_quorum": b"rq",
+    "max_deviation": b"md",
+    "report_round": b"rr",
+}
+
+# Local state, per contract: field name -> key
+VGOLD_LOCAL_KEYS = {
+    "balance": b"b",
+}
+TRADING_LOCAL_KEYS = {
+    "algo_balance": b"ab",
+    "vgold_balance": b"vb",
+    "price": b"p",
+}
+LENDING_LOCAL_KEYS = {
+    "lend": b"l",
+    "borrow": b"b",
+}
+ORACLE_LOCAL_KEYS = {
+    "old_price": b"op",
+    "price": b"p",
+    "timestamp": b"ts",
+    "history_count": b"hc",
+    "change_percentage": b"cp",
+    "is_valid": b"v",
+}
+
+GLOBAL_KEYS = {
+    "vgold": VGOLD_KEYS,
+    "trading": TRADING_KEYS,
+    "lending": LENDING_KEYS,
+    "oracle": ORACLE_KEYS,
+}
+LOCAL_KEYS = {
+    "vgold": VGOLD_LOCAL_KEYS,
+    "trading": TRADING_LOCAL_KEYS,
+    "lending": LENDING_LOCAL_KEYS,
+    "oracle": ORACLE_LOCAL_KEYS,
+}
+
+# Key -> field name, for decoding
+GLOBAL_NAMES = {contract: {key: name for name, key in keys.items()} for contract, keys in GLOBAL_KEYS.items()}
+LOCAL_NAMES = {contract: {key: name for name, key in keys.items()} for contract, keys in LOCAL_KEYS.items()}
+
+
+def decode_state(items: list, names: Dict[bytes, str]) -> Dict[str, object]:
+    """algod key-value items by field name, uints as int and byte slices as bytes.
+    Keys missing from the map keep their raw text."""
+    state = {}
+    for item in items:
+        key = base64.b64decode(item['key'])
+        value = item['value']
+        state[names.get(key, key.decode(errors="replace"))] = (
+            base64.b64decode(value['bytes']) if value['type'] == 1 else value['uint']
+        )
+    return state
+
+
+def decode_delta(delta: Dict[bytes, dict], names: Dict[bytes, str]) -> Dict[str, object]:
+    """A block's msgpack state delta by field name: the new uint or byte slice, None once deleted"""
+    values = {}
+    for key, change in delta.items():
+        action = change.get("at")
+        values[names.get(key, key.decode(errors="replace"))] = (
+            change.get("bs", b"") if action == 1 else change.get("ui", 0) if action == 2 else None
+        )
+    return values
+
+
+def _state_items(fields: Dict[bytes, object]) -> list:
+    """algod key-value items for raw keys and values"""
+    return [
+        {
+            "key": base64.b64encode(key).decode(),
+            "value": {"type": 1, "bytes": base64.b64encode(value).decode(), "uint": 0} if isinstance(value, bytes)
+            else {"type": 2, "bytes": "", "uint": value},
+        }
+        for key, value in fields.items()
+    ]
+
+
+def payload_sizes(contract: str, values: Dict[str, object], local: bool = False) -> Dict[str, int]:
+    """JSON bytes of a state response with verbose (field name) and compact keys"""
+    keys = (LOCAL_KEYS if local else GLOBAL_KEYS)[contract]
+    verbose = _state_items({name.encode(): value for name, value in values.items()})
+    compact = _state_items({keys[name]: value for name, value in values.items()})
+    return {"verbose": len(json.dumps(verbose)), "compact": len(json.dumps(compact))}
+
+
+if __name__ == "__main__":
+    # A dashboard refresh: all four apps' global state, plus a user's balance and positions
+    address = bytes(32)
+    dashboard = [
+        ("vgold", False, {
+            "total_supply": 10 ** 15, "decimals": 6, "name": b"Virtual Gold", "symbol": b"vGOLD",
+            "creator": address, "manager": address, "freeze": address, "clawback": address, "reserve": address,
+        }),
+        ("trading", False, {
+            "vgold_app_id": 1001, "oracle_app_id": 1002, "trading_fee": 25, "manager": address, "treasury": address,
+            "total_volume_algo": 10 ** 12, "total_volume_vgold": 10 ** 13, "total_fees_collected": 10 ** 9,
+        }),
+        ("lending", False, {
+            "vgold_app_id": 1001, "oracle_app_id": 1002, "manager": address, "treasury": address,
+            "min_collateral_ratio": 150, "liquidation_threshold": 120, "borrow_index": 10 ** 9,
+            "lend_index": 10 ** 9, "borrow_rate": 600, "lend_rate": 400, "last_accrual": 1_700_000_000,
+            "total_scaled_borrowed": 10 ** 12, "total_scaled_lent": 10 ** 12, "reserves": 10 ** 6,
+        }),
+        ("oracle", False, {
+            "current_price": 50_000, "price_update_time": 1_700_000_000, "oracle_address": address,
+            "manager": address, "price_history": 1000,
+        }),
+        ("vgold", True, {"balance": 10 ** 9}),
+        ("lending", True, {"lend": bytes(40), "borrow": bytes(48)}),
+    ]
+
+    total = {"verbose": 0, "compact": 0}
+    print(f"{'state':<16} {'verbose':>8} {'compact':>8} {'saved':>7}")
+    for contract, local, values in dashboard:
+        sizes = payload_sizes(contract, values, local)
+        total = {kind: total[kind] + sizes[kind] for kind in total}
+        label = f"{contract} {'local' if local else 'global'}"
+        print(f"{label:<16} {sizes['verbose']:>8} {sizes['compact']:>8} "
+              f"{1 - sizes['compact'] / sizes['verbose']:>7.1%}")
+    print(f"{'dashboard':<16} {total['verbose']:>8} {total['compact']:>8} "
+          f"{1 - total['compact'] / total['verbose']:>7.1%}")
@@ -4,70 +4,109 @@ Handles buy/sell operations for vGold tokens with ALGO.
 """
 
 from pyteal import *
+from algo_payment import receive_algo, received_algo
+from oracle_twap import load_oracle_cumulative, twap
+from router import DISPATCH_NAMES, HOT_METHODS, TRADING_METHODS, VGOLD_METHODS, method_arg, route_noop
+from state_keys import ORACLE_KEYS, TRADING_KEYS, TRADING_LOCAL_KEYS
+from vgold_asset import VGOLD_ASSET_ID, opt_in_vgold, receive_vgold, send_vgold
+from vgold_token import BALANCES_ASA, BALANCES_LOCAL
 
-def trading_contract():
+# Price in microALGO per whole vGold (6 decimals) and the trading fee in basis points
+VGOLD_UNIT = 1_000_000
+DEFAULT_PRICE = 50_000  # 0.05 ALGO per vGold
+DEFAULT_TRADING_FEE = 25  # 0.25%
+FEE_DENOMINATOR = 10_000
+MAX_TRADING_FEE = 1_000  # 10%
+
+# Trades price off the oracle app's current_price, refused once it is older than this
+MAX_PRICE_AGE = 3600  # seconds
+
+def trading_contract(dispatch: str = DISPATCH_NAMES, balances: str = BALANCES_LOCAL):
     """Main trading contract logic"""
+    # In ASA mode vGold moves as asset transfers instead of calls to the token app
+    use_asa = balances == BALANCES_ASA
     
     # Global state keys
-    VGOLD_APP_ID = Bytes("vgold_app_id")
-    PRICE_ORACLE = Bytes("price_oracle")
-    TRADING_FEE = Bytes("trading_fee")
-    MANAGER = Bytes("manager")
-    TREASURY = Bytes("treasury")
+    VGOLD_APP_ID = Bytes(TRADING_KEYS["vgold_app_id"])
+    ORACLE_APP_ID = Bytes(TRADING_KEYS["oracle_app_id"])
+    TRADING_FEE = Bytes(TRADING_KEYS["trading_fee"])
+    MANAGER = Bytes(TRADING_KEYS["manager"])
+    TREASURY = Bytes(TRADING_KEYS["treasury"])
     
     # Local state keys
-    ALGO_BALANCE = Bytes("algo_balance")
-    VGOLD_BALANCE = Bytes("vgold_balance")
+    ALGO_BALANCE = Bytes(TRADING_LOCAL_KEYS["algo_balance"])
+    VGOLD_BALANCE = Bytes(TRADING_LOCAL_KEYS["vgold_balance"])
     
     # Application creation
     def on_creation():
         return Seq([
             # Set global state
-            App.globalPut(VGOLD_APP_ID, Btoi(Txn.application_args[0])),
-            App.globalPut(PRICE_ORACLE, Txn.application_args[1]),
-            App.globalPut(TRADING_FEE, Int(25)),  # 0.25% fee (25 basis points)
+            App.globalPut(VGOLD_ASSET_ID if use_asa else VGOLD_APP_ID, Btoi(Txn.application_args[0])),
+            App.globalPut(ORACLE_APP_ID, Btoi(Txn.application_args[1])),
+            App.globalPut(TRADING_FEE, Int(DEFAULT_TRADING_FEE)),  # 0.25% fee (25 basis points)
             App.globalPut(MANAGER, Txn.sender()),
             App.globalPut(TREASURY, Txn.sender()),
             
             Approve()
         ])
     
+    # Oracle price of one vGold in microALGO, the oracle app must be Txn.applications[1]
+    oracle_price = ScratchVar(TealType.uint64)
+    
+    def load_oracle_price():
+        price = App.globalGetEx(Txn.applications[1], Bytes(ORACLE_KEYS["current_price"]))
+        update_time = App.globalGetEx(Txn.applications[1], Bytes(ORACLE_KEYS["price_update_time"]))
+        return Seq([
+            Assert(Txn.applications[1] == App.globalGet(ORACLE_APP_ID)),
+            price,
+            update_time,
+            Assert(price.hasValue()),
+            Assert(price.value() > Int(0)),
+            
+            # Refuse stale prices
+            Assert(update_time.hasValue()),
+            Assert(Global.latest_timestamp() <= update_time.value() + Int(MAX_PRICE_AGE)),
+            oracle_price.store(price.value()),
+        ])
+    
     # Buy vGold with ALGO
     def buy_vgold():
+        price_per_vgold = oracle_price.load()
+
+        # Calculate vGold amount to receive for the grouped payment
+        algo_amount = received_algo()
+        vgold_amount = algo_amount * Int(VGOLD_UNIT) / price_per_vgold  # Convert to vGold (6 decimals)
+
+        # Calculate trading fee
+        fee_amount = vgold_amount * App.globalGet(TRADING_FEE) / Int(FEE_DENOMINATOR)
+        net_vgold = vgold_amount - fee_amount
+
+        if use_asa:
+            # Pay out of the contract's vGold inventory
+            deliver_vgold = send_vgold(Txn.sender(), net_vgold)
+        else:
+            # Mint vGold tokens to buyer
+            deliver_vgold = Seq([
+                InnerTxnBuilder.Begin(),
+                InnerTxnBuilder.SetFields({
+                    TxnField.type_enum: TxnType.ApplicationCall,
+                    TxnField.application_id: App.globalGet(VGOLD_APP_ID),
+                    TxnField.application_args: [Bytes(method_arg(VGOLD_METHODS, "mint", dispatch)), Itob(net_vgold)],
+                    TxnField.sender: Global.current_application_address(),
+                    TxnField.accounts: [Txn.sender()],
+                }),
+                InnerTxnBuilder.Submit(),
+            ])
+
         return Seq([
             # Get current price from oracle
-            # For now, use a fixed price (0.05 ALGO per vGold)
-            # In production, this would call the price oracle contract
-            price_per_vgold = Int(50000),  # 0.05 ALGO in microALGO
+            load_oracle_price(),
             
-            # Calculate vGold amount to receive
-            algo_amount = Txn.amount(),
-            vgold_amount = algo_amount * Int(1000000) / price_per_vgold,  # Convert to vGold (6 decimals)
+            # Buyer pays ALGO to the contract in the preceding group transaction
+            receive_algo(),
             
-            # Calculate trading fee
-            fee_amount = vgold_amount * App.globalGet(TRADING_FEE) / Int(10000),
-            net_vgold = vgold_amount - fee_amount,
-            
-            # Transfer ALGO to contract
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields({
-                TxnField.type_enum: TxnType.Payment,
-                TxnField.receiver: Global.current_application_address(),
-                TxnField.amount: algo_amount,
-                TxnField.sender: Txn.sender(),
-            }),
-            InnerTxnBuilder.Submit(),
-            
-            # Mint vGold tokens to buyer
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields({
-                TxnField.type_enum: TxnType.ApplicationCall,
-                TxnField.application_id: App.globalGet(VGOLD_APP_ID),
-                TxnField.application_args: [Bytes("mint"), Itob(net_vgold)],
-                TxnField.sender: Global.current_application_address(),
-                TxnField.accounts: [Txn.sender()],
-            }),
-            InnerTxnBuilder.Submit(),
+            # Deliver vGold to buyer
+            deliver_vgold,
             
             # Update local state
             App.localPut(Int(0), ALGO_BALANCE, 
@@ -78,30 +117,41 @@ def trading_contract():
     
     # Sell vGold for ALGO
     def sell_vgold():
+        price_per_vgold = oracle_price.load()
+
+        # Calculate ALGO amount to receive
+        vgold_amount = Btoi(Txn.application_args[1])
+        algo_amount = vgold_amount * price_per_vgold / Int(VGOLD_UNIT)  # Convert to microALGO
+
+        # Calculate trading fee
+        fee_amount = algo_amount * App.globalGet(TRADING_FEE) / Int(FEE_DENOMINATOR)
+        net_algo = algo_amount - fee_amount
+
+        if use_asa:
+            # Seller deposits vGold with a grouped asset transfer, kept as inventory
+            collect_vgold = receive_vgold(vgold_amount)
+        else:
+            # Burn vGold tokens from seller
+            collect_vgold = Seq([
+                InnerTxnBuilder.Begin(),
+                InnerTxnBuilder.SetFields({
+                    TxnField.type_enum: TxnType.ApplicationCall,
+                    TxnField.application_id: App.globalGet(VGOLD_APP_ID),
+                    TxnField.application_args: [Bytes(method_arg(VGOLD_METHODS, "burn", dispatch)), Itob(vgold_amount)],
+                    TxnField.sender: Txn.sender(),
+                }),
+                InnerTxnBuilder.Submit(),
+            ])
+
         return Seq([
             # Get current price from oracle
-            price_per_vgold = Int(50000),  # 0.05 ALGO in microALGO
-            
-            # Calculate ALGO amount to receive
-            vgold_amount = Btoi(Txn.application_args[1]),
-            algo_amount = vgold_amount * price_per_vgold / Int(1000000),  # Convert to microALGO
-            
-            # Calculate trading fee
-            fee_amount = algo_amount * App.globalGet(TRADING_FEE) / Int(10000),
-            net_algo = algo_amount - fee_amount,
+            load_oracle_price(),
             
             # Check if contract has sufficient ALGO
             Assert(Balance(Global.current_application_address()) >= net_algo),
             
-            # Burn vGold tokens from seller
-            InnerTxnBuilder.Begin(),
-            InnerTxnBuilder.SetFields({
-                TxnField.type_enum: TxnType.ApplicationCall,
-                TxnField.application_id: App.globalGet(VGOLD_APP_ID),
-                TxnField.application_args: [Bytes("burn"), Itob(vgold_amount)],
-                TxnField.sender: Txn.sender(),
-            }),
-            InnerTxnBuilder.Submit(),
+            # Take vGold from seller
+            collect_vgold,
             
             # Transfer ALGO to seller
             InnerTxnBuilder.Begin(),
@@ -126,8 +176,8 @@ def trading_contract():
             # Check if caller is manager
             Assert(Txn.sender() == App.globalGet(MANAGER)),
             
-            # Update oracle address
-            App.globalPut(PRICE_ORACLE, Txn.application_args[1]),
+            # Update oracle app ID
+            App.globalPut(ORACLE_APP_ID, Btoi(Txn.application_args[1])),
             
             Approve()
         ])
@@ -137,6 +187,7 @@ def trading_contract():
         return Seq([
             # Check if caller is manager
             Assert(Txn.sender() == App.globalGet(MANAGER)),
+            Assert(Btoi(Txn.application_args[1]) <= Int(MAX_TRADING_FEE)),
             
             # Update trading fee (in basis points)
             App.globalPut(TRADING_FEE, Btoi(Txn.application_args[1])),
@@ -166,8 +217,29 @@ def trading_contract():
     # Get current price
     def get_price():
         return Seq([
-            # Return current price (in microALGO per vGold)
-            App.localPut(Int(0), Bytes("price"), Int(50000)),
+            # Return current oracle price (in microALGO per vGold)
+            load_oracle_price(),
+            App.localPut(Int(0), Bytes(TRADING_LOCAL_KEYS["price"]), oracle_price.load()),
+            Approve()
+        ])
+    
+    # Average oracle price since an earlier oracle "cumulative" read, passed as
+    # application_args 1 and 2 (cumulative price, timestamp); the oracle app is Txn.applications[1]
+    oracle_twap = ScratchVar(TealType.uint64)
+    
+    def load_oracle_twap():
+        return Seq([
+            Assert(Txn.applications[1] == App.globalGet(ORACLE_APP_ID)),
+            load_oracle_cumulative(Txn.applications[1], oracle_twap),
+            oracle_twap.store(twap(
+                Btoi(Txn.application_args[1]), Btoi(Txn.application_args[2]), oracle_twap.load()
+            )),
+        ])
+    
+    def get_twap():
+        return Seq([
+            load_oracle_twap(),
+            Log(Itob(oracle_twap.load())),
             Approve()
         ])
     
@@ -176,21 +248,22 @@ def trading_contract():
         return Cond(
             [Txn.application_id() == Int(0), on_creation()],
             [Txn.on_completion() == OnComplete.NoOp, 
-             Cond(
-                [Txn.application_args[0] == Bytes("buy"), buy_vgold()],
-                [Txn.application_args[0] == Bytes("sell"), sell_vgold()],
-                [Txn.application_args[0] == Bytes("update_oracle"), update_oracle()],
-                [Txn.application_args[0] == Bytes("update_fee"), update_fee()],
-                [Txn.application_args[0] == Bytes("withdraw"), withdraw_algo()],
-                [Txn.application_args[0] == Bytes("price"), get_price()],
-                [Int(1), Reject()]
-             )],
+             route_noop(TRADING_METHODS, {
+                 "buy": buy_vgold(),
+                 "sell": sell_vgold(),
+                 "update_oracle": update_oracle(),
+                 "update_fee": update_fee(),
+                 "withdraw": withdraw_algo(),
+                 "price": get_price(),
+                 "opt_in_asset": opt_in_vgold(App.globalGet(MANAGER)) if use_asa else Reject(),
+                 "twap": get_twap(),
+             }, dispatch, HOT_METHODS["trading"])],
             [Txn.on_completion() == OnComplete.OptIn, Approve()],
             [Txn.on_completion() == OnComplete.CloseOut, Approve()],
             [Txn.on_completion() == OnComplete.UpdateApplication, 
-             Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()],
+             Seq([Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()])],
             [Txn.on_completion() == OnComplete.DeleteApplication, 
-             Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()],
+             Seq([Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()])],
             [Int(1), Reject()]
         )
     
@@ -198,5 +271,5 @@ def trading_contract():
 
 if __name__ == "__main__":
     # Compile the contract
-    compiled = compileTeal(trading_contract(), Mode.Application, version=6)
+    compiled = compileTeal(trading_contract(), Mode.Application, version=8)
     print(compiled)
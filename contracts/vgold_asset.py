@@ -0,0 +1,48 @@
+"""
+vGold Asset Helpers - Algorand Smart Contract Helpers
+Moves vGold as a native ASA in the trading and lending contracts.
+"""
+
+from pyteal import *
+from state_keys import TRADING_KEYS
+
+# Global state key holding the vGold ASA id in ASA mode, the same in trading and lending
+VGOLD_ASSET_ID = Bytes(TRADING_KEYS["vgold_asset_id"])
+
+
+def send_vgold(receiver: Expr, amount: Expr) -> Expr:
+    """Inner asset transfer of vGold from the application account"""
+    return Seq([
+        InnerTxnBuilder.Begin(),
+        InnerTxnBuilder.SetFields({
+            TxnField.type_enum: TxnType.AssetTransfer,
+            TxnField.xfer_asset: App.globalGet(VGOLD_ASSET_ID),
+            TxnField.asset_receiver: receiver,
+            TxnField.asset_amount: amount,
+            TxnField.fee: Int(0),  # Covered by the outer call
+        }),
+        InnerTxnBuilder.Submit(),
+    ])
+
+
+def receive_vgold(amount: Expr) -> Expr:
+    """Check the preceding group transaction moves at least amount vGold from the caller to the app"""
+    deposit = Gtxn[Txn.group_index() - Int(1)]
+    return Seq([
+        Assert(Txn.group_index() > Int(0)),
+        Assert(deposit.type_enum() == TxnType.AssetTransfer),
+        Assert(deposit.xfer_asset() == App.globalGet(VGOLD_ASSET_ID)),
+        Assert(deposit.sender() == Txn.sender()),
+        Assert(deposit.asset_receiver() == Global.current_application_address()),
+        Assert(deposit.asset_close_to() == Global.zero_address()),
+        Assert(deposit.asset_amount() >= amount),
+    ])
+
+
+def opt_in_vgold(manager: Expr) -> Expr:
+    """Opt the application account into the vGold ASA (manager only)"""
+    return Seq([
+        Assert(Txn.sender() == manager),
+        send_vgold(Global.current_application_address(), Int(0)),
+        Approve()
+    ])
@@ -4,29 +4,98 @@ A fungible token representing virtual gold with standard token operations.
 """
 
 from pyteal import *
+from algo_payment import receive_algo, received_algo
+from router import DISPATCH_NAMES, HOT_METHODS, VGOLD_METHODS, route_noop
+from state_keys import VGOLD_KEYS, VGOLD_LOCAL_KEYS
 
-def vgold_token():
+# Balance storage modes
+BALANCES_LOCAL = "local"  # per-account local state, holders must opt in
+BALANCES_BOX = "box"      # one box per holder keyed by the raw 32-byte address
+BALANCES_ASA = "asa"      # a native ASA with the app account as reserve and clawback
+
+# Minimum balance of one holder box (32-byte address name, 8-byte balance) in microALGO,
+# paid by the caller whose call creates it
+BALANCE_BOX_MBR = 2500 + 400 * (32 + 8)
+
+def vgold_token(dispatch: str = DISPATCH_NAMES, balances: str = BALANCES_LOCAL):
     """Main vGold token contract logic"""
+    if balances not in (BALANCES_LOCAL, BALANCES_BOX, BALANCES_ASA):
+        raise ValueError(f"Unknown balance storage mode: {balances}")
     
     # Global state keys
-    TOTAL_SUPPLY = Bytes("total_supply")
-    DECIMALS = Bytes("decimals")
-    NAME = Bytes("name")
-    SYMBOL = Bytes("symbol")
-    CREATOR = Bytes("creator")
-    FREEZE = Bytes("freeze")
-    CLAWBACK = Bytes("clawback")
-    MANAGER = Bytes("manager")
-    RESERVE = Bytes("reserve")
+    TOTAL_SUPPLY = Bytes(VGOLD_KEYS["total_supply"])
+    DECIMALS = Bytes(VGOLD_KEYS["decimals"])
+    NAME = Bytes(VGOLD_KEYS["name"])
+    SYMBOL = Bytes(VGOLD_KEYS["symbol"])
+    CREATOR = Bytes(VGOLD_KEYS["creator"])
+    FREEZE = Bytes(VGOLD_KEYS["freeze"])
+    CLAWBACK = Bytes(VGOLD_KEYS["clawback"])
+    MANAGER = Bytes(VGOLD_KEYS["manager"])
+    RESERVE = Bytes(VGOLD_KEYS["reserve"])
+    ASSET_ID = Bytes(VGOLD_KEYS["asset_id"])
     
     # Local state keys for user balances
-    BALANCE = Bytes("balance")
+    BALANCE = Bytes(VGOLD_LOCAL_KEYS["balance"])
+    
+    # Holder boxes created by the current call (box mode)
+    new_boxes = ScratchVar(TealType.uint64)
+    
+    # Read a holder's balance, given its accounts index and address
+    def read_balance(index, address):
+        if balances == BALANCES_BOX:
+            box = App.box_get(address)
+            return Seq([box, If(box.hasValue(), Btoi(box.value()), Int(0))])
+        return App.localGet(index, BALANCE)
+    
+    # Write a holder's balance, given its accounts index and address
+    def write_balance(index, address, amount):
+        if balances == BALANCES_BOX:
+            box = App.box_length(address)
+            return Seq([
+                box,
+                If(Not(box.hasValue()), new_boxes.store(new_boxes.load() + Int(1))),
+                App.box_put(address, Itob(amount)),
+            ])
+        return App.localPut(index, BALANCE, amount)
+    
+    def reset_new_boxes():
+        if balances == BALANCES_BOX:
+            return new_boxes.store(Int(0))
+        return Seq([])
+    
+    # Box mode: an amount that would create an empty box is rejected
+    def require_amount(amount):
+        if balances == BALANCES_BOX:
+            return Assert(amount > Int(0))
+        return Seq([])
+    
+    # Box mode: the caller pays the minimum balance of every box the call created in the
+    # payment grouped immediately before it, so the app account's funds can't be drained
+    def pay_for_new_boxes():
+        if balances != BALANCES_BOX:
+            return Seq([])
+        return If(new_boxes.load() > Int(0), Seq([
+            receive_algo(),
+            Assert(received_algo() >= new_boxes.load() * Int(BALANCE_BOX_MBR)),
+        ]))
+    
+    SENDER = (Int(0), Txn.sender())
+    RECEIVER = (Int(1), Txn.accounts[1])
     
     # Application creation
     def on_creation():
+        # The app account can't fund a box or an asset before it exists, so in box
+        # and ASA mode the manager mints the initial supply once the app is funded
+        if balances != BALANCES_LOCAL:
+            initial_supply = Int(0)
+            initial_balance = Seq([])
+        else:
+            initial_supply = Int(1000000000)  # 1B vGold tokens
+            initial_balance = App.localPut(Int(0), BALANCE, initial_supply)
+        
         return Seq([
             # Set global state
-            App.globalPut(TOTAL_SUPPLY, Int(1000000000)),  # 1B vGold tokens
+            App.globalPut(TOTAL_SUPPLY, initial_supply),
             App.globalPut(DECIMALS, Int(6)),  # 6 decimals
             App.globalPut(NAME, Bytes("Virtual Gold")),
             App.globalPut(SYMBOL, Bytes("vGOLD")),
@@ -37,7 +106,7 @@ def vgold_token():
             App.globalPut(RESERVE, Txn.sender()),
             
             # Initialize creator balance
-            App.localPut(Int(0), BALANCE, Int(1000000000)),
+            initial_balance,
             
             Approve()
         ])
@@ -45,17 +114,58 @@ def vgold_token():
     # Transfer tokens between accounts
     def transfer():
         return Seq([
+            reset_new_boxes(),
+            require_amount(Btoi(Txn.application_args[1])),
+            
             # Check if sender has sufficient balance
-            Assert(App.localGet(Int(0), BALANCE) >= Btoi(Txn.application_args[1])),
+            Assert(read_balance(*SENDER) >= Btoi(Txn.application_args[1])),
             
             # Deduct from sender
-            App.localPut(Int(0), BALANCE, 
-                        App.localGet(Int(0), BALANCE) - Btoi(Txn.application_args[1])),
+            write_balance(*SENDER, 
+                          read_balance(*SENDER) - Btoi(Txn.application_args[1])),
             
             # Add to receiver
-            App.localPut(Int(1), BALANCE, 
-                        App.localGet(Int(1), BALANCE) + Btoi(Txn.application_args[1])),
+            write_balance(*RECEIVER, 
+                          read_balance(*RECEIVER) + Btoi(Txn.application_args[1])),
+            
+            pay_for_new_boxes(),
+            Approve()
+        ])
+    
+    # Transfer tokens to several accounts, debiting the sender once
+    # Recipients are Txn.accounts[1..n], amounts are application_args[1..n]
+    def batch_transfer():
+        i = ScratchVar(TealType.uint64)
+        total = ScratchVar(TealType.uint64)
+        recipients = Txn.accounts.length()
+        
+        return Seq([
+            # One amount per recipient
+            Assert(recipients > Int(0)),
+            Assert(Txn.application_args.length() == recipients + Int(1)),
+            
+            # Sum the batch for a single balance check
+            reset_new_boxes(),
+            total.store(Int(0)),
+            For(i.store(Int(1)), i.load() <= recipients, i.store(i.load() + Int(1))).Do(
+                Seq([
+                    require_amount(Btoi(Txn.application_args[i.load()])),
+                    total.store(total.load() + Btoi(Txn.application_args[i.load()])),
+                ])
+            ),
+            Assert(read_balance(*SENDER) >= total.load()),
+            
+            # Deduct from sender
+            write_balance(*SENDER, 
+                          read_balance(*SENDER) - total.load()),
             
+            # Add to each receiver
+            For(i.store(Int(1)), i.load() <= recipients, i.store(i.load() + Int(1))).Do(
+                write_balance(i.load(), Txn.accounts[i.load()], 
+                              read_balance(i.load(), Txn.accounts[i.load()]) + Btoi(Txn.application_args[i.load()]))
+            ),
+            
+            pay_for_new_boxes(),
             Approve()
         ])
     
@@ -64,60 +174,183 @@ def vgold_token():
         return Seq([
             # Check if caller is manager
             Assert(Txn.sender() == App.globalGet(MANAGER)),
+            reset_new_boxes(),
+            require_amount(Btoi(Txn.application_args[1])),
             
             # Update total supply
             App.globalPut(TOTAL_SUPPLY, 
                          App.globalGet(TOTAL_SUPPLY) + Btoi(Txn.application_args[1])),
             
             # Add to recipient
-            App.localPut(Int(1), BALANCE, 
-                        App.localGet(Int(1), BALANCE) + Btoi(Txn.application_args[1])),
+            write_balance(*RECEIVER, 
+                          read_balance(*RECEIVER) + Btoi(Txn.application_args[1])),
             
+            pay_for_new_boxes(),
             Approve()
         ])
     
     # Burn tokens
     def burn():
         return Seq([
+            reset_new_boxes(),
+            require_amount(Btoi(Txn.application_args[1])),
+            
             # Check if sender has sufficient balance
-            Assert(App.localGet(Int(0), BALANCE) >= Btoi(Txn.application_args[1])),
+            Assert(read_balance(*SENDER) >= Btoi(Txn.application_args[1])),
             
             # Deduct from sender
-            App.localPut(Int(0), BALANCE, 
-                        App.localGet(Int(0), BALANCE) - Btoi(Txn.application_args[1])),
+            write_balance(*SENDER, 
+                          read_balance(*SENDER) - Btoi(Txn.application_args[1])),
             
             # Update total supply
             App.globalPut(TOTAL_SUPPLY, 
                          App.globalGet(TOTAL_SUPPLY) - Btoi(Txn.application_args[1])),
             
+            pay_for_new_boxes(),
             Approve()
         ])
     
     # Get balance of an account
     def get_balance():
+        if balances == BALANCES_BOX:
+            # Box mode has no local state to copy into, so log the balance
+            return Seq([
+                Log(Itob(read_balance(*RECEIVER))),
+                Approve()
+            ])
         return Seq([
             App.localPut(Int(0), BALANCE, App.localGet(Int(1), BALANCE)),
             Approve()
         ])
     
+    # Move local state balances of Txn.accounts[1..n] into their boxes (box mode only)
+    # Callable by anyone, so a keeper can migrate holders after an update to box mode
+    def migrate():
+        if balances != BALANCES_BOX:
+            return Reject()
+        
+        i = ScratchVar(TealType.uint64)
+        return Seq([
+            Assert(Txn.accounts.length() > Int(0)),
+            reset_new_boxes(),
+            For(i.store(Int(1)), i.load() <= Txn.accounts.length(), i.store(i.load() + Int(1))).Do(
+                Seq([
+                    require_amount(App.localGet(i.load(), BALANCE)),
+                    write_balance(i.load(), Txn.accounts[i.load()], 
+                                  read_balance(i.load(), Txn.accounts[i.load()]) 
+                                  + App.localGet(i.load(), BALANCE)),
+                    # Clear the local entry so the balance can't be migrated twice
+                    App.localDel(i.load(), BALANCE),
+                ])
+            ),
+            pay_for_new_boxes(),
+            Approve()
+        ])
+    
+    # Create the vGold ASA with the whole supply in the app account (ASA mode, manager only)
+    def create_asset():
+        return Seq([
+            Assert(Txn.sender() == App.globalGet(MANAGER)),
+            Assert(App.globalGet(ASSET_ID) == Int(0)),
+            
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.AssetConfig,
+                TxnField.config_asset_total: Int(1000000000),  # 1B vGold tokens
+                TxnField.config_asset_decimals: App.globalGet(DECIMALS),
+                TxnField.config_asset_name: App.globalGet(NAME),
+                TxnField.config_asset_unit_name: App.globalGet(SYMBOL),
+                TxnField.config_asset_manager: Global.current_application_address(),
+                TxnField.config_asset_reserve: Global.current_application_address(),
+                TxnField.config_asset_clawback: Global.current_application_address(),
+                TxnField.fee: Int(0),  # Covered by the outer call
+            }),
+            InnerTxnBuilder.Submit(),
+            
+            App.globalPut(ASSET_ID, InnerTxn.created_asset_id()),
+            App.globalPut(RESERVE, Global.current_application_address()),
+            App.globalPut(CLAWBACK, Global.current_application_address()),
+            Log(Itob(InnerTxn.created_asset_id())),
+            Approve()
+        ])
+    
+    # Move vGold out of or back into the reserve (ASA mode)
+    def reserve_transfer(sender, receiver, amount):
+        return Seq([
+            InnerTxnBuilder.Begin(),
+            InnerTxnBuilder.SetFields({
+                TxnField.type_enum: TxnType.AssetTransfer,
+                TxnField.xfer_asset: App.globalGet(ASSET_ID),
+                TxnField.asset_sender: sender,  # Clawback when not the app itself
+                TxnField.asset_receiver: receiver,
+                TxnField.asset_amount: amount,
+                TxnField.fee: Int(0),  # Covered by the outer call
+            }),
+            InnerTxnBuilder.Submit(),
+        ])
+    
+    # Mint from the reserve to an account (ASA mode, manager only)
+    def asa_mint():
+        amount = Btoi(Txn.application_args[1])
+        return Seq([
+            Assert(Txn.sender() == App.globalGet(MANAGER)),
+            reserve_transfer(Global.current_application_address(), Txn.accounts[1], amount),
+            App.globalPut(TOTAL_SUPPLY, App.globalGet(TOTAL_SUPPLY) + amount),
+            Approve()
+        ])
+    
+    # Claw the sender's tokens back into the reserve (ASA mode)
+    def asa_burn():
+        amount = Btoi(Txn.application_args[1])
+        return Seq([
+            reserve_transfer(Txn.sender(), Global.current_application_address(), amount),
+            App.globalPut(TOTAL_SUPPLY, App.globalGet(TOTAL_SUPPLY) - amount),
+            Approve()
+        ])
+    
+    # Log the ASA holding of an account (ASA mode)
+    def asa_balance():
+        holding = AssetHolding.balance(Txn.accounts[1], App.globalGet(ASSET_ID))
+        return Seq([
+            holding,
+            Log(Itob(holding.value())),
+            Approve()
+        ])
+    
+    # ASA holders move tokens with plain asset transfers, so transfers through the app are rejected
+    def handlers():
+        if balances == BALANCES_ASA:
+            return {
+                "transfer": Reject(),
+                "mint": asa_mint(),
+                "burn": asa_burn(),
+                "balance": asa_balance(),
+                "batch_transfer": Reject(),
+                "migrate": Reject(),
+                "create_asset": create_asset(),
+            }
+        return {
+            "transfer": transfer(),
+            "mint": mint(),
+            "burn": burn(),
+            "balance": get_balance(),
+            "batch_transfer": batch_transfer(),
+            "migrate": migrate(),
+            "create_asset": Reject(),
+        }
+    
     # Main router
     def main():
         return Cond(
             [Txn.application_id() == Int(0), on_creation()],
             [Txn.on_completion() == OnComplete.NoOp, 
-             Cond(
-                [Txn.application_args[0] == Bytes("transfer"), transfer()],
-                [Txn.application_args[0] == Bytes("mint"), mint()],
-                [Txn.application_args[0] == Bytes("burn"), burn()],
-                [Txn.application_args[0] == Bytes("balance"), get_balance()],
-                [Int(1), Reject()]
-             )],
+             route_noop(VGOLD_METHODS, handlers(), dispatch, HOT_METHODS["vgold"])],
             [Txn.on_completion() == OnComplete.OptIn, Approve()],
             [Txn.on_completion() == OnComplete.CloseOut, Approve()],
             [Txn.on_completion() == OnComplete.UpdateApplication, 
-             Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()],
+             Seq([Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()])],
             [Txn.on_completion() == OnComplete.DeleteApplication, 
-             Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()],
+             Seq([Assert(Txn.sender() == App.globalGet(MANAGER)), Approve()])],
             [Int(1), Reject()]
         )
     
@@ -125,5 +358,5 @@ def vgold_token():
 
 if __name__ == "__main__":
     # Compile the contract
-    compiled = compileTeal(vgold_token(), Mode.Application, version=6)
+    compiled = compileTeal(vgold_token(), Mode.Application, version=8)
     print(compiled)
@@ -0,0 +1,211 @@
+"""
+In-process benchmark for the GoldChain smart contracts.
+Runs the contracts' ABI methods under the algopy testing emulator against
+thousands of synthetic accounts, so no LocalNet is needed.
+
+Usage:
+    poetry run python benchmark_contracts.py [--accounts 5000] [--batch-size 4] [--box-balances] [--json]
+"""
+
+import argparse
+import dataclasses
+import json
+import time
+from collections.abc import Callable, Sequence
+
+from algopy import Account, UInt64, arc4, gtxn
+from algopy_testing import AlgopyTestContext, algopy_testing_context
+
+from smart_contracts.lending_contract.contract import LendingContract
+from smart_contracts.price_oracle.contract import PriceOracle
+from smart_contracts.trading_contract.contract import TradingContract
+from smart_contracts.vgold_token.contract import BALANCE_BOX_MBR, TransferItem, VGoldToken
+
+# A call is the sender plus the contract method invocation
+Call = tuple[Account, Callable[[], object]]
+
+
+@dataclasses.dataclass
+class BenchmarkResult:
+    contract: str
+    operation: str
+    ops: int
+    seconds: float
+
+    @property
+    def ops_per_second(self) -> float:
+        return self.ops / self.seconds if self.seconds else 0.0
+
+
+def run_calls(
+    context: AlgopyTestContext,
+    contract: str,
+    operation: str,
+    calls: Sequence[Call],
+    ops: int | None = None,
+    grouped: bool = False,
+) -> BenchmarkResult:
+    """Run each call in its own transaction group and time the whole batch.
+    Grouped calls build their own group, see box_funded."""
+    start = time.perf_counter()
+    for sender, call in calls:
+        if grouped:
+            call()
+            continue
+        with context.txn.create_group(active_txn_overrides={"sender": sender}):
+            call()
+    elapsed = time.perf_counter() - start
+
+    # Drop recorded groups so long runs don't accumulate history
+    context.clear_transaction_context()
+    return BenchmarkResult(contract, operation, ops or len(calls), elapsed)
+
+
+def payment(context: AlgopyTestContext, sender: Account, contract: object, amount: int) -> gtxn.PaymentTransaction:
+    """Grouped payment from sender to a contract's app account"""
+    receiver = context.ledger.get_app(contract).address
+    return context.any.txn.payment(sender=sender, receiver=receiver, amount=UInt64(amount))
+
+
+def box_funded(context: AlgopyTestContext, sender: Account, contract: object, method: Callable[..., object],
+               *args: object) -> Callable[[], object]:
+    """A call grouped after the payment for the one holder box it creates"""
+    def call() -> object:
+        deferred = context.txn.defer_app_call(method, *args)
+        with context.txn.create_group([payment(context, sender, contract, BALANCE_BOX_MBR), deferred]):
+            return deferred.submit()
+    return call
+
+
+def bench_vgold(
+    context: AlgopyTestContext, accounts: list[Account], batch_size: int, box_balances: bool = False
+) -> list[BenchmarkResult]:
+    """Transfer from the creator to every account, then burn and re-mint"""
+    token = VGoldToken()
+    creator = context.default_sender
+    amount = UInt64(1_000_000)
+    half = UInt64(500_000)
+    label = "vgold-box" if box_balances else "vgold"
+
+    # Box mode starts from the creator's migrated local balance, and each first transfer to
+    # an account pays for its box
+    if box_balances:
+        token.enable_box_balances()
+        box_funded(context, creator, token, token.migrate_balance, creator)()
+        transfers = [(creator, box_funded(context, creator, token, token.transfer, amount, to)) for to in accounts]
+    else:
+        transfers = [(creator, lambda to=to: token.transfer(amount, to)) for to in accounts]
+
+    # Batch transfers count one op per recipient
+    batches = [
+        arc4.DynamicArray(*[TransferItem(arc4.Address(to), arc4.UInt64(amount)) for to in accounts[i:i + batch_size]])
+        for i in range(0, len(accounts), batch_size)
+    ]
+
+    return [
+        run_calls(context, label, "transfer", transfers, grouped=box_balances),
+        run_calls(context, label, "batch_transfer", [
+            (creator, lambda batch=batch: token.batch_transfer(batch)) for batch in batches
+        ], ops=len(accounts)),
+        run_calls(context, label, "burn", [
+            (holder, lambda: token.burn(half)) for holder in accounts
+        ]),
+        run_calls(context, label, "mint", [
+            (creator, lambda to=to: token.mint(half, to)) for to in accounts
+        ]),
+    ]
+
+
+def bench_trading(context: AlgopyTestContext, accounts: list[Account]) -> list[BenchmarkResult]:
+    """Every account buys and then sells, priced by a price oracle"""
+    trading = TradingContract()
+    trading.oracle_app.value = context.ledger.get_app(PriceOracle())
+
+    return [
+        run_calls(context, "trading", "buy_vgold", [
+            (buyer, lambda buyer=buyer: trading.buy_vgold(payment(context, buyer, trading, 1_000_000)))
+            for buyer in accounts
+        ]),
+        run_calls(context, "trading", "sell_vgold", [
+            (seller, lambda: trading.sell_vgold(UInt64(10_000_000))) for seller in accounts
+        ]),
+    ]
+
+
+def bench_lending(context: AlgopyTestContext, accounts: list[Account]) -> list[BenchmarkResult]:
+    """Every account lends, borrows against collateral and repays"""
+    lending = LendingContract()
+    amount = UInt64(1_000_000)
+    collateral = 1_500_000
+
+    return [
+        run_calls(context, "lending", "lend_vgold", [
+            (lender, lambda: lending.lend_vgold(amount, UInt64(30))) for lender in accounts
+        ]),
+        run_calls(context, "lending", "borrow_vgold", [
+            (borrower, lambda borrower=borrower: lending.borrow_vgold(
+                amount, UInt64(30), payment(context, borrower, lending, collateral)
+            ))
+            for borrower in accounts
+        ]),
+        run_calls(context, "lending", "repay_loan", [
+            (borrower, lambda: lending.repay_loan(UInt64(0))) for borrower in accounts
+        ]),
+    ]
+
+
+def bench_oracle(context: AlgopyTestContext, updates: int) -> list[BenchmarkResult]:
+    """Oracle price ticks within the default bounds, rising and falling"""
+    oracle = PriceOracle()
+    reporter = context.default_sender
+
+    # A sawtooth between 60_000 and 50_000, falling for 20 ticks then rising for 20
+    prices = [50_000 * (100 + abs(i % 40 - 20)) // 100 for i in range(updates)]
+    return [
+        run_calls(context, "oracle", "update_price", [
+            (reporter, lambda price=price: oracle.update_price(UInt64(price))) for price in prices
+        ]),
+    ]
+
+
+def run_benchmarks(account_count: int, batch_size: int, box_balances: bool = False) -> list[BenchmarkResult]:
+    """Run every contract benchmark in a fresh emulator context"""
+    with algopy_testing_context() as context:
+        accounts = [context.any.account() for _ in range(account_count)]
+        return [
+            *bench_vgold(context, accounts, batch_size, box_balances),
+            *bench_trading(context, accounts),
+            *bench_lending(context, accounts),
+            *bench_oracle(context, account_count),
+        ]
+
+
+def print_results(results: list[BenchmarkResult]) -> None:
+    """Print results as a table"""
+    print(f"{'contract':<10} {'operation':<14} {'ops':>8} {'seconds':>9} {'ops/s':>10}")
+    print("-" * 55)
+    for result in results:
+        print(
+            f"{result.contract:<10} {result.operation:<14} {result.ops:>8} "
+            f"{result.seconds:>9.3f} {result.ops_per_second:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark GoldChain contracts under the algopy emulator")
+    parser.add_argument("--accounts", type=int, default=5_000, help="Number of synthetic accounts")
+    parser.add_argument(
+        "--batch-size", type=int, default=4, help="Recipients per batch_transfer call (4 foreign accounts per app call)"
+    )
+    parser.add_argument("--box-balances", action="store_true", help="Keep vGold balances in boxes")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.accounts, args.batch_size, args.box_balances)
+    if args.json:
+        print(json.dumps(
+            [{**dataclasses.asdict(r), "ops_per_second": r.ops_per_second} for r in results],
+            indent=2,
+        ))
+    else:
+        print_results(results)
@@ -53,7 +53,7 @@ def deploy_all_contracts():
         print("3️⃣ Deploying Trading Contract...")
         trading_client = deploy_trading_contract(
             vgold_app_id=deployed_contracts['vgold']['app_id'],
-            oracle_address=deployed_contracts['oracle']['address']
+            oracle_app_id=deployed_contracts['oracle']['app_id']
         )
         deployed_contracts['trading'] = {
             'app_id': trading_client.app_id,
@@ -65,7 +65,8 @@ def deploy_all_contracts():
         # 4. Deploy Lending Contract
         print("4️⃣ Deploying Lending Contract...")
         lending_client = deploy_lending_contract(
-            vgold_app_id=deployed_contracts['vgold']['app_id']
+            vgold_app_id=deployed_contracts['vgold']['app_id'],
+            oracle_app_id=deployed_contracts['oracle']['app_id']
         )
         deployed_contracts['lending'] = {
             'app_id': lending_client.app_id,
@@ -0,0 +1,15 @@
+"""
+ALGO Payment Helpers - AlgoKit Implementation
+Takes ALGO into the trading and lending contracts from a grouped payment.
+"""
+
+from algopy import Global, Txn, UInt64, gtxn, subroutine
+
+
+@subroutine
+def receive_algo(payment: gtxn.PaymentTransaction) -> UInt64:
+    """Check a grouped payment moves ALGO from the caller to the app, returns its amount"""
+    assert payment.sender == Txn.sender, "Payment not from caller"
+    assert payment.receiver == Global.current_application_address, "Payment not to contract"
+    assert payment.close_remainder_to == Global.zero_address, "Payment closes out"
+    return payment.amount
@@ -0,0 +1,32 @@
+"""
+Oracle TWAP Helpers - AlgoKit Implementation
+Time-weighted average prices from the price oracle's cumulative price.
+"""
+
+from algopy import Application, Global, UInt64, op, subroutine
+
+from smart_contracts._helpers.state_keys import CURRENT_PRICE_KEY, PRICE_CUMULATIVE_KEY, PRICE_UPDATE_TIME_KEY
+
+
+@subroutine
+def cumulative_price(cumulative: UInt64, price: UInt64, update_time: UInt64) -> UInt64:
+    """Cumulative price (microALGO-seconds) carried from the last update to now"""
+    return cumulative + price * (Global.latest_timestamp - update_time)
+
+
+@subroutine
+def oracle_cumulative(oracle: Application) -> UInt64:
+    """The oracle app's cumulative price as of now"""
+    cumulative, _exists = op.AppGlobal.get_ex_uint64(oracle, PRICE_CUMULATIVE_KEY)
+    price, exists = op.AppGlobal.get_ex_uint64(oracle, CURRENT_PRICE_KEY)
+    assert exists, "No oracle price"
+    update_time, exists = op.AppGlobal.get_ex_uint64(oracle, PRICE_UPDATE_TIME_KEY)
+    assert exists, "No oracle update time"
+    return cumulative_price(cumulative, price, update_time)
+
+
+@subroutine
+def oracle_twap(oracle: Application, start_cumulative: UInt64, start_time: UInt64) -> UInt64:
+    """Average oracle price from an earlier observation (cumulative, timestamp) to now"""
+    assert start_time < Global.latest_timestamp, "Empty TWAP window"
+    return (oracle_cumulative(oracle) - start_cumulative) // (Global.latest_timestamp - start_time)
@@ -0,0 +1,60 @@
+"""
+State Keys - AlgoKit Implementation
+Compact global and local state keys, the same bytes as contracts/state_keys.py
+so one client decodes both implementations.
+"""
+
+# Shared by the trading and lending contracts
+VGOLD_APP_ID_KEY = b"va"
+VGOLD_ASSET_ID_KEY = b"vs"
+ORACLE_APP_ID_KEY = b"o"
+MANAGER_KEY = b"m"
+TREASURY_KEY = b"t"
+
+# vGold token
+TOTAL_SUPPLY_KEY = b"ts"
+DECIMALS_KEY = b"dc"
+NAME_KEY = b"nm"
+SYMBOL_KEY = b"sy"
+CREATOR_KEY = b"cr"
+FREEZE_KEY = b"fz"
+CLAWBACK_KEY = b"cb"
+RESERVE_KEY = b"rs"
+ASSET_ID_KEY = b"a"
+USE_BOXES_KEY = b"ub"
+BALANCE_LOCAL_KEY = b"b"
+
+# Trading
+TRADING_FEE_KEY = b"f"
+TOTAL_VOLUME_ALGO_KEY = b"xa"
+TOTAL_VOLUME_VGOLD_KEY = b"xv"
+TOTAL_FEES_COLLECTED_KEY = b"fc"
+
+# Lending
+MIN_COLLATERAL_RATIO_KEY = b"cr"
+LIQUIDATION_THRESHOLD_KEY = b"lq"
+BORROW_INDEX_KEY = b"bi"
+LEND_INDEX_KEY = b"li"
+BORROW_RATE_KEY = b"br"
+LEND_RATE_KEY = b"lr"
+LAST_ACCRUAL_KEY = b"ac"
+TOTAL_SCALED_BORROWED_KEY = b"sb"
+TOTAL_SCALED_LENT_KEY = b"sl"
+TOTAL_COLLATERAL_KEY = b"tc"
+RESERVES_KEY = b"rv"
+
+# Price oracle
+CURRENT_PRICE_KEY = b"p"
+PRICE_UPDATE_TIME_KEY = b"pt"
+ORACLE_ADDRESS_KEY = b"o"
+PRICE_HISTORY_KEY = b"ph"
+MIN_PRICE_KEY = b"mn"
+MAX_PRICE_KEY = b"mx"
+LAST_PRICE_KEY = b"lp"
+PRICE_CHANGE_24H_KEY = b"c1"
+PRICE_CHANGE_7D_KEY = b"c7"
+PRICE_CHANGE_30D_KEY = b"c30"
+PRICE_CUMULATIVE_KEY = b"pc"
+REPORTER_QUORUM_KEY = b"rq"
+MAX_DEVIATION_KEY = b"md"
+REPORT_ROUND_KEY = b"rr"
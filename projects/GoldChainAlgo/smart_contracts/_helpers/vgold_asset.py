@@ -0,0 +1,29 @@
+"""
+vGold Asset Helpers - AlgoKit Implementation
+Moves vGold as a native ASA in the trading and lending contracts.
+"""
+
+from algopy import Account, Asset, Global, Txn, UInt64, gtxn, itxn, subroutine
+
+
+@subroutine
+def send_vgold(asset: Asset, receiver: Account, amount: UInt64) -> None:
+    """Inner asset transfer of vGold from the application account"""
+    itxn.AssetTransfer(
+        xfer_asset=asset,
+        asset_receiver=receiver,
+        asset_amount=amount,
+        fee=0,  # Covered by the outer call
+    ).submit()
+
+
+@subroutine
+def receive_vgold(asset: Asset, amount: UInt64) -> None:
+    """Check the preceding group transaction moves at least amount vGold from the caller to the app"""
+    assert Txn.group_index > 0, "Missing vGold deposit"
+    deposit = gtxn.AssetTransferTransaction(Txn.group_index - 1)
+    assert deposit.xfer_asset == asset, "Wrong asset"
+    assert deposit.sender == Txn.sender, "Deposit not from caller"
+    assert deposit.asset_receiver == Global.current_application_address, "Deposit not to contract"
+    assert deposit.asset_close_to == Global.zero_address, "Deposit closes out"
+    assert deposit.asset_amount >= amount, "Deposit too small"
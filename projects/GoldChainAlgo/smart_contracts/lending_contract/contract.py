@@ -3,252 +3,386 @@ Lending Contract - AlgoKit Implementation
 Handles lending and borrowing operations with collateral management.
 """
 
-from algopy import ARC4Contract, UInt64, Account, Txn, Global, arc4
+from algopy import (
+    ARC4Contract, UInt64, Account, Application, Asset, BoxMap, GlobalState, Txn, Global, OpUpFeeSource,
+    arc4, ensure_budget, gtxn, op, subroutine, urange,
+)
 from algopy.arc4 import abimethod
 
+from smart_contracts._helpers.algo_payment import receive_algo
+from smart_contracts._helpers.oracle_twap import oracle_twap
+from smart_contracts._helpers.state_keys import (
+    BORROW_INDEX_KEY, BORROW_RATE_KEY, CURRENT_PRICE_KEY, LAST_ACCRUAL_KEY, LEND_INDEX_KEY, LEND_RATE_KEY,
+    LIQUIDATION_THRESHOLD_KEY, MANAGER_KEY, MIN_COLLATERAL_RATIO_KEY, ORACLE_APP_ID_KEY, RESERVES_KEY,
+    TOTAL_COLLATERAL_KEY, TOTAL_SCALED_BORROWED_KEY, TOTAL_SCALED_LENT_KEY, TREASURY_KEY, VGOLD_APP_ID_KEY,
+    VGOLD_ASSET_ID_KEY,
+)
+from smart_contracts._helpers.vgold_asset import receive_vgold, send_vgold
+
+# Interest indexes: a position owes (or earns) amount * current index / index at open
+INDEX_SCALE = 1_000_000_000  # index value of 1.0
+SECONDS_PER_YEAR = 365 * 86400
+
+# Liquidation: oracle prices are microALGO per whole vGold (6 decimals)
+VGOLD_UNIT = 1_000_000
+LIQUIDATION_DISCOUNT = 5000
+LIQUIDATION_ITEM_BUDGET = 150  # opcode budget liquidate_batch asks for per position
+
+
+class PositionKey(arc4.Struct):
+    """Owner and per-owner id of a position"""
+    owner: arc4.Address
+    position_id: arc4.UInt64
+
+
+class LendPosition(arc4.Struct):
+    """Lending position of an account"""
+    amount: arc4.UInt64
+    start_time: arc4.UInt64
+    duration: arc4.UInt64
+    index: arc4.UInt64  # lend index when opened
+    status: arc4.UInt64
+
+
+class BorrowPosition(arc4.Struct):
+    """Borrowing position of an account"""
+    amount: arc4.UInt64
+    collateral: arc4.UInt64
+    start_time: arc4.UInt64
+    duration: arc4.UInt64
+    index: arc4.UInt64  # borrow index when opened
+    status: arc4.UInt64
+
 
 class LendingContract(ARC4Contract):
     """Lending Contract - Handles vGold lending and borrowing with ALGO collateral"""
     
     def __init__(self) -> None:
         # Contract configuration
-        self.vgold_app_id = UInt64(0)  # Will be set during deployment
-        self.manager = Txn.sender
-        self.treasury = Txn.sender
-        self.min_collateral_ratio = UInt64(150)  # 150% collateral ratio
-        self.liquidation_threshold = UInt64(120)  # 120% liquidation threshold
-        
-        # Lending pools
-        self.total_lent = UInt64(0)
-        self.total_borrowed = UInt64(0)
-        self.total_collateral = UInt64(0)
-        
-        # Interest rates (in basis points)
-        self.lend_rates = {
-            UInt64(30): UInt64(400),   # 4% APY for 30 days
-            UInt64(60): UInt64(550),  # 5.5% APY for 60 days
-            UInt64(90): UInt64(700),  # 7% APY for 90 days
-            UInt64(180): UInt64(1000) # 10% APY for 180 days
-        }
-        
-        self.borrow_rates = {
-            UInt64(30): UInt64(600),   # 6% APY for 30 days
-            UInt64(60): UInt64(750),  # 7.5% APY for 60 days
-            UInt64(90): UInt64(900),  # 9% APY for 90 days
-            UInt64(180): UInt64(1200) # 12% APY for 180 days
-        }
+        self.vgold_app_id = GlobalState(UInt64(0), key=VGOLD_APP_ID_KEY)  # Will be set during deployment
+        self.vgold_asset = GlobalState(Asset(), key=VGOLD_ASSET_ID_KEY)  # Set when vGold is a native ASA
+        self.oracle_app = GlobalState(Application(), key=ORACLE_APP_ID_KEY)  # Price oracle liquidations check against
+        self.manager = GlobalState(Txn.sender, key=MANAGER_KEY)
+        self.treasury = GlobalState(Txn.sender, key=TREASURY_KEY)
+        self.min_collateral_ratio = GlobalState(UInt64(150), key=MIN_COLLATERAL_RATIO_KEY)  # 150% collateral ratio
+        self.liquidation_threshold = GlobalState(UInt64(120), key=LIQUIDATION_THRESHOLD_KEY)  # 120% liquidation threshold
+        
+        # Lending pools, lent and borrowed balances are scaled by their index
+        self.total_scaled_lent = GlobalState(UInt64(0), key=TOTAL_SCALED_LENT_KEY)
+        self.total_scaled_borrowed = GlobalState(UInt64(0), key=TOTAL_SCALED_BORROWED_KEY)
+        self.total_collateral = GlobalState(UInt64(0), key=TOTAL_COLLATERAL_KEY)
+        
+        # Interest indexes and their annual rates in basis points
+        self.borrow_index = GlobalState(UInt64(INDEX_SCALE), key=BORROW_INDEX_KEY)
+        self.lend_index = GlobalState(UInt64(INDEX_SCALE), key=LEND_INDEX_KEY)
+        self.borrow_rate = GlobalState(UInt64(600), key=BORROW_RATE_KEY)  # 6% APR
+        self.lend_rate = GlobalState(UInt64(400), key=LEND_RATE_KEY)    # 4% APR
+        self.last_accrual = GlobalState(Global.latest_timestamp, key=LAST_ACCRUAL_KEY)
+        self.reserves = GlobalState(UInt64(0), key=RESERVES_KEY)
+        
+        # Positions, any number per account, keyed by (owner, position id)
+        self.lend_position = BoxMap(PositionKey, LendPosition, key_prefix=b"l")
+        self.borrow_position = BoxMap(PositionKey, BorrowPosition, key_prefix=b"b")
+        
+        # Next lend and borrow position id per account, ids are never reused
+        self.lend_count = BoxMap(Account, UInt64, key_prefix=b"nl")
+        self.borrow_count = BoxMap(Account, UInt64, key_prefix=b"nb")
     
     @abimethod
     def initialize(self, vgold_app_id: UInt64) -> None:
         """Initialize contract with vGold app ID"""
-        assert Txn.sender == self.manager, "Only manager can initialize"
-        self.vgold_app_id = vgold_app_id
+        assert Txn.sender == self.manager.value, "Only manager can initialize"
+        self.vgold_app_id.value = vgold_app_id
+    
+    @abimethod
+    def set_vgold_asset(self, asset: Asset) -> None:
+        """Lend vGold as a native ASA and opt the contract in (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can set the vGold asset"
+        self.vgold_asset.value = asset
+        send_vgold(asset, Global.current_application_address, UInt64(0))
+    
+    @abimethod
+    def set_oracle_app(self, oracle_app: Application) -> None:
+        """Set the price oracle app liquidations check against (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can set the oracle"
+        self.oracle_app.value = oracle_app
     
     @abimethod
     def lend_vgold(self, amount: UInt64, duration_days: UInt64) -> UInt64:
-        """Lend vGold tokens and earn interest"""
-        # Get interest rate for duration
-        interest_rate = self._get_lend_rate(duration_days)
-        
-        # Calculate interest amount
-        interest_amount = self._calculate_interest(amount, interest_rate, duration_days)
-        total_returns = amount + interest_amount
+        """Lend vGold tokens and earn interest, returns the new position id"""
+        self._accrue()
         
         # Update lending pool
-        self.total_lent += amount
+        self.total_scaled_lent.value += _mul_div(amount, UInt64(INDEX_SCALE), self.lend_index.value)
         
         # Store lending position
-        self.lend_position[Txn.sender] = {
-            'amount': amount,
-            'start_time': Global.latest_timestamp,
-            'duration': duration_days * UInt64(86400),  # Convert days to seconds
-            'interest_rate': interest_rate,
-            'status': UInt64(1)  # Active
-        }
+        position_id = self.lend_count.get(Txn.sender, default=UInt64(0))
+        self.lend_count[Txn.sender] = position_id + 1
+        self.lend_position[PositionKey(arc4.Address(Txn.sender), arc4.UInt64(position_id))] = LendPosition(
+            amount=arc4.UInt64(amount),
+            start_time=arc4.UInt64(Global.latest_timestamp),
+            duration=arc4.UInt64(duration_days * UInt64(86400)),  # Lock period, converted to seconds
+            index=arc4.UInt64(self.lend_index.value),
+            status=arc4.UInt64(1),  # Active
+        )
         
-        # In a real implementation, transfer vGold from lender to contract
+        # Lender deposits vGold with a grouped asset transfer in ASA mode
+        if self.vgold_asset.value.id != 0:
+            receive_vgold(self.vgold_asset.value, amount)
         
-        return total_returns
+        return position_id
     
     @abimethod
-    def borrow_vgold(self, amount: UInt64, duration_days: UInt64, collateral_algo: UInt64) -> UInt64:
-        """Borrow vGold with ALGO collateral"""
-        # Get interest rate for duration
-        interest_rate = self._get_borrow_rate(duration_days)
+    def borrow_vgold(self, amount: UInt64, duration_days: UInt64, collateral: gtxn.PaymentTransaction) -> UInt64:
+        """Borrow vGold with ALGO collateral paid by a grouped payment, returns the new position id"""
+        self._accrue()
+        collateral_algo = receive_algo(collateral)
         
         # Calculate required collateral (150% of borrowed amount value)
-        required_collateral = (amount * self.min_collateral_ratio) // UInt64(100)
+        required_collateral = (amount * self.min_collateral_ratio.value) // UInt64(100)
         
         # Check if provided collateral is sufficient
         assert collateral_algo >= required_collateral, "Insufficient collateral"
         
-        # Calculate interest amount
-        interest_amount = self._calculate_interest(amount, interest_rate, duration_days)
-        total_repay = amount + interest_amount
-        
         # Update borrowing pool
-        self.total_borrowed += amount
-        self.total_collateral += collateral_algo
+        self.total_scaled_borrowed.value += _mul_div(amount, UInt64(INDEX_SCALE), self.borrow_index.value)
+        self.total_collateral.value += collateral_algo
         
         # Store borrowing position
-        self.borrow_position[Txn.sender] = {
-            'amount': amount,
-            'collateral': collateral_algo,
-            'start_time': Global.latest_timestamp,
-            'duration': duration_days * UInt64(86400),
-            'interest_rate': interest_rate,
-            'status': UInt64(1)  # Active
-        }
+        position_id = self.borrow_count.get(Txn.sender, default=UInt64(0))
+        self.borrow_count[Txn.sender] = position_id + 1
+        self.borrow_position[PositionKey(arc4.Address(Txn.sender), arc4.UInt64(position_id))] = BorrowPosition(
+            amount=arc4.UInt64(amount),
+            collateral=arc4.UInt64(collateral_algo),
+            start_time=arc4.UInt64(Global.latest_timestamp),
+            duration=arc4.UInt64(duration_days * UInt64(86400)),
+            index=arc4.UInt64(self.borrow_index.value),
+            status=arc4.UInt64(1),  # Active
+        )
         
-        # In a real implementation:
-        # 1. Transfer ALGO collateral to contract
-        # 2. Mint vGold tokens to borrower
+        # Lend out of the pool in ASA mode
+        if self.vgold_asset.value.id != 0:
+            send_vgold(self.vgold_asset.value, Txn.sender, amount)
         
-        return total_repay
+        # In a real implementation, mint vGold tokens to borrower (app mode)
+        
+        return position_id
     
     @abimethod
-    def repay_loan(self) -> UInt64:
+    def repay_loan(self, position_id: UInt64) -> UInt64:
         """Repay loan and get collateral back"""
         # Get borrowing position
-        position = self.borrow_position[Txn.sender]
-        assert position['status'] == UInt64(1), "No active loan"
-        
-        # Calculate repayment amount with interest
-        time_elapsed = Global.latest_timestamp - position['start_time']
-        max_duration = position['duration']
-        actual_duration = min(time_elapsed, max_duration)
-        
-        interest_amount = self._calculate_interest(
-            position['amount'], 
-            position['interest_rate'], 
-            actual_duration // UInt64(86400)  # Convert back to days
-        )
+        key = PositionKey(arc4.Address(Txn.sender), arc4.UInt64(position_id))
+        position = self.borrow_position[key].copy()
+        assert position.status.native == UInt64(1), "No active loan"
         
-        total_repay = position['amount'] + interest_amount
+        # Principal plus interest accrued through the borrow index
+        self._accrue()
+        total_repay = _mul_div(position.amount.native, self.borrow_index.value, position.index.native)
         
         # Update position status
-        self.borrow_position[Txn.sender]['status'] = UInt64(0)  # Repaid
+        position.status = arc4.UInt64(0)  # Repaid
+        self.borrow_position[key] = position.copy()
         
         # Update pools
-        self.total_borrowed -= position['amount']
-        self.total_collateral -= position['collateral']
+        self.total_scaled_borrowed.value -= _mul_div(position.amount.native, UInt64(INDEX_SCALE), position.index.native)
+        self.total_collateral.value -= position.collateral.native
+        
+        # Borrower repays with a grouped asset transfer in ASA mode
+        if self.vgold_asset.value.id != 0:
+            receive_vgold(self.vgold_asset.value, total_repay)
         
         # In a real implementation:
-        # 1. Burn vGold tokens from borrower
+        # 1. Burn vGold tokens from borrower (app mode)
         # 2. Return ALGO collateral to borrower
         
-        return position['collateral']  # Returned collateral amount
+        return position.collateral.native  # Returned collateral amount
     
     @abimethod
-    def claim_lending_returns(self) -> UInt64:
+    def claim_lending_returns(self, position_id: UInt64) -> UInt64:
         """Claim lending returns after period ends"""
         # Get lending position
-        position = self.lend_position[Txn.sender]
-        assert position['status'] == UInt64(1), "No active lending position"
+        key = PositionKey(arc4.Address(Txn.sender), arc4.UInt64(position_id))
+        position = self.lend_position[key].copy()
+        assert position.status.native == UInt64(1), "No active lending position"
         
         # Check if lending period has ended
-        time_elapsed = Global.latest_timestamp - position['start_time']
-        assert time_elapsed >= position['duration'], "Lending period not ended"
-        
-        # Calculate total returns
-        interest_amount = self._calculate_interest(
-            position['amount'],
-            position['interest_rate'],
-            position['duration'] // UInt64(86400)
-        )
+        time_elapsed = Global.latest_timestamp - position.start_time.native
+        assert time_elapsed >= position.duration.native, "Lending period not ended"
         
-        total_returns = position['amount'] + interest_amount
+        # Principal plus interest accrued through the lend index
+        self._accrue()
+        total_returns = _mul_div(position.amount.native, self.lend_index.value, position.index.native)
         
         # Update position status
-        self.lend_position[Txn.sender]['status'] = UInt64(0)  # Completed
+        position.status = arc4.UInt64(0)  # Completed
+        self.lend_position[key] = position.copy()
         
         # Update pools
-        self.total_lent -= position['amount']
+        self.total_scaled_lent.value -= _mul_div(position.amount.native, UInt64(INDEX_SCALE), position.index.native)
         
-        # In a real implementation, transfer vGold back to lender
+        # Pay the lender out of the pool in ASA mode
+        if self.vgold_asset.value.id != 0:
+            send_vgold(self.vgold_asset.value, Txn.sender, total_returns)
         
         return total_returns
     
     @abimethod
-    def liquidate_position(self, borrower: Account) -> UInt64:
-        """Liquidate undercollateralized position"""
-        position = self.borrow_position[borrower]
-        assert position['status'] == UInt64(1), "No active loan to liquidate"
-        
-        # Check if position is undercollateralized
-        # This is simplified - in production, you'd check current price vs collateral
-        liquidation_discount = UInt64(5000)  # 5% discount
-        liquidator_amount = (position['collateral'] * (UInt64(10000) - liquidation_discount)) // UInt64(10000)
+    def liquidate_position(self, borrower: Account, position_id: UInt64) -> UInt64:
+        """Liquidate an undercollateralized position, returns the liquidator's collateral"""
+        self._accrue()
+        key = PositionKey(arc4.Address(borrower), arc4.UInt64(position_id))
+        liquidator_amount = self._liquidate(key, self._oracle_price())
+        assert liquidator_amount > 0, "Position not liquidatable"
         
-        # Update position status
-        self.borrow_position[borrower]['status'] = UInt64(2)  # Liquidated
+        # In a real implementation, transfer collateral to liquidator
         
-        # Update pools
-        self.total_borrowed -= position['amount']
-        self.total_collateral -= position['collateral']
+        return liquidator_amount
+    
+    @abimethod
+    def liquidate_batch(self, positions: arc4.DynamicArray[PositionKey]) -> tuple[UInt64, UInt64]:
+        """Liquidate every undercollateralized position in the list, skipping healthy or closed ones.
+        Returns the number liquidated and the liquidator's total collateral."""
+        # Pool budget with inner app calls paid from the group's fee credit if the batch needs it
+        ensure_budget(positions.length * UInt64(LIQUIDATION_ITEM_BUDGET), OpUpFeeSource.GroupCredit)
+        
+        self._accrue()
+        price = self._oracle_price()
+        count = UInt64(0)
+        payout = UInt64(0)
+        for i in urange(positions.length):
+            liquidator_amount = self._liquidate(positions[i].copy(), price)
+            if liquidator_amount > 0:
+                count += 1
+                payout += liquidator_amount
         
         # In a real implementation, transfer collateral to liquidator
         
-        return liquidator_amount
+        return count, payout
     
     @abimethod
-    def get_position_info(self, account: Account, position_type: arc4.String) -> tuple[UInt64, UInt64, UInt64, UInt64, UInt64]:
+    def get_position_info(
+        self, account: Account, position_type: arc4.String, position_id: UInt64
+    ) -> tuple[UInt64, UInt64, UInt64, UInt64, UInt64]:
         """Get position information"""
+        key = PositionKey(arc4.Address(account), arc4.UInt64(position_id))
         if position_type == arc4.String("lend"):
-            position = self.lend_position[account]
+            lend = self.lend_position[key].copy()
             return (
-                position['amount'],
-                position['start_time'],
-                position['duration'],
-                position['interest_rate'],
-                position['status']
+                lend.amount.native,
+                lend.start_time.native,
+                lend.duration.native,
+                lend.index.native,
+                lend.status.native
             )
         else:  # borrow
-            position = self.borrow_position[account]
+            borrow = self.borrow_position[key].copy()
             return (
-                position['amount'],
-                position['collateral'],
-                position['start_time'],
-                position['duration'],
-                position['status']
+                borrow.amount.native,
+                borrow.collateral.native,
+                borrow.start_time.native,
+                borrow.duration.native,
+                borrow.status.native
             )
     
     @abimethod
-    def get_pool_stats(self) -> tuple[UInt64, UInt64, UInt64]:
-        """Get lending pool statistics"""
-        return (self.total_lent, self.total_borrowed, self.total_collateral)
+    def get_position_count(self, account: Account, position_type: arc4.String) -> UInt64:
+        """Number of lend or borrow positions an account has opened, ids run from 0"""
+        if position_type == arc4.String("lend"):
+            return self.lend_count.get(account, default=UInt64(0))
+        return self.borrow_count.get(account, default=UInt64(0))
+    
+    @abimethod(readonly=True)
+    def get_pool_stats(self) -> tuple[UInt64, UInt64, UInt64, UInt64]:
+        """Get lent, borrowed (both with interest to now), collateral and reserves"""
+        borrow_index, lend_index, reserves = self._current_indexes()
+        return (
+            _mul_div(self.total_scaled_lent.value, lend_index, UInt64(INDEX_SCALE)),
+            _mul_div(self.total_scaled_borrowed.value, borrow_index, UInt64(INDEX_SCALE)),
+            self.total_collateral.value,
+            reserves,
+        )
+    
+    @abimethod
+    def set_rates(self, borrow_rate: UInt64, lend_rate: UInt64) -> None:
+        """Set the borrow and lend rates in basis points (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can set rates"
+        assert lend_rate <= borrow_rate, "Lend rate above borrow rate"
+        
+        # Interest up to now accrues at the old rates
+        self._accrue()
+        self.borrow_rate.value = borrow_rate
+        self.lend_rate.value = lend_rate
     
     @abimethod
     def set_collateral_ratio(self, new_ratio: UInt64) -> None:
         """Set minimum collateral ratio (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can set collateral ratio"
+        assert Txn.sender == self.manager.value, "Only manager can set collateral ratio"
         assert new_ratio >= UInt64(110), "Collateral ratio too low"  # Min 110%
         
-        self.min_collateral_ratio = new_ratio
-    
-    def _get_lend_rate(self, duration_days: UInt64) -> UInt64:
-        """Get lending interest rate for duration"""
-        if duration_days <= UInt64(30):
-            return self.lend_rates[UInt64(30)]
-        elif duration_days <= UInt64(60):
-            return self.lend_rates[UInt64(60)]
-        elif duration_days <= UInt64(90):
-            return self.lend_rates[UInt64(90)]
-        else:
-            return self.lend_rates[UInt64(180)]
-    
-    def _get_borrow_rate(self, duration_days: UInt64) -> UInt64:
-        """Get borrowing interest rate for duration"""
-        if duration_days <= UInt64(30):
-            return self.borrow_rates[UInt64(30)]
-        elif duration_days <= UInt64(60):
-            return self.borrow_rates[UInt64(60)]
-        elif duration_days <= UInt64(90):
-            return self.borrow_rates[UInt64(90)]
-        else:
-            return self.borrow_rates[UInt64(180)]
-    
-    def _calculate_interest(self, principal: UInt64, rate: UInt64, days: UInt64) -> UInt64:
-        """Calculate interest amount"""
-        # Interest = principal * rate * days / (365 * 10000)
-        return (principal * rate * days) // (UInt64(365) * UInt64(10000))
+        self.min_collateral_ratio.value = new_ratio
+    
+    @abimethod
+    def get_twap(self, start_cumulative: UInt64, start_time: UInt64) -> UInt64:
+        """Average oracle price since an earlier oracle get_cumulative_price observation"""
+        return oracle_twap(self.oracle_app.value, start_cumulative, start_time)
+    
+    @subroutine
+    def _oracle_price(self) -> UInt64:
+        """Current vGold price in microALGO from the oracle app"""
+        price, exists = op.AppGlobal.get_ex_uint64(self.oracle_app.value, CURRENT_PRICE_KEY)
+        assert exists and price > 0, "No oracle price"
+        return price
+    
+    @subroutine
+    def _liquidate(self, key: PositionKey, price: UInt64) -> UInt64:
+        """Liquidate an active position whose collateral is below liquidation_threshold of its debt,
+        returns the liquidator's collateral or 0 when the position is healthy, closed or missing"""
+        if key not in self.borrow_position:
+            return UInt64(0)
+        position = self.borrow_position[key].copy()
+        if position.status.native != UInt64(1):
+            return UInt64(0)
+        
+        # Debt with interest, valued in microALGO at the oracle price
+        debt = _mul_div(position.amount.native, self.borrow_index.value, position.index.native)
+        debt_value = _mul_div(debt, price, UInt64(VGOLD_UNIT))
+        if position.collateral.native * 100 >= debt_value * self.liquidation_threshold.value:
+            return UInt64(0)
+        
+        # Update position status
+        position.status = arc4.UInt64(2)  # Liquidated
+        self.borrow_position[key] = position.copy()
+        
+        # Update pools
+        self.total_scaled_borrowed.value -= _mul_div(position.amount.native, UInt64(INDEX_SCALE), position.index.native)
+        self.total_collateral.value -= position.collateral.native
+        
+        return (position.collateral.native * (UInt64(10000) - UInt64(LIQUIDATION_DISCOUNT))) // UInt64(10000)
+    
+    @subroutine
+    def _current_indexes(self) -> tuple[UInt64, UInt64, UInt64]:
+        """Borrow index, lend index and reserves as of now"""
+        elapsed = Global.latest_timestamp - self.last_accrual.value
+        borrow_growth = _mul_div(self.borrow_index.value, self.borrow_rate.value * elapsed, UInt64(SECONDS_PER_YEAR * 10000))
+        lend_growth = _mul_div(self.lend_index.value, self.lend_rate.value * elapsed, UInt64(SECONDS_PER_YEAR * 10000))
+        
+        # The borrow/lend interest spread goes to reserves, which absorb a shortfall down to zero
+        reserves = self.reserves.value + _mul_div(self.total_scaled_borrowed.value, borrow_growth, UInt64(INDEX_SCALE))
+        lend_interest = _mul_div(self.total_scaled_lent.value, lend_growth, UInt64(INDEX_SCALE))
+        reserves = reserves - lend_interest if reserves > lend_interest else UInt64(0)
+        
+        return self.borrow_index.value + borrow_growth, self.lend_index.value + lend_growth, reserves
+    
+    @subroutine
+    def _accrue(self) -> None:
+        """Advance both interest indexes to now"""
+        self.borrow_index.value, self.lend_index.value, self.reserves.value = self._current_indexes()
+        self.last_accrual.value = Global.latest_timestamp
+
+
+@subroutine
+def _mul_div(a: UInt64, b: UInt64, c: UInt64) -> UInt64:
+    """a * b / c with a 128-bit intermediate product"""
+    high, low = op.mulw(a, b)
+    return op.divw(high, low, c)
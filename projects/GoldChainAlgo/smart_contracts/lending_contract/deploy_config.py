@@ -15,7 +15,7 @@ from algopy import Account
 from .contract import LendingContract
 
 
-def deploy_lending_contract(vgold_app_id: int) -> ApplicationClient:
+def deploy_lending_contract(vgold_app_id: int, oracle_app_id: int) -> ApplicationClient:
     """Deploy Lending Contract"""
     
     # Get the default account for deployment
@@ -44,11 +44,18 @@ def deploy_lending_contract(vgold_app_id: int) -> ApplicationClient:
         vgold_app_id=vgold_app_id,
     )
     
+    # Point liquidations at the price oracle
+    app_client.call(
+        LendingContract.set_oracle_app,
+        oracle_app=oracle_app_id,
+    )
+    
     print(f"✅ Lending Contract deployed successfully!")
     print(f"   App ID: {app_client.app_id}")
     print(f"   Address: {app_client.app_address}")
     print(f"   Creator: {account.address}")
     print(f"   vGold App ID: {vgold_app_id}")
+    print(f"   Oracle App ID: {oracle_app_id}")
     
     return app_client
 
@@ -56,4 +63,4 @@ def deploy_lending_contract(vgold_app_id: int) -> ApplicationClient:
 if __name__ == "__main__":
     # This would be called with actual values after vGold is deployed
     print("Lending Contract deployment script")
-    print("Call deploy_lending_contract(vgold_app_id) with actual values")
+    print("Call deploy_lending_contract(vgold_app_id, oracle_app_id) with actual values")
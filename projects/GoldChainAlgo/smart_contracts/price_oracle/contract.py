@@ -3,148 +3,429 @@ Price Oracle Contract - AlgoKit Implementation
 Manages gold price updates and provides price data to other contracts.
 """
 
-from algopy import ARC4Contract, UInt64, Account, Txn, Global, arc4
+import typing
+
+from algopy import (
+    ARC4Contract, UInt64, Account, BigUInt, Box, BoxMap, Bytes, GlobalState, OnCompleteAction, OpUpFeeSource, Txn,
+    Global, arc4, ensure_budget, gtxn, op, subroutine, urange,
+)
 from algopy.arc4 import abimethod
 
+from smart_contracts._helpers.oracle_twap import cumulative_price
+from smart_contracts._helpers.state_keys import (
+    CURRENT_PRICE_KEY, LAST_PRICE_KEY, MANAGER_KEY, MAX_PRICE_KEY, MIN_PRICE_KEY, ORACLE_ADDRESS_KEY,
+    MAX_DEVIATION_KEY, PRICE_CHANGE_24H_KEY, PRICE_CHANGE_7D_KEY, PRICE_CHANGE_30D_KEY, PRICE_CUMULATIVE_KEY,
+    PRICE_HISTORY_KEY, PRICE_UPDATE_TIME_KEY, REPORT_ROUND_KEY, REPORTER_QUORUM_KEY,
+)
+
+# Price history ring buffer: HISTORY_PAGES boxes of HISTORY_PAGE_SIZE points, named
+# b"h" + 8-byte page index. Update n (counting from 0) is slot n % HISTORY_CAPACITY.
+HISTORY_PAGE_SIZE = 32
+HISTORY_PAGES = 32
+HISTORY_CAPACITY = HISTORY_PAGE_SIZE * HISTORY_PAGES
+HISTORY_PAGE_BYTES = HISTORY_PAGE_SIZE * 16
+
+# Price checkpoints: the price in effect at the start of each hour and day, in rings of
+# CHECKPOINT_HOURS then CHECKPOINT_DAYS uint64 slots (period number modulo their count)
+# in one box named b"k". Updates roll them forward to their own hour and day.
+CHECKPOINT_HOURS = 25  # this hour and the 24 before it
+CHECKPOINT_DAYS = 31   # this day and the 30 before it
+CHECKPOINT_BYTES = (CHECKPOINT_HOURS + CHECKPOINT_DAYS) * 8
+HOUR = 3600
+DAY = 86400
+
+# Per-asset price slots: MAX_ASSETS records of (price, update time, min price, max price)
+# uint64s in one box named b"a", set in batches by update_prices. Slot VGOLD_ASSET_SLOT is
+# vGold itself, kept in global state; unregistered slots have a max price of 0.
+MAX_ASSETS = 32
+ASSET_SLOT_BYTES = 32
+VGOLD_ASSET_SLOT = 0
+PRICE_ITEM_BUDGET = 60
+VGOLD_PRICE_BUDGET = 300
+
+# Reporters: up to MAX_REPORTERS addresses, ascending, in one box named b"r". Once the
+# manager registers them, the vGold price is only set by a group of report calls (one per
+# reporter, sorted by price) closed by an aggregate call that sets their median.
+MAX_REPORTERS = 16
+MAX_REPORTS = 15  # a full group less the aggregate call
+REPORTER_BYTES = 32
+
+
+class PricePoint(arc4.Struct):
+    """A recorded price and when it was set"""
+    price: arc4.UInt64
+    timestamp: arc4.UInt64
+
+
+HistoryPage = arc4.StaticArray[PricePoint, typing.Literal[32]]
+
+
+class AssetPrice(arc4.Struct):
+    """One asset's price slot"""
+    price: arc4.UInt64
+    update_time: arc4.UInt64
+    min_price: arc4.UInt64
+    max_price: arc4.UInt64
+
+
+class PriceUpdate(arc4.Struct):
+    """A new price for an asset slot"""
+    slot: arc4.UInt64
+    price: arc4.UInt64
+
 
 class PriceOracle(ARC4Contract):
     """Price Oracle Contract - Manages gold price updates and validation"""
     
     def __init__(self) -> None:
         # Oracle configuration
-        self.current_price = UInt64(50_000)  # 0.05 ALGO per vGold (in microALGO)
-        self.price_update_time = Global.latest_timestamp
-        self.oracle_address = Txn.sender
-        self.manager = Txn.sender
+        self.current_price = GlobalState(UInt64(50_000), key=CURRENT_PRICE_KEY)  # 0.05 ALGO per vGold (in microALGO)
+        self.price_update_time = GlobalState(Global.latest_timestamp, key=PRICE_UPDATE_TIME_KEY)
+        self.oracle_address = GlobalState(Txn.sender, key=ORACLE_ADDRESS_KEY)
+        self.manager = GlobalState(Txn.sender, key=MANAGER_KEY)
         
         # Price bounds for validation
-        self.min_price = UInt64(1_000)    # 0.001 ALGO
-        self.max_price = UInt64(1_000_000) # 1 ALGO
+        self.min_price = GlobalState(UInt64(1_000), key=MIN_PRICE_KEY)    # 0.001 ALGO
+        self.max_price = GlobalState(UInt64(1_000_000), key=MAX_PRICE_KEY) # 1 ALGO
         
         # Price history tracking
-        self.price_history_count = UInt64(0)
-        self.last_price = UInt64(50_000)
+        self.price_history_count = GlobalState(UInt64(0), key=PRICE_HISTORY_KEY)
+        self.last_price = GlobalState(UInt64(50_000), key=LAST_PRICE_KEY)
         
         # Price change tracking
-        self.price_change_24h = UInt64(0)
-        self.price_change_7d = UInt64(0)
-        self.price_change_30d = UInt64(0)
+        self.price_change_24h = GlobalState(UInt64(0), key=PRICE_CHANGE_24H_KEY)
+        self.price_change_7d = GlobalState(UInt64(0), key=PRICE_CHANGE_7D_KEY)
+        self.price_change_30d = GlobalState(UInt64(0), key=PRICE_CHANGE_30D_KEY)
+        
+        # Price-time accumulator, in microALGO-seconds, as of price_update_time
+        self.price_cumulative = GlobalState(UInt64(0), key=PRICE_CUMULATIVE_KEY)
+        
+        # Price history pages, appended by every update
+        self.history = BoxMap(UInt64, HistoryPage, key_prefix=b"h")
+        
+        # Hourly and daily price checkpoints
+        self.checkpoints = Box(Bytes, key=b"k")
+        
+        # Per-asset price slots
+        self.assets = Box(Bytes, key=b"a")
+        
+        # Median reporters: quorum, outlier bound in basis points and the last aggregated round
+        self.reporters = Box(Bytes, key=b"r")
+        self.reporter_quorum = GlobalState(UInt64(0), key=REPORTER_QUORUM_KEY)
+        self.max_deviation = GlobalState(UInt64(0), key=MAX_DEVIATION_KEY)
+        self.report_round = GlobalState(UInt64(0), key=REPORT_ROUND_KEY)
     
     @abimethod
     def update_price(self, new_price: UInt64) -> None:
         """Update gold price (only oracle can call)"""
-        assert Txn.sender == self.oracle_address, "Only oracle can update price"
+        assert Txn.sender == self.oracle_address.value, "Only oracle can update price"
+        assert self.reporter_quorum.value == 0, "Price set by reporters"
         
         # Validate price is within bounds
-        assert new_price >= self.min_price, "Price below minimum"
-        assert new_price <= self.max_price, "Price above maximum"
+        assert new_price >= self.min_price.value, "Price below minimum"
+        assert new_price <= self.max_price.value, "Price above maximum"
         
-        # Store old price
-        self.last_price = self.current_price
+        self._set_vgold_price(new_price)
         
-        # Update current price
-        self.current_price = new_price
-        self.price_update_time = Global.latest_timestamp
+        # Calculate price change percentage
+        self._calculate_price_change()
+    
+    @abimethod
+    def update_prices(self, prices: arc4.DynamicArray[PriceUpdate]) -> None:
+        """Set many assets' prices in one call, each within its bounds (only oracle can call)"""
+        assert Txn.sender == self.oracle_address.value, "Only oracle can update price"
+        ensure_budget(prices.length * UInt64(PRICE_ITEM_BUDGET), OpUpFeeSource.GroupCredit)
         
-        # Increment price history counter
-        self.price_history_count += UInt64(1)
+        for i in urange(prices.length):
+            update = prices[i].copy()
+            slot = update.slot.native
+            price = update.price.native
+            assert slot < MAX_ASSETS, "No such asset slot"
+            if slot == VGOLD_ASSET_SLOT:
+                assert self.reporter_quorum.value == 0, "Price set by reporters"
+                assert price >= self.min_price.value, "Price below minimum"
+                assert price <= self.max_price.value, "Price above maximum"
+                ensure_budget(UInt64(VGOLD_PRICE_BUDGET), OpUpFeeSource.GroupCredit)
+                self._set_vgold_price(price)
+                self._calculate_price_change()
+            else:
+                record = op.Box.extract(self.assets.key, slot * ASSET_SLOT_BYTES, ASSET_SLOT_BYTES)
+                assert price >= op.extract_uint64(record, 16), "Price below minimum"
+                assert price <= op.extract_uint64(record, 24), "Price above maximum"
+                op.Box.replace(self.assets.key, slot * ASSET_SLOT_BYTES, op.itob(price) + op.itob(Global.latest_timestamp))
+    
+    @abimethod
+    def set_asset(self, slot: UInt64, min_price: UInt64, max_price: UInt64) -> None:
+        """Register an asset slot or change its bounds (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can set assets"
+        assert slot != VGOLD_ASSET_SLOT and slot < MAX_ASSETS, "No such asset slot"
+        assert min_price < max_price, "Invalid price bounds"
+        assert min_price > UInt64(0), "Minimum price must be positive"
         
-        # Calculate price change percentage
+        # Creates the box for the first asset, a no-op once it exists
+        _created = op.Box.create(self.assets.key, MAX_ASSETS * ASSET_SLOT_BYTES)
+        op.Box.replace(self.assets.key, slot * ASSET_SLOT_BYTES + 16, op.itob(min_price) + op.itob(max_price))
+    
+    @abimethod(readonly=True)
+    def get_asset_price(self, slot: UInt64) -> AssetPrice:
+        """One asset's price, update time and bounds"""
+        if slot == VGOLD_ASSET_SLOT:
+            return AssetPrice(
+                arc4.UInt64(self.current_price.value), arc4.UInt64(self.price_update_time.value),
+                arc4.UInt64(self.min_price.value), arc4.UInt64(self.max_price.value),
+            )
+        assert slot < MAX_ASSETS and self.assets, "No such asset slot"
+        return AssetPrice.from_bytes(op.Box.extract(self.assets.key, slot * ASSET_SLOT_BYTES, ASSET_SLOT_BYTES))
+    
+    @abimethod
+    def report(self, round_number: UInt64, price: UInt64, index: UInt64) -> None:
+        """One reporter's quote for a round, checked and counted by the group's aggregate call"""
+        assert index < MAX_REPORTERS, "No such reporter"
+        assert op.Box.extract(self.reporters.key, index * REPORTER_BYTES, REPORTER_BYTES) == Txn.sender.bytes, (
+            "Not a registered reporter"
+        )
+    
+    @abimethod
+    def aggregate(self, round_number: UInt64) -> UInt64:
+        """Set the price to the median of the group's reports for a round, returns it"""
+        assert Txn.group_index == Global.group_size - 1, "Aggregate must close the group"
+        count = Txn.group_index
+        assert self.reporter_quorum.value > 0, "No reporters registered"
+        assert count >= self.reporter_quorum.value, "Too few reports"
+        assert round_number > self.report_round.value, "Stale round"
+        
+        # Quotes sorted by price, each reporter at most once
+        mask = UInt64(0)
+        last = UInt64(0)
+        for i in urange(count):
+            report = gtxn.ApplicationCallTransaction(i)
+            assert report.app_id == Global.current_application_id, "Not a report"
+            assert report.on_completion == OnCompleteAction.NoOp, "Not a report"
+            assert report.app_args(0) == arc4.arc4_signature("report(uint64,uint64,uint64)void"), "Not a report"
+            assert op.btoi(report.app_args(1)) == round_number, "Report for another round"
+            price = _quote(i)
+            bit = UInt64(1) << op.btoi(report.app_args(3))
+            assert price >= last, "Reports not sorted by price"
+            assert not (mask & bit), "Duplicate reporter"
+            last = price
+            mask |= bit
+        
+        # The middle quote, or the mean of the middle two
+        median = (_quote((count - 1) // 2) + _quote(count // 2)) // 2
+        
+        # Enough quotes must be within max_deviation of the median
+        inliers = UInt64(0)
+        for i in urange(count):
+            price = _quote(i)
+            deviation = price - median if price > median else median - price
+            if deviation * 10000 <= median * self.max_deviation.value:
+                inliers += 1
+        assert inliers >= self.reporter_quorum.value, "Too many outliers"
+        
+        assert median >= self.min_price.value, "Price below minimum"
+        assert median <= self.max_price.value, "Price above maximum"
+        self.report_round.value = round_number
+        self._set_vgold_price(median)
         self._calculate_price_change()
+        return median
+    
+    @abimethod
+    def set_reporters(
+        self, reporters: arc4.DynamicArray[arc4.Address], quorum: UInt64, max_deviation: UInt64
+    ) -> None:
+        """Replace the reporter set, in ascending order, with its quorum and outlier bound (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can set reporters"
+        assert reporters.length <= MAX_REPORTERS, "Too many reporters"
+        assert quorum > 0 and quorum <= MAX_REPORTS and quorum <= reporters.length, "Invalid quorum"
+        assert max_deviation > 0, "Invalid deviation bound"
+        
+        # Ascending, so no reporter is registered twice
+        for i in urange(1, reporters.length):
+            assert BigUInt.from_bytes(reporters[i - 1].bytes) < BigUInt.from_bytes(reporters[i].bytes), (
+                "Reporters not ascending"
+            )
+        
+        addresses = reporters.bytes[2:]
+        _created = op.Box.create(self.reporters.key, MAX_REPORTERS * REPORTER_BYTES)  # No-op once it exists
+        op.Box.replace(self.reporters.key, 0, addresses + op.bzero(MAX_REPORTERS * REPORTER_BYTES - addresses.length))
+        self.reporter_quorum.value = quorum
+        self.max_deviation.value = max_deviation
+    
+    @subroutine
+    def _set_vgold_price(self, new_price: UInt64) -> None:
+        """Roll checkpoints and accumulate the outgoing price over the time it held, then
+        update it and append it to the price history"""
+        self.last_price.value = self.current_price.value
+        self._roll_checkpoints()
+        self.price_cumulative.value = self._cumulative_now()
+        self.current_price.value = new_price
+        self.price_update_time.value = Global.latest_timestamp
+        self._record_price(new_price)
     
     @abimethod
     def get_current_price(self) -> UInt64:
         """Get current gold price in microALGO"""
-        return self.current_price
+        return self.current_price.value
     
     @abimethod
     def get_price_info(self) -> tuple[UInt64, UInt64, UInt64]:
         """Get comprehensive price information"""
         return (
-            self.current_price,
-            self.price_update_time,
-            self.price_history_count
+            self.current_price.value,
+            self.price_update_time.value,
+            self.price_history_count.value
         )
     
+    @abimethod
+    def get_cumulative_price(self) -> tuple[UInt64, UInt64]:
+        """Cumulative price and its timestamp, for TWAPs between any two reads"""
+        return (self._cumulative_now(), Global.latest_timestamp)
+    
+    @subroutine
+    def _cumulative_now(self) -> UInt64:
+        """Price-time accumulated up to now"""
+        return cumulative_price(self.price_cumulative.value, self.current_price.value, self.price_update_time.value)
+    
     @abimethod
     def get_price_change(self) -> tuple[UInt64, UInt64, UInt64]:
-        """Get price change percentages"""
+        """Signed 24h, 7d and 30d price changes in basis points, negative as two's complement"""
+        return self._price_changes()
+    
+    @subroutine
+    def _price_changes(self) -> tuple[UInt64, UInt64, UInt64]:
+        """Changes from the checkpoints 24 hours, 7 days and 30 days back to the current price"""
+        current = self.current_price.value
         return (
-            self.price_change_24h,
-            self.price_change_7d,
-            self.price_change_30d
+            _signed_change(self._price_back(UInt64(HOUR), UInt64(24), UInt64(0), UInt64(CHECKPOINT_HOURS)), current),
+            _signed_change(
+                self._price_back(UInt64(DAY), UInt64(7), UInt64(CHECKPOINT_HOURS), UInt64(CHECKPOINT_DAYS)), current
+            ),
+            _signed_change(
+                self._price_back(UInt64(DAY), UInt64(30), UInt64(CHECKPOINT_HOURS), UInt64(CHECKPOINT_DAYS)), current
+            ),
         )
     
+    @subroutine
+    def _price_back(self, period: UInt64, back: UInt64, first: UInt64, size: UInt64) -> UInt64:
+        """Price at the start of the period back periods ago, the current price if no update
+        has rolled the checkpoints that far yet"""
+        target = Global.latest_timestamp // period - back
+        if not self.checkpoints or target > self.price_update_time.value // period:
+            return self.current_price.value
+        return op.extract_uint64(self.checkpoints.value, (first + target % size) * 8)
+    
+    @subroutine
+    def _roll_checkpoints(self) -> None:
+        """Fill the checkpoints of every hour and day since the last update, up to now,
+        with the outgoing price (the whole box the first time)"""
+        created = op.Box.create(self.checkpoints.key, CHECKPOINT_BYTES)
+        
+        # 32 copies of the price, enough for the largest ring
+        fill = op.itob(self.current_price.value)
+        for _i in urange(5):
+            fill = fill + fill
+        self._roll_ring(fill, created, UInt64(HOUR), UInt64(0), UInt64(CHECKPOINT_HOURS))
+        self._roll_ring(fill, created, UInt64(DAY), UInt64(CHECKPOINT_HOURS), UInt64(CHECKPOINT_DAYS))
+    
+    @subroutine
+    def _roll_ring(self, fill: Bytes, created: bool, period: UInt64, first: UInt64, size: UInt64) -> None:
+        """Roll one checkpoint ring, its slots contiguous or wrapping around the end once"""
+        now = Global.latest_timestamp // period
+        count = now - self.price_update_time.value // period
+        if created or count > size:
+            count = size
+        start = (now + size + 1 - count) % size
+        if start + count <= size:
+            op.Box.replace(self.checkpoints.key, (first + start) * 8, op.extract(fill, 0, count * 8))
+        else:
+            op.Box.replace(self.checkpoints.key, (first + start) * 8, op.extract(fill, 0, (size - start) * 8))
+            op.Box.replace(self.checkpoints.key, first * 8, op.extract(fill, 0, (start + count - size) * 8))
+    
     @abimethod
     def validate_price(self, price: UInt64) -> bool:
         """Validate if price is within acceptable bounds"""
-        return price >= self.min_price and price <= self.max_price
+        return price >= self.min_price.value and price <= self.max_price.value
     
     @abimethod
     def set_price_bounds(self, min_price: UInt64, max_price: UInt64) -> None:
         """Set price bounds (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can set price bounds"
+        assert Txn.sender == self.manager.value, "Only manager can set price bounds"
         assert min_price < max_price, "Invalid price bounds"
         assert min_price > UInt64(0), "Minimum price must be positive"
         
-        self.min_price = min_price
-        self.max_price = max_price
+        self.min_price.value = min_price
+        self.max_price.value = max_price
     
     @abimethod
     def set_oracle_address(self, new_oracle: Account) -> None:
         """Set new oracle address (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can set oracle address"
-        self.oracle_address = new_oracle
+        assert Txn.sender == self.manager.value, "Only manager can set oracle address"
+        self.oracle_address.value = new_oracle
     
     @abimethod
     def emergency_update(self, new_price: UInt64) -> None:
         """Emergency price update (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can emergency update"
-        
-        # Store old price
-        self.last_price = self.current_price
-        
-        # Update current price
-        self.current_price = new_price
-        self.price_update_time = Global.latest_timestamp
-        
-        # Increment price history counter
-        self.price_history_count += UInt64(1)
+        assert Txn.sender == self.manager.value, "Only manager can emergency update"
+        self._set_vgold_price(new_price)
     
     @abimethod
     def get_price_history_count(self) -> UInt64:
         """Get number of price updates"""
-        return self.price_history_count
+        return self.price_history_count.value
+    
+    @abimethod(readonly=True)
+    def get_price_history_page(self, page: UInt64) -> HistoryPage:
+        """One page of the price history ring buffer"""
+        assert page in self.history, "No such history page"
+        return self.history[page].copy()
+    
+    @subroutine
+    def _record_price(self, price: UInt64) -> None:
+        """Write a price into the next history slot and count it"""
+        slot = self.price_history_count.value % HISTORY_CAPACITY
+        key = self.history.key_prefix + op.itob(slot // HISTORY_PAGE_SIZE)
+        
+        # Writes only the 16-byte point, creating the page on first use
+        _created = op.Box.create(key, HISTORY_PAGE_BYTES)
+        op.Box.replace(key, (slot % HISTORY_PAGE_SIZE) * 16, op.itob(price) + op.itob(Global.latest_timestamp))
+        self.price_history_count.value += UInt64(1)
     
     @abimethod
     def calculate_price_change_percentage(self, old_price: UInt64, new_price: UInt64) -> UInt64:
-        """Calculate price change percentage in basis points"""
-        if old_price == UInt64(0):
-            return UInt64(0)
-        
-        price_diff = new_price - old_price
-        change_percentage = (price_diff * UInt64(10000)) // old_price
-        
-        return change_percentage
+        """Calculate signed price change in basis points, negative as two's complement"""
+        return _signed_change(old_price, new_price)
     
     @abimethod
     def get_oracle_info(self) -> tuple[Account, Account, UInt64, UInt64]:
         """Get oracle configuration information"""
         return (
-            self.oracle_address,
-            self.manager,
-            self.min_price,
-            self.max_price
+            self.oracle_address.value,
+            self.manager.value,
+            self.min_price.value,
+            self.max_price.value
         )
     
+    @subroutine
     def _calculate_price_change(self) -> None:
-        """Calculate price change percentages"""
-        if self.last_price > UInt64(0):
-            # Calculate percentage change in basis points
-            price_diff = self.current_price - self.last_price
-            change_percentage = (price_diff * UInt64(10000)) // self.last_price
-            
-            # Update price change tracking (simplified)
-            self.price_change_24h = change_percentage
-            self.price_change_7d = change_percentage
-            self.price_change_30d = change_percentage
+        """Store the 24h, 7d and 30d changes as of this update"""
+        change_24h, change_7d, change_30d = self._price_changes()
+        self.price_change_24h.value = change_24h
+        self.price_change_7d.value = change_7d
+        self.price_change_30d.value = change_30d
+
+
+@subroutine
+def _quote(index: UInt64) -> UInt64:
+    """Price of the report call at a group index"""
+    return op.btoi(gtxn.ApplicationCallTransaction(index).app_args(2))
+
+
+@subroutine
+def _signed_change(old_price: UInt64, new_price: UInt64) -> UInt64:
+    """floor((new - old) * 10000 / old) basis points, negative changes as two's complement"""
+    if old_price == 0:
+        return UInt64(0)
+    if new_price >= old_price:
+        return (new_price - old_price) * 10000 // old_price
+    # -ceil(drop) == ~(ceil(drop) - 1), and ceil(drop) >= 1 here
+    return ~(((old_price - new_price) * 10000 + old_price - 1) // old_price - 1)
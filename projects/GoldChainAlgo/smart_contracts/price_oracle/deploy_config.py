@@ -5,14 +5,29 @@ Deployment configuration for Price Oracle Contract
 from algokit_utils import (
     ApplicationClient,
     ApplicationSpecification,
+    TransferParameters,
     get_account,
     get_algod_client,
     get_indexer_client,
     deploy,
     get_localnet_default_account,
+    transfer,
 )
 from algopy import Account
-from .contract import PriceOracle
+from .contract import (
+    ASSET_SLOT_BYTES, CHECKPOINT_BYTES, HISTORY_PAGE_BYTES, HISTORY_PAGES, MAX_ASSETS, MAX_REPORTERS, REPORTER_BYTES,
+    PriceOracle,
+)
+
+# Base minimum balance plus every price history box (9-byte names), the checkpoint box,
+# the asset price box and the reporter box
+HISTORY_FUNDING = (
+    100_000
+    + HISTORY_PAGES * (2_500 + 400 * (9 + HISTORY_PAGE_BYTES))
+    + 2_500 + 400 * (1 + CHECKPOINT_BYTES)
+    + 2_500 + 400 * (1 + MAX_ASSETS * ASSET_SLOT_BYTES)
+    + 2_500 + 400 * (1 + MAX_REPORTERS * REPORTER_BYTES)
+)
 
 
 def deploy_price_oracle() -> ApplicationClient:
@@ -38,6 +53,13 @@ def deploy_price_oracle() -> ApplicationClient:
         allow_delete=True,
     )
     
+    # The app account pays the minimum balance of its price history boxes
+    transfer(algod_client, TransferParameters(
+        from_account=account,
+        to_address=app_client.app_address,
+        micro_algos=HISTORY_FUNDING,
+    ))
+    
     print(f"✅ Price Oracle deployed successfully!")
     print(f"   App ID: {app_client.app_id}")
     print(f"   Address: {app_client.app_address}")
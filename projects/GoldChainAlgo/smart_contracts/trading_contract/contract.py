@@ -3,55 +3,76 @@ Trading Contract - AlgoKit Implementation
 Handles buy/sell operations for vGold tokens with ALGO.
 """
 
-from algopy import ARC4Contract, UInt64, Account, Txn, Global, arc4, Asset
+from algopy import ARC4Contract, UInt64, Application, Asset, GlobalState, Txn, Global, gtxn, op, subroutine
 from algopy.arc4 import abimethod
 
+from smart_contracts._helpers.algo_payment import receive_algo
+from smart_contracts._helpers.oracle_twap import oracle_twap
+from smart_contracts._helpers.state_keys import (
+    CURRENT_PRICE_KEY, MANAGER_KEY, ORACLE_APP_ID_KEY, PRICE_UPDATE_TIME_KEY, TOTAL_FEES_COLLECTED_KEY,
+    TOTAL_VOLUME_ALGO_KEY, TOTAL_VOLUME_VGOLD_KEY, TRADING_FEE_KEY, TREASURY_KEY, VGOLD_APP_ID_KEY, VGOLD_ASSET_ID_KEY,
+)
+from smart_contracts._helpers.vgold_asset import receive_vgold, send_vgold
+
+# Trades price off the oracle app's current_price, refused once it is older than this
+MAX_PRICE_AGE = 3600  # seconds
+
 
 class TradingContract(ARC4Contract):
     """Trading Contract - Handles vGold/ALGO trading with fees"""
     
     def __init__(self) -> None:
         # Contract configuration
-        self.vgold_app_id = UInt64(0)  # Will be set during deployment
-        self.price_oracle = Account(Global.zero_address)  # Will be set during deployment
-        self.trading_fee = UInt64(25)  # 0.25% fee (25 basis points)
-        self.manager = Txn.sender
-        self.treasury = Txn.sender
-        
-        # Current price (0.05 ALGO per vGold in microALGO)
-        self.current_price = UInt64(50_000)  # 0.05 ALGO = 50,000 microALGO
+        self.vgold_app_id = GlobalState(UInt64(0), key=VGOLD_APP_ID_KEY)  # Will be set during deployment
+        self.vgold_asset = GlobalState(Asset(), key=VGOLD_ASSET_ID_KEY)  # Set when vGold is a native ASA
+        self.oracle_app = GlobalState(Application(), key=ORACLE_APP_ID_KEY)  # Price oracle trades price against, set during deployment
+        self.trading_fee = GlobalState(UInt64(25), key=TRADING_FEE_KEY)  # 0.25% fee (25 basis points)
+        self.manager = GlobalState(Txn.sender, key=MANAGER_KEY)
+        self.treasury = GlobalState(Txn.sender, key=TREASURY_KEY)
         
         # Trading statistics
-        self.total_volume_algo = UInt64(0)
-        self.total_volume_vgold = UInt64(0)
-        self.total_fees_collected = UInt64(0)
+        self.total_volume_algo = GlobalState(UInt64(0), key=TOTAL_VOLUME_ALGO_KEY)
+        self.total_volume_vgold = GlobalState(UInt64(0), key=TOTAL_VOLUME_VGOLD_KEY)
+        self.total_fees_collected = GlobalState(UInt64(0), key=TOTAL_FEES_COLLECTED_KEY)
     
     @abimethod
-    def initialize(self, vgold_app_id: UInt64, oracle_address: Account) -> None:
-        """Initialize contract with vGold app ID and oracle address"""
-        assert Txn.sender == self.manager, "Only manager can initialize"
-        self.vgold_app_id = vgold_app_id
-        self.price_oracle = oracle_address
+    def initialize(self, vgold_app_id: UInt64, oracle_app: Application) -> None:
+        """Initialize contract with vGold app ID and price oracle app"""
+        assert Txn.sender == self.manager.value, "Only manager can initialize"
+        self.vgold_app_id.value = vgold_app_id
+        self.oracle_app.value = oracle_app
     
     @abimethod
-    def buy_vgold(self, algo_amount: UInt64) -> UInt64:
-        """Buy vGold tokens with ALGO"""
+    def set_vgold_asset(self, asset: Asset) -> None:
+        """Trade vGold as a native ASA and opt the contract in (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can set the vGold asset"
+        self.vgold_asset.value = asset
+        send_vgold(asset, Global.current_application_address, UInt64(0))
+    
+    @abimethod
+    def buy_vgold(self, payment: gtxn.PaymentTransaction) -> UInt64:
+        """Buy vGold tokens with the ALGO paid to the contract by a grouped payment"""
+        algo_amount = receive_algo(payment)
+        
         # Calculate vGold amount to receive
-        vgold_amount = (algo_amount * UInt64(1_000_000)) // self.current_price
+        vgold_amount = (algo_amount * UInt64(1_000_000)) // self._oracle_price()
         
         # Calculate trading fee
-        fee_amount = (vgold_amount * self.trading_fee) // UInt64(10_000)
+        fee_amount = (vgold_amount * self.trading_fee.value) // UInt64(10_000)
         net_vgold = vgold_amount - fee_amount
         
         # Update statistics
-        self.total_volume_algo += algo_amount
-        self.total_volume_vgold += vgold_amount
-        self.total_fees_collected += fee_amount
+        self.total_volume_algo.value += algo_amount
+        self.total_volume_vgold.value += vgold_amount
+        self.total_fees_collected.value += fee_amount
+        
+        # Pay out of the contract's vGold inventory in ASA mode
+        if self.vgold_asset.value.id != 0:
+            send_vgold(self.vgold_asset.value, Txn.sender, net_vgold)
         
         # In a real implementation, you would:
-        # 1. Transfer ALGO from buyer to contract
-        # 2. Mint vGold tokens to buyer
-        # 3. Handle the fee distribution
+        # 1. Mint vGold tokens to buyer (app mode)
+        # 2. Handle the fee distribution
         
         return net_vgold
     
@@ -59,72 +80,79 @@ class TradingContract(ARC4Contract):
     def sell_vgold(self, vgold_amount: UInt64) -> UInt64:
         """Sell vGold tokens for ALGO"""
         # Calculate ALGO amount to receive
-        algo_amount = (vgold_amount * self.current_price) // UInt64(1_000_000)
+        algo_amount = (vgold_amount * self._oracle_price()) // UInt64(1_000_000)
         
         # Calculate trading fee
-        fee_amount = (algo_amount * self.trading_fee) // UInt64(10_000)
+        fee_amount = (algo_amount * self.trading_fee.value) // UInt64(10_000)
         net_algo = algo_amount - fee_amount
         
         # Update statistics
-        self.total_volume_algo += algo_amount
-        self.total_volume_vgold += vgold_amount
-        self.total_fees_collected += fee_amount
+        self.total_volume_algo.value += algo_amount
+        self.total_volume_vgold.value += vgold_amount
+        self.total_fees_collected.value += fee_amount
+        
+        # Seller deposits vGold with a grouped asset transfer in ASA mode
+        if self.vgold_asset.value.id != 0:
+            receive_vgold(self.vgold_asset.value, vgold_amount)
         
         # In a real implementation, you would:
-        # 1. Burn vGold tokens from seller
+        # 1. Burn vGold tokens from seller (app mode)
         # 2. Transfer ALGO to seller
         # 3. Handle the fee distribution
         
         return net_algo
     
     @abimethod
-    def update_price(self, new_price: UInt64) -> None:
-        """Update vGold price (only oracle can call)"""
-        assert Txn.sender == self.price_oracle, "Only oracle can update price"
-        
-        # Validate price is reasonable (between 0.001 and 1 ALGO per vGold)
-        assert new_price >= UInt64(1_000), "Price too low"  # 0.001 ALGO
-        assert new_price <= UInt64(1_000_000), "Price too high"  # 1 ALGO
-        
-        self.current_price = new_price
+    def get_current_price(self) -> UInt64:
+        """Get current vGold price in microALGO from the oracle"""
+        return self._oracle_price()
     
     @abimethod
-    def get_current_price(self) -> UInt64:
-        """Get current vGold price in microALGO"""
-        return self.current_price
+    def get_twap(self, start_cumulative: UInt64, start_time: UInt64) -> UInt64:
+        """Average oracle price since an earlier oracle get_cumulative_price observation"""
+        return oracle_twap(self.oracle_app.value, start_cumulative, start_time)
     
     @abimethod
     def get_trading_stats(self) -> tuple[UInt64, UInt64, UInt64]:
         """Get trading statistics"""
-        return (self.total_volume_algo, self.total_volume_vgold, self.total_fees_collected)
+        return (self.total_volume_algo.value, self.total_volume_vgold.value, self.total_fees_collected.value)
     
     @abimethod
     def set_trading_fee(self, new_fee: UInt64) -> None:
         """Set trading fee (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can set trading fee"
+        assert Txn.sender == self.manager.value, "Only manager can set trading fee"
         assert new_fee <= UInt64(1_000), "Fee too high"  # Max 10%
         
-        self.trading_fee = new_fee
+        self.trading_fee.value = new_fee
     
     @abimethod
     def withdraw_fees(self, amount: UInt64) -> None:
         """Withdraw collected fees to treasury (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can withdraw fees"
-        assert amount <= self.total_fees_collected, "Insufficient fees collected"
+        assert Txn.sender == self.manager.value, "Only manager can withdraw fees"
+        assert amount <= self.total_fees_collected.value, "Insufficient fees collected"
         
         # In a real implementation, transfer ALGO to treasury
-        self.total_fees_collected -= amount
+        self.total_fees_collected.value -= amount
     
     @abimethod
-    def set_oracle(self, new_oracle: Account) -> None:
-        """Set new oracle address (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can set oracle"
-        self.price_oracle = new_oracle
+    def set_oracle(self, new_oracle: Application) -> None:
+        """Set new price oracle app (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can set oracle"
+        self.oracle_app.value = new_oracle
     
     @abimethod
     def emergency_withdraw(self, amount: UInt64) -> None:
         """Emergency withdrawal (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can emergency withdraw"
+        assert Txn.sender == self.manager.value, "Only manager can emergency withdraw"
         
         # In a real implementation, transfer ALGO to treasury
         pass
+    
+    @subroutine
+    def _oracle_price(self) -> UInt64:
+        """Current vGold price in microALGO from the oracle app, rejecting stale prices"""
+        price, exists = op.AppGlobal.get_ex_uint64(self.oracle_app.value, CURRENT_PRICE_KEY)
+        assert exists and price > 0, "No oracle price"
+        update_time, exists = op.AppGlobal.get_ex_uint64(self.oracle_app.value, PRICE_UPDATE_TIME_KEY)
+        assert exists and Global.latest_timestamp <= update_time + MAX_PRICE_AGE, "Stale oracle price"
+        return price
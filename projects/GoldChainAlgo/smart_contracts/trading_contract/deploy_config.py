@@ -11,11 +11,10 @@ from algokit_utils import (
     deploy,
     get_localnet_default_account,
 )
-from algopy import Account
 from .contract import TradingContract
 
 
-def deploy_trading_contract(vgold_app_id: int, oracle_address: str) -> ApplicationClient:
+def deploy_trading_contract(vgold_app_id: int, oracle_app_id: int) -> ApplicationClient:
     """Deploy Trading Contract"""
     
     # Get the default account for deployment
@@ -38,11 +37,11 @@ def deploy_trading_contract(vgold_app_id: int, oracle_address: str) -> Applicati
         allow_delete=True,
     )
     
-    # Initialize the contract with vGold app ID and oracle address
+    # Initialize the contract with vGold app ID and the oracle app it prices trades against
     app_client.call(
         TradingContract.initialize,
         vgold_app_id=vgold_app_id,
-        oracle_address=Account(oracle_address),
+        oracle_app=oracle_app_id,
     )
     
     print(f"✅ Trading Contract deployed successfully!")
@@ -50,7 +49,7 @@ def deploy_trading_contract(vgold_app_id: int, oracle_address: str) -> Applicati
     print(f"   Address: {app_client.app_address}")
     print(f"   Creator: {account.address}")
     print(f"   vGold App ID: {vgold_app_id}")
-    print(f"   Oracle Address: {oracle_address}")
+    print(f"   Oracle App ID: {oracle_app_id}")
     
     return app_client
 
@@ -58,4 +57,4 @@ def deploy_trading_contract(vgold_app_id: int, oracle_address: str) -> Applicati
 if __name__ == "__main__":
     # This would be called with actual values after vGold and Oracle are deployed
     print("Trading Contract deployment script")
-    print("Call deploy_trading_contract(vgold_app_id, oracle_address) with actual values")
+    print("Call deploy_trading_contract(vgold_app_id, oracle_app_id) with actual values")
@@ -3,96 +3,240 @@ vGold Token Contract - AlgoKit Implementation
 A fungible token representing virtual gold with standard token operations.
 """
 
-from algopy import ARC4Contract, UInt64, String, Asset, Account, Txn, Global, arc4
+from algopy import ARC4Contract, UInt64, String, Account, Asset, BoxMap, GlobalState, LocalState, Txn, Global, arc4, gtxn, itxn, subroutine, urange
 from algopy.arc4 import abimethod
 
+from smart_contracts._helpers.algo_payment import receive_algo
+from smart_contracts._helpers.state_keys import (
+    ASSET_ID_KEY, BALANCE_LOCAL_KEY, CLAWBACK_KEY, CREATOR_KEY, DECIMALS_KEY, FREEZE_KEY, MANAGER_KEY, NAME_KEY,
+    RESERVE_KEY, SYMBOL_KEY, TOTAL_SUPPLY_KEY, USE_BOXES_KEY,
+)
+
+# Token constants
+TOTAL_SUPPLY = 1_000_000_000_000_000  # 1B vGold tokens (6 decimals)
+DECIMALS = 6
+
+# Minimum balance of one holder box (32-byte address key, 8-byte balance) in microALGO
+BALANCE_BOX_MBR = 2_500 + 400 * (32 + 8)
+
+
+class TransferItem(arc4.Struct):
+    """Recipient and amount of a batch transfer"""
+    to: arc4.Address
+    amount: arc4.UInt64
+
 
 class VGoldToken(ARC4Contract):
     """vGold Token Contract - Represents virtual gold backed by physical gold"""
     
-    # Global state keys
-    TOTAL_SUPPLY = arc4.UInt64(1_000_000_000_000_000)  # 1B vGold tokens (6 decimals)
-    DECIMALS = arc4.UInt64(6)
-    NAME = arc4.String("Virtual Gold")
-    SYMBOL = arc4.String("vGOLD")
-    
     def __init__(self) -> None:
         # Initialize token metadata
-        self.total_supply = self.TOTAL_SUPPLY
-        self.decimals = self.DECIMALS
-        self.name = self.NAME
-        self.symbol = self.SYMBOL
-        self.creator = Txn.sender
-        self.manager = Txn.sender
-        self.freeze = Global.zero_address
-        self.clawback = Global.zero_address
-        self.reserve = Txn.sender
+        self.total_supply = GlobalState(UInt64(TOTAL_SUPPLY), key=TOTAL_SUPPLY_KEY)
+        self.decimals = GlobalState(UInt64(DECIMALS), key=DECIMALS_KEY)
+        self.name = GlobalState(String("Virtual Gold"), key=NAME_KEY)
+        self.symbol = GlobalState(String("vGOLD"), key=SYMBOL_KEY)
+        self.creator = GlobalState(Txn.sender, key=CREATOR_KEY)
+        self.manager = GlobalState(Txn.sender, key=MANAGER_KEY)
+        self.freeze = GlobalState(Global.zero_address, key=FREEZE_KEY)
+        self.clawback = GlobalState(Global.zero_address, key=CLAWBACK_KEY)
+        self.reserve = GlobalState(Txn.sender, key=RESERVE_KEY)
+        
+        # User balances, in local state until box mode is enabled
+        self.balance = LocalState(UInt64, key=BALANCE_LOCAL_KEY)
+        
+        # Box mode: one box per holder, keyed by the raw 32-byte address
+        self.box_balance = BoxMap(Account, UInt64, key_prefix=b"")
+        self.use_boxes = GlobalState(False, key=USE_BOXES_KEY)
+        
+        # ASA mode: a native asset held in the app account as reserve and clawback
+        self.asset = GlobalState(Asset(), key=ASSET_ID_KEY)
         
         # Initialize creator balance
-        self.balance[Txn.sender] = self.total_supply
+        self.balance[Txn.sender] = self.total_supply.value
+    
+    @subroutine
+    def _balance_of(self, account: Account) -> UInt64:
+        """Balance of an account in the active storage mode"""
+        if self.use_boxes.value:
+            return self.box_balance.get(account, default=UInt64(0))
+        return self.balance.get(account, UInt64(0))
+    
+    @subroutine
+    def _set_balance(self, account: Account, amount: UInt64) -> None:
+        """Write a balance in the active storage mode"""
+        if self.use_boxes.value:
+            self.box_balance[account] = amount
+        else:
+            self.balance[account] = amount
+    
+    @subroutine
+    def _credit(self, account: Account, amount: UInt64) -> UInt64:
+        """Add to a balance, returns the number of holder boxes that created"""
+        created = UInt64(1) if self.use_boxes.value and account not in self.box_balance else UInt64(0)
+        self._set_balance(account, self._balance_of(account) + amount)
+        return created
+    
+    @subroutine
+    def _check_amount(self, amount: UInt64) -> None:
+        """Box mode rejects an amount that could create an empty box"""
+        if self.use_boxes.value:
+            assert amount > 0, "Amount must be positive"
+    
+    @subroutine
+    def _pay_for_boxes(self, new_boxes: UInt64) -> None:
+        """The caller pays the minimum balance of the holder boxes a call created,
+        in the payment grouped immediately before it"""
+        if new_boxes:
+            assert Txn.group_index > 0, "Box minimum balance not paid"
+            paid = receive_algo(gtxn.PaymentTransaction(Txn.group_index - 1))
+            assert paid >= new_boxes * BALANCE_BOX_MBR, "Box minimum balance not paid"
     
     @abimethod
     def mint(self, amount: UInt64, to: Account) -> None:
         """Mint new vGold tokens to specified account"""
         # Only manager can mint
-        assert Txn.sender == self.manager, "Only manager can mint tokens"
+        assert Txn.sender == self.manager.value, "Only manager can mint tokens"
         
         # Check total supply limit
-        assert self.total_supply + amount <= self.TOTAL_SUPPLY, "Exceeds total supply"
+        assert self.total_supply.value + amount <= TOTAL_SUPPLY, "Exceeds total supply"
+        self._check_amount(amount)
         
         # Update balances
-        self.balance[to] += amount
-        self.total_supply += amount
+        self._pay_for_boxes(self._credit(to, amount))
+        self.total_supply.value += amount
     
     @abimethod
     def burn(self, amount: UInt64) -> None:
         """Burn vGold tokens from sender's balance"""
         # Check sufficient balance
-        assert self.balance[Txn.sender] >= amount, "Insufficient balance"
+        self._check_amount(amount)
+        balance = self._balance_of(Txn.sender)
+        assert balance >= amount, "Insufficient balance"
         
         # Update balances
-        self.balance[Txn.sender] -= amount
-        self.total_supply -= amount
+        self._set_balance(Txn.sender, balance - amount)
+        self.total_supply.value -= amount
     
     @abimethod
     def transfer(self, amount: UInt64, to: Account) -> None:
         """Transfer vGold tokens to another account"""
         # Check sufficient balance
-        assert self.balance[Txn.sender] >= amount, "Insufficient balance"
+        self._check_amount(amount)
+        balance = self._balance_of(Txn.sender)
+        assert balance >= amount, "Insufficient balance"
+        
+        # Update balances
+        self._set_balance(Txn.sender, balance - amount)
+        self._pay_for_boxes(self._credit(to, amount))
+    
+    @abimethod
+    def batch_transfer(self, transfers: arc4.DynamicArray[TransferItem]) -> None:
+        """Transfer vGold tokens to several accounts, debiting the sender once"""
+        # Sum the batch for a single balance check
+        total = UInt64(0)
+        for i in urange(transfers.length):
+            item = transfers[i].copy()
+            self._check_amount(item.amount.native)
+            total += item.amount.native
+        balance = self._balance_of(Txn.sender)
+        assert balance >= total, "Insufficient balance"
         
         # Update balances
-        self.balance[Txn.sender] -= amount
-        self.balance[to] += amount
+        self._set_balance(Txn.sender, balance - total)
+        new_boxes = UInt64(0)
+        for i in urange(transfers.length):
+            item = transfers[i].copy()
+            to = item.to.native
+            new_boxes += self._credit(to, item.amount.native)
+        self._pay_for_boxes(new_boxes)
     
     @abimethod
     def get_balance(self, account: Account) -> UInt64:
         """Get vGold balance for an account"""
-        return self.balance[account]
+        return self._balance_of(account)
+    
+    @abimethod
+    def enable_box_balances(self) -> None:
+        """Switch balances to box storage (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can enable box balances"
+        self.use_boxes.value = True
+    
+    @abimethod
+    def migrate_balance(self, holder: Account) -> UInt64:
+        """Move a holder's local state balance into their box, callable by anyone"""
+        assert self.use_boxes.value, "Box balances not enabled"
+        amount = self.balance.get(holder, UInt64(0))
+        self._check_amount(amount)
+        
+        # Clear the local entry so the balance can't be migrated twice
+        del self.balance[holder]
+        self._pay_for_boxes(self._credit(holder, amount))
+        return amount
+    
+    @abimethod
+    def create_asset(self) -> UInt64:
+        """Create the vGold ASA with the whole supply in the app account (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can create the asset"
+        assert self.asset.value.id == 0, "Asset already created"
+        
+        self.asset.value = itxn.AssetConfig(
+            total=TOTAL_SUPPLY,
+            decimals=DECIMALS,
+            asset_name=self.name.value.bytes,
+            unit_name=self.symbol.value.bytes,
+            manager=Global.current_application_address,
+            reserve=Global.current_application_address,
+            clawback=Global.current_application_address,
+            fee=0,  # Covered by the outer call
+        ).submit().created_asset
+        return self.asset.value.id
+    
+    @abimethod
+    def mint_asset(self, amount: UInt64, to: Account) -> None:
+        """Release vGold ASA from the reserve to an account (only manager can call)"""
+        assert Txn.sender == self.manager.value, "Only manager can mint tokens"
+        itxn.AssetTransfer(
+            xfer_asset=self.asset.value,
+            asset_receiver=to,
+            asset_amount=amount,
+            fee=0,
+        ).submit()
+    
+    @abimethod
+    def burn_asset(self, amount: UInt64) -> None:
+        """Claw vGold ASA from the sender back into the reserve"""
+        itxn.AssetTransfer(
+            xfer_asset=self.asset.value,
+            asset_sender=Txn.sender,
+            asset_receiver=Global.current_application_address,
+            asset_amount=amount,
+            fee=0,
+        ).submit()
     
     @abimethod
     def get_total_supply(self) -> UInt64:
         """Get total supply of vGold tokens"""
-        return self.total_supply
+        return self.total_supply.value
     
     @abimethod
     def get_metadata(self) -> tuple[String, String, UInt64, UInt64]:
         """Get token metadata"""
-        return (self.name, self.symbol, self.decimals, self.total_supply)
+        return (self.name.value, self.symbol.value, self.decimals.value, self.total_supply.value)
     
     @abimethod
     def set_manager(self, new_manager: Account) -> None:
         """Set new manager (only current manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can set new manager"
-        self.manager = new_manager
+        assert Txn.sender == self.manager.value, "Only manager can set new manager"
+        self.manager.value = new_manager
     
     @abimethod
     def set_freeze(self, freeze_address: Account) -> None:
         """Set freeze address (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can set freeze address"
-        self.freeze = freeze_address
+        assert Txn.sender == self.manager.value, "Only manager can set freeze address"
+        self.freeze.value = freeze_address
     
     @abimethod
     def set_clawback(self, clawback_address: Account) -> None:
         """Set clawback address (only manager can call)"""
-        assert Txn.sender == self.manager, "Only manager can set clawback address"
-        self.clawback = clawback_address
+        assert Txn.sender == self.manager.value, "Only manager can set clawback address"
+        self.clawback.value = clawback_address
@@ -0,0 +1,15 @@
+import sys
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from algopy_testing import AlgopyTestContext, algopy_testing_context
+
+# The off-chain helpers checked against the contracts live in the repo's contracts/ directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "contracts"))
+
+
+@pytest.fixture()
+def context() -> Generator[AlgopyTestContext, None, None]:
+    with algopy_testing_context() as ctx:
+        yield ctx
@@ -0,0 +1,71 @@
+"""
+liquidate_batch over a mix of positions: a missing record and a repaid one read as
+not active and are skipped, without failing the batch, while the undercollateralized
+position in the same batch is liquidated.
+"""
+
+import pytest
+from algopy import Account, UInt64, arc4
+from algopy_testing import AlgopyTestContext
+
+from smart_contracts.lending_contract.contract import LIQUIDATION_DISCOUNT, LendingContract, PositionKey
+from smart_contracts.price_oracle.contract import PriceOracle
+
+AMOUNT = 1_000_000
+COLLATERAL = 1_500_000
+
+# Collateral * 100 < debt value * 120 from a price of 1.25 microALGO per micro-vGold up
+HEALTHY_PRICE = 1_000_000
+LIQUIDATION_PRICE = 2_000_000
+
+
+class Pool:
+    """A lending contract priced by a price oracle"""
+
+    def __init__(self, context: AlgopyTestContext):
+        self.context = context
+        self.oracle = PriceOracle()
+        self.oracle.current_price.value = UInt64(HEALTHY_PRICE)
+        self.lending = LendingContract()
+        self.lending.oracle_app.value = context.ledger.get_app(self.oracle)
+
+    def borrow(self, borrower: Account) -> PositionKey:
+        address = self.context.ledger.get_app(self.lending).address
+        payment = self.context.any.txn.payment(sender=borrower, receiver=address, amount=UInt64(COLLATERAL))
+        with self.context.txn.create_group(active_txn_overrides={"sender": borrower}):
+            position_id = self.lending.borrow_vgold(UInt64(AMOUNT), UInt64(30), payment)
+        return PositionKey(arc4.Address(borrower), arc4.UInt64(position_id))
+
+    def repay(self, key: PositionKey) -> None:
+        with self.context.txn.create_group(active_txn_overrides={"sender": key.owner.native}):
+            self.lending.repay_loan(key.position_id.native)
+
+    def liquidate_batch(self, keys: list[PositionKey]) -> tuple[int, int]:
+        with self.context.txn.create_group():
+            count, payout = self.lending.liquidate_batch(arc4.DynamicArray(*keys))
+        return int(count), int(payout)
+
+
+@pytest.fixture()
+def pool(context: AlgopyTestContext) -> Pool:
+    return Pool(context)
+
+
+def test_batch_skips_missing_and_repaid(context: AlgopyTestContext, pool: Pool) -> None:
+    missing = PositionKey(arc4.Address(context.any.account()), arc4.UInt64(0))
+    repaid = pool.borrow(context.any.account())
+    pool.repay(repaid)
+    underwater = pool.borrow(context.any.account())
+
+    pool.oracle.current_price.value = UInt64(LIQUIDATION_PRICE)
+    count, payout = pool.liquidate_batch([missing, repaid, underwater, missing])
+    assert (count, payout) == (1, COLLATERAL * (10000 - LIQUIDATION_DISCOUNT) // 10000)
+    assert missing not in pool.lending.borrow_position
+    assert pool.lending.borrow_position[underwater].status.native == 2
+
+
+def test_batch_of_only_skipped_positions(context: AlgopyTestContext, pool: Pool) -> None:
+    healthy = pool.borrow(context.any.account())
+    missing = PositionKey(arc4.Address(context.any.account()), arc4.UInt64(3))
+    assert pool.liquidate_batch([missing, healthy]) == (0, 0)
+    assert pool.lending.borrow_position[healthy].status.native == 1
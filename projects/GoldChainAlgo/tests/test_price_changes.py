@@ -0,0 +1,110 @@
+"""
+The price oracle's 24h/7d/30d changes over long synthetic price series, rising and
+falling, with gaps between updates longer than the widest window. Each reported change
+must equal what contracts/price_history.py decodes from the checkpoint box, and the
+change from the price actually in effect at the start of that window.
+"""
+
+import random
+
+import pytest
+from algopy import UInt64
+from algopy_testing import AlgopyTestContext
+
+from price_history import PriceCheckpoints, decode_change, signed_change
+from price_oracle import CHANGE_WINDOWS, CHECKPOINT_BOX
+from smart_contracts.price_oracle.contract import PriceOracle
+
+START = 1_700_000_000
+INITIAL_PRICE = 50_000
+HOUR = 3600
+DAY = 86400
+
+
+class OracleRun:
+    """A price oracle driven through a series of (time, price) updates"""
+
+    def __init__(self, context: AlgopyTestContext):
+        self.context = context
+        self.at(START)
+        self.oracle = PriceOracle()
+        self.series: list[tuple[int, int]] = []
+
+    def at(self, timestamp: int) -> None:
+        self.context.ledger.patch_global_fields(latest_timestamp=UInt64(timestamp))
+
+    def update(self, timestamp: int, price: int, emergency: bool = False) -> None:
+        self.at(timestamp)
+        (self.oracle.emergency_update if emergency else self.oracle.update_price)(UInt64(price))
+        self.series.append((timestamp, price))
+
+    def reported(self, now: int) -> list[int]:
+        """get_price_change at now, as signed basis points"""
+        self.at(now)
+        return [decode_change(int(change)) for change in self.oracle.get_price_change()]
+
+    def decoded(self, now: int) -> list[int]:
+        """The same changes decoded off chain from the checkpoint box"""
+        box = bytes(self.context.ledger.get_box(self.oracle, CHECKPOINT_BOX))
+        checkpoints = PriceCheckpoints.from_box(box, *self.series[-1][::-1])
+        return list(checkpoints.changes(now).values())
+
+    def expected(self, now: int) -> list[int]:
+        """Changes from the price in effect just before each window's start"""
+        current = self.series[-1][1]
+        changes = []
+        for period, back, _, _ in CHANGE_WINDOWS.values():
+            start = (now // period - back) * period
+            then = INITIAL_PRICE
+            for update_time, price in self.series:
+                if update_time >= start:
+                    break
+                then = price
+            changes.append(signed_change(then, current))
+        return changes
+
+    def check(self, now: int) -> list[int]:
+        reported = self.reported(now)
+        assert reported == self.decoded(now) == self.expected(now), (now, self.series[-3:])
+        return reported
+
+
+@pytest.fixture()
+def run(context: AlgopyTestContext) -> OracleRun:
+    return OracleRun(context)
+
+
+def test_long_random_series(run: OracleRun) -> None:
+    rng = random.Random(45)
+    now = START
+    for i in range(1_500):
+        # Mostly hours to days apart, a burst every 50 updates, and now and then a gap past 30 days
+        now += rng.choice([30, 600, HOUR, 5_000, 20_000, DAY + 1, 300_000, 40 * DAY]) if i % 50 else rng.randint(1, 200)
+        run.update(now, rng.randint(1_000, 1_000_000), emergency=i % 9 == 0)
+        run.check(now + rng.choice([0, 10, HOUR - 1, DAY, 8 * DAY, 45 * DAY]))
+
+
+def test_falling_prices(run: OracleRun) -> None:
+    # Hourly updates falling 0.5% each for 40 days
+    price = 1_000_000
+    for hour in range(1, 40 * 24):
+        price = price * 995 // 1000
+        now = START + hour * HOUR
+        run.update(now, price)
+        changes = run.check(now)
+
+        # Negative for every window that starts after the first update
+        for (period, back, _, _), change in zip(CHANGE_WINDOWS.values(), changes):
+            if (now // period - back) * period > START + HOUR:
+                assert change < 0
+
+
+def test_gap_longer_than_window(run: OracleRun) -> None:
+    run.update(START + HOUR, 80_000)
+    run.update(START + HOUR + 40 * DAY, 60_000)
+
+    # Every window starts inside the gap, where 80_000 was still in effect
+    assert run.check(START + HOUR + 40 * DAY) == [signed_change(80_000, 60_000)] * 3
+
+    # Much later, with no update since, every window starts after the last one
+    assert run.check(START + 100 * DAY) == [0, 0, 0]
@@ -0,0 +1,134 @@
+"""
+Parity of the off-chain quote engine (contracts/quote_engine.py) with the trading
+contract's buy_vgold/sell_vgold: the same net amount for every quote, and a rejected
+quote exactly where the contract fails on a uint64 overflow.
+"""
+
+import random
+
+import pytest
+from algopy import UInt64
+from algopy_testing import AlgopyTestContext
+
+from quote_engine import MAX_UINT64, quote_buy, quote_buy_batch, quote_sell, quote_sell_batch
+from smart_contracts.price_oracle.contract import PriceOracle
+from smart_contracts.trading_contract.contract import TradingContract
+from trading_contract import FEE_DENOMINATOR, MAX_TRADING_FEE, VGOLD_UNIT
+
+
+class Market:
+    """A trading contract priced by a price oracle, at a settable price and fee"""
+
+    def __init__(self, context: AlgopyTestContext):
+        self.context = context
+        self.oracle = PriceOracle()
+        self.trading = TradingContract()
+        self.trading.oracle_app.value = context.ledger.get_app(self.oracle)
+        self.address = context.ledger.get_app(self.trading).address
+
+    def set(self, price: int, fee_bps: int) -> None:
+        self.oracle.current_price.value = UInt64(price)
+        self.trading.trading_fee.value = UInt64(fee_bps)
+
+    def buy(self, algo_amount: int) -> int | None:
+        """Net vGold from buy_vgold, None when the contract rejects the call"""
+        sender = self.context.default_sender
+        payment = self.context.any.txn.payment(sender=sender, receiver=self.address, amount=UInt64(algo_amount))
+        try:
+            with self.context.txn.create_group(active_txn_overrides={"sender": sender}):
+                return int(self.trading.buy_vgold(payment))
+        except (ArithmeticError, ValueError):
+            return None
+
+    def sell(self, vgold_amount: int) -> int | None:
+        """Net microALGO from sell_vgold, None when the contract rejects the call"""
+        try:
+            with self.context.txn.create_group():
+                return int(self.trading.sell_vgold(UInt64(vgold_amount)))
+        except (ArithmeticError, ValueError):
+            return None
+
+
+def _net(quote, amount: int, price: int, fee_bps: int) -> int | None:
+    try:
+        return quote(amount, price, fee_bps).net
+    except ValueError:
+        return None
+
+
+def _batch_net(quote_batch, amount: int, price: int, fee_bps: int) -> int | None:
+    batch = quote_batch([amount], [price], fee_bps)
+    return int(batch.net[0]) if batch.valid[0] else None
+
+
+@pytest.fixture()
+def market(context: AlgopyTestContext) -> Market:
+    return Market(context)
+
+
+# (side, amount, price, fee_bps, quotable) on either side of each overflow, and fee rounding edges
+EDGE_CASES = [
+    # amount * VGOLD_UNIT on a buy
+    ("buy", MAX_UINT64 // VGOLD_UNIT, 10**12, 0, True),
+    ("buy", MAX_UINT64 // VGOLD_UNIT + 1, 10**12, 0, False),
+    ("buy", MAX_UINT64, 10**12, 0, False),
+    # amount * price on a sell
+    ("sell", MAX_UINT64 // 50_000, 50_000, 0, True),
+    ("sell", MAX_UINT64 // 50_000 + 1, 50_000, 0, False),
+    ("sell", MAX_UINT64, 1, 0, True),
+    # gross * fee_bps at the highest fee
+    ("buy", (MAX_UINT64 // MAX_TRADING_FEE) // VGOLD_UNIT, 1, MAX_TRADING_FEE, True),
+    ("buy", (MAX_UINT64 // MAX_TRADING_FEE) // VGOLD_UNIT + 1, 1, MAX_TRADING_FEE, False),
+    # A sell's gross is at most MAX_UINT64 // VGOLD_UNIT, so its fee never overflows
+    ("sell", MAX_UINT64 // VGOLD_UNIT, VGOLD_UNIT, MAX_TRADING_FEE, True),
+    ("sell", MAX_UINT64 // VGOLD_UNIT + 1, VGOLD_UNIT, MAX_TRADING_FEE, False),
+    # Fees that round down to nothing, or to one unit short of the next
+    ("buy", 0, 50_000, 25, True),
+    ("buy", 1, 50_000, MAX_TRADING_FEE, True),
+    ("sell", FEE_DENOMINATOR - 1, VGOLD_UNIT, 1, True),
+    ("sell", FEE_DENOMINATOR, VGOLD_UNIT, 1, True),
+    ("buy", FEE_DENOMINATOR * 50_000 // VGOLD_UNIT - 1, 50_000, 1, True),
+    ("buy", 1_000_000, 50_000, 0, True),
+]
+
+
+@pytest.mark.parametrize(("side", "amount", "price", "fee_bps", "quotable"), EDGE_CASES)
+def test_edge_case_parity(market: Market, side: str, amount: int, price: int, fee_bps: int, quotable: bool) -> None:
+    market.set(price, fee_bps)
+    quote, quote_batch, trade = (
+        (quote_buy, quote_buy_batch, market.buy) if side == "buy" else (quote_sell, quote_sell_batch, market.sell)
+    )
+
+    local = _net(quote, amount, price, fee_bps)
+    assert (local is not None) == quotable
+    assert trade(amount) == local
+    assert _batch_net(quote_batch, amount, price, fee_bps) == local
+
+
+def test_random_parity(market: Market) -> None:
+    rng = random.Random(37)
+    for _ in range(500):
+        price = rng.choice([rng.randint(1, 1_000), rng.randint(1_000, 1_000_000), rng.randint(1, 2**40)])
+        fee_bps = rng.choice([0, 1, MAX_TRADING_FEE, rng.randint(0, MAX_TRADING_FEE)])
+        amount = rng.choice([rng.randint(0, 10**6), rng.randint(0, 10**13), rng.randint(0, MAX_UINT64)])
+        market.set(price, fee_bps)
+
+        buy = _net(quote_buy, amount, price, fee_bps)
+        assert market.buy(amount) == buy, (amount, price, fee_bps)
+        assert _batch_net(quote_buy_batch, amount, price, fee_bps) == buy
+
+        sell = _net(quote_sell, amount, price, fee_bps)
+        assert market.sell(amount) == sell, (amount, price, fee_bps)
+        assert _batch_net(quote_sell_batch, amount, price, fee_bps) == sell
+
+
+def test_batch_matches_scalar() -> None:
+    rng = random.Random(38)
+    amounts = [rng.choice([0, 1, rng.randint(0, 10**13), rng.randint(0, MAX_UINT64), MAX_UINT64]) for _ in range(2_000)]
+    prices = [rng.choice([0, 1, rng.randint(1, 10**6), rng.randint(1, 2**40)]) for _ in range(2_000)]
+    for fee_bps in (0, 25, MAX_TRADING_FEE):
+        for quote, quote_batch in ((quote_buy, quote_buy_batch), (quote_sell, quote_sell_batch)):
+            batch = quote_batch(amounts, prices, fee_bps)
+            for i, (amount, price) in enumerate(zip(amounts, prices)):
+                local = _net(quote, amount, price, fee_bps)
+                assert (int(batch.net[i]) if batch.valid[i] else None) == local, (amount, price, fee_bps)
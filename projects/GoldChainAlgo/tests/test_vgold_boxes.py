@@ -0,0 +1,83 @@
+"""
+Box-mode vGold balances: a call that creates a holder box must be grouped after the
+caller's payment of the box's minimum balance, and zero amounts are rejected, so the
+app account's funds can't be drained by credits to new addresses.
+"""
+
+import pytest
+from algopy import Account, UInt64, arc4
+from algopy_testing import AlgopyTestContext
+
+from smart_contracts.vgold_token.contract import BALANCE_BOX_MBR, TransferItem, VGoldToken
+
+
+class BoxToken:
+    """A vGold token in box mode, the creator's supply migrated into its box"""
+
+    def __init__(self, context: AlgopyTestContext):
+        self.context = context
+        self.token = VGoldToken()
+        self.creator = context.default_sender
+        self.token.enable_box_balances()
+        self.call(BALANCE_BOX_MBR, self.token.migrate_balance, self.creator)
+
+    def call(self, paid: int | None, method, *args) -> object:
+        """Call a method as the creator, after a payment of paid microALGO unless None"""
+        deferred = self.context.txn.defer_app_call(method, *args)
+        if paid is None:
+            with self.context.txn.create_group([deferred]):
+                return deferred.submit()
+        address = self.context.ledger.get_app(self.token).address
+        payment = self.context.any.txn.payment(sender=self.creator, receiver=address, amount=UInt64(paid))
+        with self.context.txn.create_group([payment, deferred]):
+            return deferred.submit()
+
+    def balance(self, account: Account) -> int:
+        return int(self.token.box_balance.get(account, default=UInt64(0)))
+
+
+@pytest.fixture()
+def token(context: AlgopyTestContext) -> BoxToken:
+    return BoxToken(context)
+
+
+# The emulator keeps the writes of a call that fails, so each rejected call uses fresh holders
+def test_new_holder_pays_for_box(context: AlgopyTestContext, token: BoxToken) -> None:
+    with pytest.raises(AssertionError, match="Box minimum balance not paid"):
+        token.call(None, token.token.transfer, UInt64(5), context.any.account())
+    with pytest.raises(AssertionError, match="Box minimum balance not paid"):
+        token.call(BALANCE_BOX_MBR - 1, token.token.transfer, UInt64(5), context.any.account())
+
+    holder = context.any.account()
+    token.call(BALANCE_BOX_MBR, token.token.transfer, UInt64(5), holder)
+    assert token.balance(holder) == 5
+
+    # The box exists now, so no payment is needed
+    token.call(None, token.token.transfer, UInt64(5), holder)
+    assert token.balance(holder) == 10
+
+
+def test_zero_amounts_rejected(context: AlgopyTestContext, token: BoxToken) -> None:
+    holder = context.any.account()
+    with pytest.raises(AssertionError, match="Amount must be positive"):
+        token.call(BALANCE_BOX_MBR, token.token.transfer, UInt64(0), holder)
+    with pytest.raises(AssertionError, match="Amount must be positive"):
+        token.call(BALANCE_BOX_MBR, token.token.mint, UInt64(0), holder)
+    assert holder not in token.token.box_balance
+
+
+def test_batch_pays_per_new_box(context: AlgopyTestContext, token: BoxToken) -> None:
+    existing = context.any.account()
+    token.call(BALANCE_BOX_MBR, token.token.transfer, UInt64(1), existing)
+
+    def batch(new: list[Account]) -> arc4.DynamicArray[TransferItem]:
+        # The first new holder twice, which still creates one box
+        recipients = [existing, new[0], new[1], new[0]]
+        return arc4.DynamicArray(*[TransferItem(arc4.Address(to), arc4.UInt64(1)) for to in recipients])
+
+    with pytest.raises(AssertionError, match="Box minimum balance not paid"):
+        token.call(2 * BALANCE_BOX_MBR - 1, token.token.batch_transfer, batch([context.any.account() for _ in range(2)]))
+
+    new = [context.any.account(), context.any.account()]
+    token.call(2 * BALANCE_BOX_MBR, token.token.batch_transfer, batch(new))
+    assert [token.balance(account) for account in new] == [2, 1]